@@ -2,7 +2,7 @@ import time
 import functools
 import tensorflow as tf
 
-from baselines import logger
+from baselines import logger, profiling
 
 from baselines.common import set_global_seeds, explained_variance
 from baselines.common import tf_util
@@ -206,7 +206,9 @@ def learn(
         # Get mini batch of experiences
         obs, states, rewards, masks, actions, values = runner.run()
 
-        policy_loss, value_loss, policy_entropy = model.train(obs, states, rewards, masks, actions, values)
+        with profiling.phase('gradients'):
+            policy_loss, value_loss, policy_entropy = model.train(obs, states, rewards, masks, actions, values)
+        profiling.step()
         nseconds = time.time()-tstart
 
         # Calculate the fps (frame per second)
@@ -221,6 +223,8 @@ def learn(
             logger.record_tabular("policy_entropy", float(policy_entropy))
             logger.record_tabular("value_loss", float(value_loss))
             logger.record_tabular("explained_variance", float(ev))
-            logger.dump_tabular()
+            profiling.record_tabular()
+            with profiling.phase('logging'):
+                logger.dump_tabular()
     return model
 
@@ -0,0 +1,55 @@
+'''
+Vectorized discounted-return and GAE kernels shared by the a2c, ppo2 and trpo_mpi
+rollouts. Arrays are time-major, (nsteps,) or (nsteps, nenvs), and every kernel is the
+reverse recurrence
+
+    y[t] = x[t] + discount * nonterminal[t] * y[t+1],    y[nsteps] = bootstrap
+
+where nonterminal[t] is 0 when the episode ends between step t and t+1, else 1.
+'''
+import numpy as np
+from scipy.signal import lfilter
+
+
+def discounted_scan(x, discount, nonterminal=None, bootstrap=None):
+    '''
+    Evaluate the recurrence above along axis 0, in float64.
+
+    Without episode boundaries this is a single reverse IIR filter (lfilter). With
+    boundaries it is a segmented scan: the unsegmented result s is filtered once and each
+    segment's spill-over from later segments, discount ** (b - t + 1) * s[b + 1] with b
+    the next boundary at or after t, is subtracted.
+    '''
+    x = np.asarray(x, dtype=np.float64)
+    nsteps = x.shape[0]
+    tail = np.zeros(x.shape[1:]) if bootstrap is None else np.broadcast_to(np.asarray(bootstrap, dtype=np.float64), x.shape[1:])
+    # The bootstrap value is folded in as an extra final step.
+    s = lfilter([1.], [1., -discount], np.concatenate([x, tail[None]])[::-1], axis=0)[::-1]
+    if nonterminal is None:
+        return s[:-1]
+
+    t = np.arange(nsteps).reshape((nsteps,) + (1,) * (x.ndim - 1))
+    boundary = np.broadcast_to(np.asarray(nonterminal) == 0, x.shape)
+    # Index of the first boundary at or after t (nsteps if the segment runs off the end).
+    nxt = np.minimum.accumulate(np.where(boundary, t, nsteps)[::-1], axis=0)[::-1]
+    cut = nxt < nsteps
+    spill = np.take_along_axis(s, np.where(cut, nxt + 1, nsteps), axis=0)
+    return s[:-1] - np.where(cut, discount ** np.where(cut, nxt - t + 1, 0) * spill, 0.)
+
+
+def discounted_returns(rewards, dones, gamma, last_values=None):
+    '''
+    n-step returns bootstrapped off `last_values`, where dones[t] marks an episode ending
+    at step t (a2c's discount_with_dones convention, applied to every env at once).
+    '''
+    return discounted_scan(rewards, gamma, 1. - np.asarray(dones, dtype=np.float64), last_values)
+
+
+def gae_advantages(rewards, values, next_values, nonterminal, gamma, lam):
+    '''
+    Generalized advantage estimates; next_values[t] is the value of the state after step t
+    and nonterminal[t] masks it (and the rest of the trace) at episode ends.
+    '''
+    nonterminal = np.asarray(nonterminal, dtype=np.float64)
+    deltas = np.asarray(rewards, dtype=np.float64) + gamma * np.asarray(next_values, dtype=np.float64) * nonterminal - values
+    return discounted_scan(deltas, gamma * lam, nonterminal)
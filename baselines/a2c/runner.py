@@ -1,5 +1,6 @@
 import numpy as np
-from baselines.a2c.utils import discount_with_dones
+from baselines.a2c.returns import discounted_returns
+from baselines import profiling
 from baselines.common.runners import AbstractEnvRunner
 
 class Runner(AbstractEnvRunner):
@@ -17,56 +18,52 @@ class Runner(AbstractEnvRunner):
         self.gamma = gamma
         self.batch_action_shape = [x if x is not None else -1 for x in model.train_model.action.shape.as_list()]
         self.ob_dtype = model.train_model.X.dtype.as_numpy_dtype
+        # Rollout buffers, allocated once and laid out env-major (nenv, nsteps, ...) so the
+        # flattened batch run() returns is a reshape view of them rather than a copy.
+        # They are overwritten by the next run().
+        action = model.train_model.action
+        self.mb_obs = np.zeros((self.nenv, nsteps) + self.obs.shape[1:], dtype=self.ob_dtype)
+        self.mb_actions = np.zeros((self.nenv, nsteps) + tuple(action.shape.as_list()[1:]), dtype=action.dtype.name)
+        self.mb_rewards = np.zeros((self.nenv, nsteps), dtype=np.float32)
+        self.mb_values = np.zeros((self.nenv, nsteps), dtype=np.float32)
+        # masks: done flags entering each step; dones: done flags after it
+        self.mb_masks = np.zeros((self.nenv, nsteps), dtype=np.bool)
+        self.mb_dones = np.zeros((self.nenv, nsteps), dtype=np.bool)
 
     def run(self):
-        # We initialize the lists that will contain the mb of experiences
-        mb_obs, mb_rewards, mb_actions, mb_values, mb_dones = [],[],[],[],[]
         mb_states = self.states
         for n in range(self.nsteps):
             # Given observations, take action and value (V(s))
             # We already have self.obs because Runner superclass run self.obs[:] = env.reset() on init
-            actions, values, states, _ = self.model.step(self.obs, S=self.states, M=self.dones)
+            with profiling.phase('inference'):
+                actions, values, states, _ = self.model.step(self.obs, S=self.states, M=self.dones)
 
-            # Append the experiences
-            mb_obs.append(np.copy(self.obs))
-            mb_actions.append(actions)
-            mb_values.append(values)
-            mb_dones.append(self.dones)
+            # Store the experiences
+            self.mb_obs[:, n] = self.obs
+            self.mb_actions[:, n] = actions
+            self.mb_values[:, n] = values
+            self.mb_masks[:, n] = self.dones
 
             # Take actions in env and look the results
-            obs, rewards, dones, _ = self.env.step(actions)
+            with profiling.phase('env_step'):
+                obs, rewards, dones, _ = self.env.step(actions)
             self.states = states
             self.dones = dones
             self.obs = obs
-            mb_rewards.append(rewards)
-        mb_dones.append(self.dones)
-
-        # Batch of steps to batch of rollouts
-        mb_obs = np.asarray(mb_obs, dtype=self.ob_dtype).swapaxes(1, 0).reshape(self.batch_ob_shape)
-        mb_rewards = np.asarray(mb_rewards, dtype=np.float32).swapaxes(1, 0)
-        mb_actions = np.asarray(mb_actions, dtype=self.model.train_model.action.dtype.name).swapaxes(1, 0)
-        mb_values = np.asarray(mb_values, dtype=np.float32).swapaxes(1, 0)
-        mb_dones = np.asarray(mb_dones, dtype=np.bool).swapaxes(1, 0)
-        mb_masks = mb_dones[:, :-1]
-        mb_dones = mb_dones[:, 1:]
-
+            self.mb_rewards[:, n] = rewards
+            self.mb_dones[:, n] = dones
 
         if self.gamma > 0.0:
             # Discount/bootstrap off value fn
-            last_values = self.model.value(self.obs, S=self.states, M=self.dones).tolist()
-            for n, (rewards, dones, value) in enumerate(zip(mb_rewards, mb_dones, last_values)):
-                rewards = rewards.tolist()
-                dones = dones.tolist()
-                if dones[-1] == 0:
-                    rewards = discount_with_dones(rewards+[value], dones+[0], self.gamma)[:-1]
-                else:
-                    rewards = discount_with_dones(rewards, dones, self.gamma)
-
-                mb_rewards[n] = rewards
-
-        mb_actions = mb_actions.reshape(self.batch_action_shape)
+            with profiling.phase('inference'):
+                last_values = self.model.value(self.obs, S=self.states, M=self.dones)
+            # An env that finished on its last step is not bootstrapped (its done masks last_values).
+            with profiling.phase('advantages'):
+                self.mb_rewards[:] = discounted_returns(self.mb_rewards.T, self.mb_dones.T, self.gamma, last_values).T
 
-        mb_rewards = mb_rewards.flatten()
-        mb_values = mb_values.flatten()
-        mb_masks = mb_masks.flatten()
+        mb_obs = self.mb_obs.reshape(self.batch_ob_shape)
+        mb_actions = self.mb_actions.reshape(self.batch_action_shape)
+        mb_rewards = self.mb_rewards.reshape(-1)
+        mb_values = self.mb_values.reshape(-1)
+        mb_masks = self.mb_masks.reshape(-1)
         return mb_obs, mb_states, mb_rewards, mb_masks, mb_actions, mb_values
@@ -0,0 +1,111 @@
+import numpy as np
+
+from baselines.a2c.returns import discounted_returns, discounted_scan, gae_advantages
+
+# Reference loops, as previously written in the a2c/ppo2 runners and trpo_mpi.
+
+
+def discount_with_dones(rewards, dones, gamma):
+    discounted = []
+    r = 0
+    for reward, done in zip(rewards[::-1], dones[::-1]):
+        r = reward + gamma*r*(1.-done)
+        discounted.append(r)
+    return discounted[::-1]
+
+
+def a2c_loop(mb_rewards, mb_dones, last_values, gamma):
+    # (nenvs, nsteps), as in a2c.Runner after swapaxes
+    mb_rewards = mb_rewards.copy()
+    for n, (rewards, dones, value) in enumerate(zip(mb_rewards, mb_dones, last_values.tolist())):
+        rewards = rewards.tolist()
+        dones = dones.tolist()
+        if dones[-1] == 0:
+            rewards = discount_with_dones(rewards+[value], dones+[0], gamma)[:-1]
+        else:
+            rewards = discount_with_dones(rewards, dones, gamma)
+        mb_rewards[n] = rewards
+    return mb_rewards
+
+
+def ppo2_loop(mb_rewards, mb_values, mb_dones, last_values, dones, gamma, lam):
+    nsteps = len(mb_rewards)
+    mb_advs = np.zeros_like(mb_rewards)
+    lastgaelam = 0
+    for t in reversed(range(nsteps)):
+        if t == nsteps - 1:
+            nextnonterminal = 1.0 - dones
+            nextvalues = last_values
+        else:
+            nextnonterminal = 1.0 - mb_dones[t+1]
+            nextvalues = mb_values[t+1]
+        delta = mb_rewards[t] + gamma * nextvalues * nextnonterminal - mb_values[t]
+        mb_advs[t] = lastgaelam = delta + gamma * lam * nextnonterminal * lastgaelam
+    return mb_advs
+
+
+def trpo_loop(rew, vpred, new, nextvpred, gamma, lam):
+    new = np.append(new, 0)
+    vpred = np.append(vpred, nextvpred)
+    T = len(rew)
+    gaelam = np.empty(T, 'float32')
+    lastgaelam = 0
+    for t in reversed(range(T)):
+        nonterminal = 1-new[t+1]
+        delta = rew[t] + gamma * vpred[t+1] * nonterminal - vpred[t]
+        gaelam[t] = lastgaelam = delta + gamma * lam * nonterminal * lastgaelam
+    return gaelam
+
+
+def random_rollout(rng, nsteps, nenvs, done_prob):
+    rewards = rng.randn(nsteps, nenvs).astype(np.float32)
+    values = rng.randn(nsteps, nenvs).astype(np.float32)
+    dones = rng.rand(nsteps, nenvs) < done_prob
+    return rewards, values, dones
+
+
+def test_discounted_scan_without_boundaries():
+    rng = np.random.RandomState(0)
+    x = rng.randn(50, 3)
+    expected = np.zeros_like(x)
+    y = np.array([1., 2., 3.])
+    for t in reversed(range(50)):
+        expected[t] = y = x[t] + 0.9 * y
+    np.testing.assert_allclose(discounted_scan(x, 0.9, bootstrap=[1., 2., 3.]), expected, rtol=1e-10)
+
+
+def test_a2c_returns_match_loop():
+    rng = np.random.RandomState(1)
+    for done_prob in (0., 0.1, 0.5, 1.):
+        rewards, _, dones = random_rollout(rng, 5, 16, done_prob)
+        last_values = rng.randn(16).astype(np.float32)
+        expected = a2c_loop(rewards.T, dones.T, last_values, 0.99)
+        actual = discounted_returns(rewards, dones, 0.99, last_values).T
+        np.testing.assert_allclose(actual, expected, rtol=1e-5, atol=1e-5)
+
+
+def test_ppo2_gae_matches_loop():
+    rng = np.random.RandomState(2)
+    gamma, lam = 0.99, 0.95
+    for done_prob in (0., 0.05, 0.5, 1.):
+        rewards, values, mb_dones = random_rollout(rng, 128, 8, done_prob)
+        last_values = rng.randn(8).astype(np.float32)
+        dones = rng.rand(8) < done_prob
+        expected = ppo2_loop(rewards, values, mb_dones, last_values, dones, gamma, lam)
+        nonterminal = 1.0 - np.concatenate([mb_dones[1:], [dones]])
+        next_values = np.concatenate([values[1:], [last_values]])
+        actual = gae_advantages(rewards, values, next_values, nonterminal, gamma, lam)
+        np.testing.assert_allclose(actual, expected, rtol=1e-4, atol=1e-4)
+
+
+def test_trpo_gae_matches_loop():
+    rng = np.random.RandomState(3)
+    gamma, lam = 0.99, 0.98
+    rew, vpred, new = [a[:, 0] for a in random_rollout(rng, 1024, 1, 0.01)]
+    new = new.astype('int32')
+    nextvpred = 0.5
+    expected = trpo_loop(rew, vpred, new, nextvpred, gamma, lam)
+    new_ext = np.append(new, 0)
+    vpred_ext = np.append(vpred, nextvpred)
+    actual = gae_advantages(rew, vpred_ext[:-1], vpred_ext[1:], 1 - new_ext[1:], gamma, lam)
+    np.testing.assert_allclose(actual, expected, rtol=1e-4, atol=1e-4)
@@ -2,7 +2,7 @@ import os.path as osp
 import time
 import functools
 import tensorflow as tf
-from baselines import logger
+from baselines import logger, profiling
 
 from baselines.common import set_global_seeds, explained_variance
 from baselines.common.policies import build_policy
@@ -17,7 +17,8 @@ class Model(object):
 
     def __init__(self, policy, ob_space, ac_space, nenvs,total_timesteps, nprocs=32, nsteps=20,
                  ent_coef=0.01, vf_coef=0.5, vf_fisher_coef=1.0, lr=0.25, max_grad_norm=0.5,
-                 kfac_clip=0.001, lrschedule='linear', is_async=True):
+                 kfac_clip=0.001, lrschedule='linear', is_async=True, kfac_update=1, eigen_threads=0,
+                 eigen_approx=None, eigen_block_size=512, eigen_rank=128):
 
         self.sess = sess = get_session()
         nbatch = nenvs * nsteps
@@ -54,8 +55,10 @@ class Model(object):
 
         with tf.device('/gpu:0'):
             self.optim = optim = kfac.KfacOptimizer(learning_rate=PG_LR, clip_kl=kfac_clip,\
-                momentum=0.9, kfac_update=1, epsilon=0.01,\
-                stats_decay=0.99, is_async=is_async, cold_iter=10, max_grad_norm=max_grad_norm)
+                momentum=0.9, kfac_update=kfac_update, epsilon=0.01,\
+                stats_decay=0.99, is_async=is_async and not eigen_threads, cold_iter=10, max_grad_norm=max_grad_norm,
+                eigen_threads=eigen_threads, eigen_approx=eigen_approx, eigen_block_size=eigen_block_size,
+                eigen_rank=eigen_rank)
 
             # update_stats_op = optim.compute_and_apply_stats(joint_fisher_loss, var_list=params)
             optim.compute_and_apply_stats(joint_fisher_loss, var_list=params)
@@ -92,8 +95,20 @@ class Model(object):
 
 def learn(network, env, seed, total_timesteps=int(40e6), gamma=0.99, log_interval=1, nprocs=32, nsteps=20,
                  ent_coef=0.01, vf_coef=0.5, vf_fisher_coef=1.0, lr=0.25, max_grad_norm=0.5,
-                 kfac_clip=0.001, save_interval=None, lrschedule='linear', load_path=None, is_async=True, **network_kwargs):
+                 kfac_clip=0.001, save_interval=None, lrschedule='linear', load_path=None, is_async=True,
+                 kfac_update=1, eigen_threads=0, eigen_approx=None, eigen_block_size=512, eigen_rank=128,
+                 **network_kwargs):
+    '''
+    is_async: eigen-decompose the KFAC factors on a queue runner thread
+    kfac_update: update the factor eigen-decompositions every kfac_update steps, reusing the cached ones in between
+    eigen_threads: if > 0, instead eigen-decompose synchronously between train steps with NumPy on a pool of this
+    many threads (deterministic, no queue runner; is_async is ignored)
+    eigen_approx: with eigen_threads, approximate factors wider than eigen_block_size by 'block'-diagonal
+    eigen-decomposition, or wider than 2 * eigen_rank by a randomized rank eigen_rank ('lowrank') one
+    '''
     set_global_seeds(seed)
+    if eigen_threads:
+        is_async = False
 
 
     if network == 'cnn':
@@ -107,7 +122,9 @@ def learn(network, env, seed, total_timesteps=int(40e6), gamma=0.99, log_interva
     make_model = lambda : Model(policy, ob_space, ac_space, nenvs, total_timesteps, nprocs=nprocs, nsteps
                                 =nsteps, ent_coef=ent_coef, vf_coef=vf_coef, vf_fisher_coef=
                                 vf_fisher_coef, lr=lr, max_grad_norm=max_grad_norm, kfac_clip=kfac_clip,
-                                lrschedule=lrschedule, is_async=is_async)
+                                lrschedule=lrschedule, is_async=is_async, kfac_update=kfac_update,
+                                eigen_threads=eigen_threads, eigen_approx=eigen_approx,
+                                eigen_block_size=eigen_block_size, eigen_rank=eigen_rank)
     if save_interval and logger.get_dir():
         import cloudpickle
         with open(osp.join(logger.get_dir(), 'make_model.pkl'), 'wb') as fh:
@@ -128,7 +145,12 @@ def learn(network, env, seed, total_timesteps=int(40e6), gamma=0.99, log_interva
 
     for update in range(1, total_timesteps//nbatch+1):
         obs, states, rewards, masks, actions, values = runner.run()
-        policy_loss, value_loss, policy_entropy = model.train(obs, states, rewards, masks, actions, values)
+        with profiling.phase('gradients'):
+            policy_loss, value_loss, policy_entropy = model.train(obs, states, rewards, masks, actions, values)
+        if eigen_threads:
+            with profiling.phase('kfac_eigen'):
+                model.optim.update_eigen(model.sess)
+        profiling.step()
         model.old_obs = obs
         nseconds = time.time()-tstart
         fps = int((update*nbatch)/nseconds)
@@ -141,7 +163,9 @@ def learn(network, env, seed, total_timesteps=int(40e6), gamma=0.99, log_interva
             logger.record_tabular("policy_loss", float(policy_loss))
             logger.record_tabular("value_loss", float(value_loss))
             logger.record_tabular("explained_variance", float(ev))
-            logger.dump_tabular()
+            profiling.record_tabular()
+            with profiling.phase('logging'):
+                logger.dump_tabular()
 
         if save_interval and (update % save_interval == 0 or update == 1) and logger.get_dir():
             savepath = osp.join(logger.get_dir(), 'checkpoint%.5i'%update)
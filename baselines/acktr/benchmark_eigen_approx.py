@@ -0,0 +1,61 @@
+'''
+Throughput and accuracy of the KFAC factor eigen-decompositions used by update_eigen on the
+first-layer activation factor of a stock observation (11 * tickers + 1 features plus the
+bias column): full np.linalg.eigh against block-diagonal and randomized low-rank ones.
+Accuracy is the relative error of the damped preconditioned gradient (A + eps I)^-1 g.
+
+    python -m baselines.acktr.benchmark_eigen_approx --tickers 27 500
+'''
+import argparse
+import time
+
+import numpy as np
+
+from baselines.acktr.eigen_approx import block_eigh, randomized_eigh
+
+
+def activation_factor(tickers, nsamples, rng):
+    '''Second moment of correlated observations: a few market factors plus per-feature noise.'''
+    d = 11 * tickers + 1
+    latent = rng.randn(nsamples, 16) @ rng.randn(16, d)
+    obs = latent + 0.5 * rng.randn(nsamples, d)
+    obs = np.concatenate([obs, np.ones((nsamples, 1))], axis=1)
+    return (obs.T @ obs / nsamples).astype(np.float32)
+
+
+def precondition(e, Q, g, epsilon):
+    return Q @ ((Q.T @ g) / (np.clip(e, 0., None)[:, None] + epsilon))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tickers', type=int, nargs='+', default=[27, 500])
+    parser.add_argument('--block_size', type=int, default=512)
+    parser.add_argument('--rank', type=int, default=128)
+    parser.add_argument('--epsilon', type=float, default=0.01)
+    args = parser.parse_args()
+    rng = np.random.RandomState(0)
+
+    methods = [
+        ('full eigh', np.linalg.eigh),
+        ('block {}'.format(args.block_size), lambda A: block_eigh(A, args.block_size)),
+        ('lowrank {}'.format(args.rank), lambda A: randomized_eigh(A, args.rank, rng=np.random.RandomState(0))),
+    ]
+    print('{:>8} {:>6} {:>14} {:>10} {:>12}'.format('tickers', 'dim', 'method', 'seconds', 'rel. error'))
+    for tickers in args.tickers:
+        A = activation_factor(tickers, 4096, rng)
+        g = rng.randn(A.shape[0], 32).astype(np.float32)
+        exact = None
+        for name, eigh in methods:
+            start = time.time()
+            e, Q = eigh(A)
+            seconds = time.time() - start
+            pg = precondition(e, Q, g, args.epsilon)
+            if exact is None:
+                exact = pg
+            error = np.linalg.norm(pg - exact) / np.linalg.norm(exact)
+            print('{:>8} {:>6} {:>14} {:>10.3f} {:>12.2e}'.format(tickers, A.shape[0], name, seconds, error))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+'''
+Updates/sec and final return of ACKTR with the asynchronous eigen-decomposition queue
+(is_async=True, the default) against the synchronous amortized schedule: factors
+eigen-decomposed every kfac_update updates with NumPy on eigen_threads threads.
+
+    python -m baselines.acktr.benchmark_kfac --env Stock-v0 --timesteps 200000
+'''
+import argparse
+import csv
+import os
+import tempfile
+from functools import partial
+
+import gym
+import tensorflow as tf
+
+from baselines import bench, logger
+from baselines.acktr.acktr import learn
+from baselines.bench.monitor import load_results
+from baselines.common.vec_env.subproc_vec_env import SubprocVecEnv
+
+SETTINGS = [
+    ('async queue', dict(is_async=True)),
+    ('threads=1, every 1', dict(eigen_threads=1, kfac_update=1)),
+    ('threads=2, every 5', dict(eigen_threads=2, kfac_update=5)),
+    ('threads=4, every 10', dict(eigen_threads=4, kfac_update=10)),
+]
+
+
+def make_env(env_id, seed, logdir, rank):
+    env = gym.make(env_id)
+    env.seed(seed + rank)
+    return bench.Monitor(env, os.path.join(logdir, str(rank)))
+
+
+def run(env_id, timesteps, seed, nenvs, nsteps, logdir, **kwargs):
+    logger.configure(logdir, ['csv'])
+    env = SubprocVecEnv([partial(make_env, env_id, seed, logdir, i) for i in range(nenvs)])
+    with tf.Graph().as_default():
+        learn('mlp', env, seed, total_timesteps=timesteps, nsteps=nsteps, **kwargs)
+    env.close()
+    with open(os.path.join(logdir, 'progress.csv')) as f:
+        rows = list(csv.DictReader(f))
+    updates_per_sec = float(rows[-1]['fps']) / (nenvs * nsteps)
+    episodes = load_results(logdir)
+    final_return = episodes['r'].values[-10:].mean() if len(episodes) else float('nan')
+    return updates_per_sec, final_return
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--env', default='Stock-v0')
+    parser.add_argument('--timesteps', type=int, default=200000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--nenvs', type=int, default=8)
+    parser.add_argument('--nsteps', type=int, default=20)
+    args = parser.parse_args()
+
+    print('{:>22} {:>12} {:>14}'.format('eigen-decomp', 'updates/s', 'final return'))
+    for name, kwargs in SETTINGS:
+        updates_per_sec, final_return = run(args.env, args.timesteps, args.seed, args.nenvs, args.nsteps,
+                                            tempfile.mkdtemp(), **kwargs)
+        print('{:>22} {:>12.2f} {:>14.3f}'.format(name, updates_per_sec, final_return))
+
+
+if __name__ == '__main__':
+    main()
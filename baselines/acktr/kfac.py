@@ -1,9 +1,11 @@
 import tensorflow as tf
 import numpy as np
 import re
+from concurrent.futures import ThreadPoolExecutor
 
  # flake8: noqa F403, F405
 from baselines.acktr.kfac_utils import *
+from baselines.acktr.eigen_approx import block_eigh, randomized_eigh
 from functools import reduce
 
 KFAC_OPS = ['MatMul', 'Conv2D', 'BiasAdd']
@@ -12,7 +14,10 @@ KFAC_DEBUG = False
 
 class KfacOptimizer():
 
-    def __init__(self, learning_rate=0.01, momentum=0.9, clip_kl=0.01, kfac_update=2, stats_accum_iter=60, full_stats_init=False, cold_iter=100, cold_lr=None, is_async=False, async_stats=False, epsilon=1e-2, stats_decay=0.95, blockdiag_bias=False, channel_fac=False, factored_damping=False, approxT2=False, use_float64=False, weight_decay_dict={},max_grad_norm=0.5):
+    def __init__(self, learning_rate=0.01, momentum=0.9, clip_kl=0.01, kfac_update=2, stats_accum_iter=60, full_stats_init=False, cold_iter=100, cold_lr=None, is_async=False, async_stats=False, epsilon=1e-2, stats_decay=0.95, blockdiag_bias=False, channel_fac=False, factored_damping=False, approxT2=False, use_float64=False, weight_decay_dict={},max_grad_norm=0.5, eigen_threads=0, eigen_approx=None, eigen_block_size=512, eigen_rank=128):
+        assert not (is_async and eigen_threads), 'eigen_threads replaces the asynchronous eigen-decomp queue'
+        assert eigen_approx in (None, 'block', 'lowrank')
+        assert eigen_approx is None or eigen_threads, 'approximate eigen-decomps are computed by update_eigen, set eigen_threads'
         self.max_grad_norm = max_grad_norm
         self._lr = learning_rate
         self._momentum = momentum
@@ -21,6 +26,11 @@ class KfacOptimizer():
         self._kfac_update = kfac_update
         self._async = is_async
         self._async_stats = async_stats
+        self._eigen_threads = eigen_threads
+        # factors wider than eigen_block_size ('block') or 2 * eigen_rank ('lowrank') are approximated
+        self._eigen_approx = eigen_approx
+        self._eigen_block_size = eigen_block_size
+        self._eigen_rank = eigen_rank
         self._epsilon = epsilon
         self._stats_decay = stats_decay
         self._blockdiag_bias = blockdiag_bias
@@ -615,6 +625,61 @@ class KfacOptimizer():
                     0.), [tf.convert_to_tensor('updated kfac factors')]))
         return updateOps
 
+    def buildEigenAssign(self):
+        """ placeholders and assign ops to load eigen decomps computed outside the graph (see update_eigen) """
+        self._eigen_stats = list(self.stats_eigen)
+        self._eigen_phs = []
+        updateOps = []
+        for stats_var in self._eigen_stats:
+            stats_dim = stats_var.get_shape()[1].value
+            e_ph = tf.placeholder(tf.float32, [stats_dim])
+            Q_ph = tf.placeholder(tf.float32, [stats_dim, stats_dim])
+            self._eigen_phs.append((e_ph, Q_ph))
+            updateOps.append(tf.assign(self.stats_eigen[stats_var]['e'], e_ph, use_locking=True))
+            updateOps.append(tf.assign(self.stats_eigen[stats_var]['Q'], Q_ph, use_locking=True))
+
+        with tf.control_dependencies(updateOps):
+            updateOps.append(tf.assign_add(self.factor_step, 1))
+        self._eigen_assign_op = tf.group(*updateOps)
+        self._eigen_pool = ThreadPoolExecutor(max_workers=self._eigen_threads)
+        self._last_eigen_step = None
+
+    def update_eigen(self, sess):
+        """
+        With eigen_threads > 0: eigen-decompose the factor stats with NumPy on the thread pool
+        and load them into the cached e/Q variables, on the schedule of the synchronous in-graph
+        update (every kfac_update stats steps once stats_accum_iter steps are accumulated).
+        The preconditioner reuses the cached decompositions in between. Call after each train
+        step; returns True when the factors were updated. With eigen_approx, wide factors are
+        decomposed block-diagonally or by randomized low-rank eigen-decomposition.
+        """
+        stats_step = sess.run(self.stats_step)
+        if stats_step < self._stats_accum_iter or stats_step % self._kfac_update != 0 \
+                or stats_step == self._last_eigen_step:
+            return False
+        self._last_eigen_step = stats_step
+        dtype = np.float64 if self._use_float64 else np.float32
+
+        def eigh(idx, stats):
+            stats = stats.astype(dtype)
+            stats_dim = stats.shape[0]
+            if self._eigen_approx == 'block' and stats_dim > self._eigen_block_size:
+                e, Q = block_eigh(stats, self._eigen_block_size)
+            elif self._eigen_approx == 'lowrank' and stats_dim > 2 * self._eigen_rank:
+                # seeded by step and factor so the result does not depend on thread scheduling
+                e, Q = randomized_eigh(stats, self._eigen_rank, rng=np.random.RandomState([stats_step, idx]))
+            else:
+                e, Q = np.linalg.eigh(stats)
+            return e.astype(np.float32), Q.astype(np.float32)
+
+        stats_list = sess.run(self._eigen_stats)
+        feed_dict = {}
+        for (e_ph, Q_ph), (e, Q) in zip(self._eigen_phs, self._eigen_pool.map(eigh, range(len(stats_list)), stats_list)):
+            feed_dict[e_ph] = e
+            feed_dict[Q_ph] = Q
+        sess.run(self._eigen_assign_op, feed_dict)
+        return True
+
     def getKfacPrecondUpdates(self, gradlist, varlist):
         updatelist = []
         vg = 0.
@@ -815,6 +880,9 @@ class KfacOptimizer():
             self.getStatsEigen()
 
         qr = None
+        if self._eigen_threads:
+            # eigen-decomp updates are run from python between train steps, see update_eigen
+            self.buildEigenAssign()
         # launch eigen-decomp on a queue thread
         if self._async:
             print('Use async eigen decomp')
@@ -849,7 +917,10 @@ class KfacOptimizer():
                 def no_op_wrapper():
                     return tf.group(*[tf.assign_add(self.cold_step, 1)])
 
-                if not self._async:
+                if self._eigen_threads:
+                    updateFactorOps = tf.cond(tf.greater_equal(self.stats_step, self._stats_accum_iter),
+                                              tf.no_op, no_op_wrapper)
+                elif not self._async:
                     # synchronous eigen-decomp updates
                     updateFactorOps = tf.cond(tf.logical_and(tf.equal(tf.mod(self.stats_step, self._kfac_update),
                                                                       tf.convert_to_tensor(0)),
@@ -0,0 +1,26 @@
+import numpy as np
+
+from baselines.acktr.eigen_approx import block_eigh, randomized_eigh
+
+
+def test_block_eigh_matches_block_diagonal():
+    rng = np.random.RandomState(0)
+    X = rng.randn(200, 23)
+    A = X.T @ X / 200
+    e, Q = block_eigh(A, 8)
+    np.testing.assert_allclose(Q @ Q.T, np.eye(23), atol=1e-10)
+    blocks = np.zeros_like(A)
+    for start in range(0, 23, 8):
+        blocks[start:start + 8, start:start + 8] = A[start:start + 8, start:start + 8]
+    np.testing.assert_allclose(Q @ np.diag(e) @ Q.T, blocks, atol=1e-10)
+
+
+def test_randomized_eigh_recovers_low_rank():
+    rng = np.random.RandomState(0)
+    U = np.linalg.qr(rng.randn(60, 5))[0]
+    A = U @ np.diag([5., 4., 3., 2., 1.]) @ U.T + 0.01 * np.eye(60)
+    e, Q = randomized_eigh(A, 5, rng=np.random.RandomState(1))
+    np.testing.assert_allclose(Q @ Q.T, np.eye(60), atol=1e-10)
+    np.testing.assert_allclose(e[:5], [5.01, 4.01, 3.01, 2.01, 1.01], rtol=1e-8)
+    np.testing.assert_allclose(e[5:], 0.01, rtol=1e-8)
+    np.testing.assert_allclose(Q @ np.diag(e) @ Q.T, A, atol=1e-6)
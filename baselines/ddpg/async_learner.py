@@ -0,0 +1,162 @@
+'''
+Decoupled actor/learner training loop for DDPG, used by learn(..., async_workers=N).
+
+Rollout worker processes (see rollout_worker) step their environments continuously
+and stream transitions into a queue. An ingest thread moves them into the replay
+memory while the learner trains without waiting for rollouts, publishing fresh actor
+weights every `publish_interval` gradient steps. Two bounds keep the system close to
+the synchronous algorithm:
+
+- max_staleness: transitions produced by weights more than this many published
+  versions old are dropped instead of stored.
+- max_train_ratio: gradient steps per stored transition; the learner waits for data
+  rather than over-training on a small buffer (defaults to the synchronous ratio
+  nb_train_steps / nb_rollout_steps). The bounded transition queue applies the
+  opposite backpressure to the workers.
+'''
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from baselines import logger, profiling
+from baselines.ddpg.numpy_actor import flatten_params
+from baselines.ddpg.rollout_worker import RolloutWorkerPool
+
+
+def train_async(agent, memory, env_fn, nb_workers, max_action, total_steps, steps_per_epoch,
+                nb_train_steps, nb_rollout_steps, batch_size, param_noise_adaption_interval=50,
+                publish_interval=50, max_staleness=10, max_train_ratio=None, send_interval=16, seed=None,
+                evaluator=None, test_interval=0):
+    sess = agent.sess
+    actor_vars = agent.actor.trainable_vars
+    obs_shape = tuple(agent.obs0.get_shape().as_list()[1:])
+    stats_ops = [agent.obs_rms.mean, agent.obs_rms.std] if agent.normalize_observations else []
+    if max_train_ratio is None:
+        max_train_ratio = float(nb_train_steps) / nb_rollout_steps
+
+    pool = RolloutWorkerPool(env_fn, nb_workers,
+                             param_names=[v.name for v in actor_vars],
+                             param_shapes=[tuple(v.get_shape().as_list()) for v in actor_vars],
+                             observation_shape=obs_shape, max_action=max_action,
+                             action_noise=agent.action_noise, param_noise=agent.param_noise is not None,
+                             normalize_observations=agent.normalize_observations,
+                             observation_range=agent.observation_range,
+                             send_interval=send_interval, seed=seed)
+
+    def publish():
+        values = sess.run(actor_vars + stats_ops)
+        obs_mean, obs_std = values[len(actor_vars):] or (np.zeros(obs_shape), np.ones(obs_shape))
+        stddev = agent.param_noise.current_stddev if agent.param_noise is not None else 0.
+        return pool.publish(flatten_params(values[:len(actor_vars)]), obs_mean, obs_std, stddev)
+
+    # memory_lock guards the replay memory and pending obs stats; progress guards the counters.
+    memory_lock = threading.Lock()
+    progress = threading.Condition()
+    state = {'steps': 0, 'dropped': 0, 'version': 0}
+    new_episode_rewards, new_episode_steps = [], []
+    stop = threading.Event()
+
+    def ingest():
+        while not stop.is_set():
+            batch = pool.get()
+            if batch is None:
+                continue
+            with progress:
+                new_episode_rewards.extend(batch.episode_returns)
+                new_episode_steps.extend(batch.episode_steps)
+                if state['version'] - batch.policy_version > max_staleness:
+                    state['dropped'] += len(batch.obs0)
+                    continue
+            with memory_lock:
+                agent.store_transition(batch.obs0, batch.actions, batch.rewards, batch.obs1, batch.terminals1)
+            with progress:
+                state['steps'] += len(batch.obs0)
+                progress.notify_all()
+
+    ingest_thread = threading.Thread(target=ingest, daemon=True)
+    state['version'] = publish()
+    ingest_thread.start()
+
+    start_time = time.time()
+    episode_rewards_history = deque(maxlen=100)
+    train_steps = 0
+    epoch = 0
+    epoch_actor_losses, epoch_critic_losses, epoch_adaptive_distances = [], [], []
+
+    def log_epoch(steps):
+        duration = time.time() - start_time
+        with memory_lock:
+            stats = agent.get_stats()
+        with progress:
+            episode_rewards, episode_steps = new_episode_rewards[:], new_episode_steps[:]
+            del new_episode_rewards[:], new_episode_steps[:]
+            dropped, version = state['dropped'], state['version']
+        episode_rewards_history.extend(episode_rewards)
+
+        combined_stats = stats.copy()
+        combined_stats['rollout/return'] = np.mean(episode_rewards)
+        combined_stats['rollout/return_history'] = np.mean(episode_rewards_history)
+        combined_stats['rollout/episode_steps'] = np.mean(episode_steps)
+        combined_stats['rollout/episodes'] = len(episode_rewards)
+        combined_stats['train/loss_actor'] = np.mean(epoch_actor_losses)
+        combined_stats['train/loss_critic'] = np.mean(epoch_critic_losses)
+        combined_stats['train/param_noise_distance'] = np.mean(epoch_adaptive_distances)
+        combined_stats['total/duration'] = duration
+        combined_stats['total/steps_per_second'] = float(steps) / float(duration)
+        combined_stats['total/train_steps_per_second'] = float(train_steps) / float(duration)
+        combined_stats['async/policy_version'] = version
+        combined_stats['async/dropped_stale'] = dropped
+        combined_stats['total/epochs'] = epoch + 1
+        combined_stats['total/steps'] = steps
+        for key in sorted(combined_stats.keys()):
+            logger.record_tabular(key, combined_stats[key])
+        if evaluator is not None:
+            evaluator.record_tabular()
+        profiling.record_tabular()
+        logger.dump_tabular()
+        logger.info('')
+
+    try:
+        while True:
+            with progress:
+                # Wait for data: a minimal batch, and no more than max_train_ratio updates per transition.
+                while state['steps'] < total_steps and (
+                        memory.nb_entries < batch_size or train_steps >= max_train_ratio * state['steps']):
+                    progress.wait(0.1)
+                steps = state['steps']
+
+            if steps >= (epoch + 1) * steps_per_epoch or steps >= total_steps:
+                log_epoch(steps)
+                epoch += 1
+                epoch_actor_losses, epoch_critic_losses, epoch_adaptive_distances = [], [], []
+            if steps >= total_steps:
+                break
+
+            if agent.param_noise is not None and train_steps % param_noise_adaption_interval == 0:
+                with memory_lock:
+                    epoch_adaptive_distances.append(agent.adapt_param_noise())
+            with memory_lock:
+                cl, al = agent.train()
+            with profiling.phase('target_update'):
+                agent.update_target_net()
+            epoch_critic_losses.append(cl)
+            epoch_actor_losses.append(al)
+            train_steps += 1
+            profiling.step()
+
+            if train_steps % publish_interval == 0:
+                version = publish()
+                with progress:
+                    state['version'] = version
+            # test_interval counts epoch cycles of the synchronous loop, nb_train_steps updates each
+            if evaluator is not None and train_steps % (test_interval * nb_train_steps) == 0:
+                with profiling.phase('test_snapshot'):
+                    evaluator.submit(steps, agent.actor_snapshot(max_action))
+    finally:
+        stop.set()
+        pool.close()
+        ingest_thread.join()
+
+    return agent
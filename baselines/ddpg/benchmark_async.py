@@ -0,0 +1,61 @@
+'''
+Wall-clock comparison of the synchronous DDPG loop against asynchronous rollout
+workers (learn(..., async_workers=N)): time until rollout/return_history first reaches
+a target return, and the final return, both read back from each run's progress.csv.
+
+    python -m baselines.ddpg.benchmark_async --env Stock-v0 --target 0 --timesteps 200000
+'''
+import argparse
+import csv
+import os
+import tempfile
+from functools import partial
+
+import gym
+import tensorflow as tf
+
+from baselines import logger
+from baselines.common.vec_env.dummy_vec_env import DummyVecEnv
+from baselines.ddpg.ddpg import learn
+
+
+def run(env_id, timesteps, seed, async_workers, nb_envs, logdir):
+    logger.configure(logdir, ['csv'])
+    env = DummyVecEnv([partial(gym.make, env_id) for _ in range(nb_envs)])
+    with tf.Graph().as_default():
+        learn('mlp', env, seed=seed, total_timesteps=timesteps,
+              async_workers=async_workers, env_fn=partial(gym.make, env_id))
+    env.close()
+    with open(os.path.join(logdir, 'progress.csv')) as f:
+        return list(csv.DictReader(f))
+
+
+def time_to_target(rows, target):
+    for row in rows:
+        value = row.get('rollout/return_history', '')
+        if value not in ('', 'nan') and float(value) >= target:
+            return float(row['total/duration'])
+    return float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--env', default='Stock-v0')
+    parser.add_argument('--target', type=float, default=0.)
+    parser.add_argument('--timesteps', type=int, default=200000)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='ddpg_async_')
+    print('{:>6} {:>8} {:>16} {:>14} {:>12}'.format('mode', 'workers', 'time to target', 'final return', 'duration'))
+    for mode, async_workers in (('sync', 0), ('async', args.workers)):
+        rows = run(args.env, args.timesteps, args.seed, async_workers, args.workers, os.path.join(root, mode))
+        print('{:>6} {:>8} {:>15.1f}s {:>14.3f} {:>11.1f}s'.format(
+            mode, args.workers, time_to_target(rows, args.target),
+            float(rows[-1]['rollout/return_history']), float(rows[-1]['total/duration'])))
+    print('logs in {}'.format(root))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+'''
+Throughput of DDPG.store_transition on Stock-v0 sized spaces: one obs_rms.update per
+observation (the previous behaviour) versus accumulating the statistics over a rollout
+chunk and flushing them once.
+
+    python -m baselines.ddpg.benchmark_obs_rms
+'''
+import time
+
+import numpy as np
+import tensorflow as tf
+
+import baselines.common.tf_util as U
+from baselines.ddpg.ddpg_learner import DDPG
+from baselines.ddpg.memory import Memory
+from baselines.ddpg.models import Actor, Critic
+
+STOCK_CNT = 27
+OBS_SHAPE = (STOCK_CNT * 2 + 9 * STOCK_CNT + 1,)
+ACTION_SHAPE = (STOCK_CNT,)
+
+
+def per_observation_store(agent, obs0, action, reward, obs1, done):
+    agent.memory.append_batch(obs0, action, reward, obs1, done)
+    for b in range(obs0.shape[0]):
+        agent.obs_rms.update(np.array([obs0[b]]))
+
+
+def batched_store(agent, obs0, action, reward, obs1, done):
+    agent.store_transition(obs0, action, reward, obs1, done)
+
+
+def steps_per_second(store, nenvs, nb_rollout_steps=100, nb_epoch_cycles=5):
+    with tf.Graph().as_default() as graph:
+        sess = U.make_session(num_cpu=1, make_default=True, graph=graph)
+        memory = Memory(limit=int(1e5), action_shape=ACTION_SHAPE, observation_shape=OBS_SHAPE)
+        agent = DDPG(Actor(ACTION_SHAPE[-1], network='mlp'), Critic(network='mlp'), memory,
+                     OBS_SHAPE, ACTION_SHAPE)
+        agent.initialize(sess)
+
+        obs = np.random.uniform(0, 100, size=(nenvs,) + OBS_SHAPE).astype(np.float32)
+        action = np.random.uniform(-1, 1, size=(nenvs,) + ACTION_SHAPE).astype(np.float32)
+        done = np.zeros(nenvs)
+
+        start = time.time()
+        for _ in range(nb_epoch_cycles):
+            for _ in range(nb_rollout_steps):
+                store(agent, obs, action, np.ones(nenvs), obs, done)
+            agent.flush_obs_stats()
+        elapsed = time.time() - start
+        sess.close()
+    return nb_epoch_cycles * nb_rollout_steps * nenvs / elapsed
+
+
+def main():
+    print('{:>6} {:>16} {:>16} {:>8}'.format('nenvs', 'per-obs steps/s', 'batched steps/s', 'speedup'))
+    for nenvs in (1, 8, 32):
+        before = steps_per_second(per_observation_store, nenvs)
+        after = steps_per_second(batched_store, nenvs)
+        print('{:>6} {:>16.0f} {:>16.0f} {:>7.1f}x'.format(nenvs, before, after, after / before))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+'''
+Train steps/sec of DDPG on Stock-v0 sized spaces with different target-network update
+schemes: one tf.assign op per variable fetched as a list (the previous behaviour), the
+single grouped soft-update op, and the grouped op every k steps with corrected tau.
+
+    python -m baselines.ddpg.benchmark_target_updates
+'''
+import time
+
+import numpy as np
+import tensorflow as tf
+
+import baselines.common.tf_util as U
+from baselines.ddpg.ddpg_learner import DDPG
+from baselines.ddpg.memory import Memory
+from baselines.ddpg.models import Actor, Critic
+
+STOCK_CNT = 27
+OBS_SHAPE = (STOCK_CNT * 2 + 9 * STOCK_CNT + 1,)
+ACTION_SHAPE = (STOCK_CNT,)
+
+
+def train_steps_per_second(target_update_interval=1, per_variable=False, nb_train_steps=500, batch_size=64):
+    with tf.Graph().as_default() as graph:
+        sess = U.make_session(num_cpu=1, make_default=True, graph=graph)
+        memory = Memory(limit=int(1e4), action_shape=ACTION_SHAPE, observation_shape=OBS_SHAPE)
+        agent = DDPG(Actor(ACTION_SHAPE[-1], network='mlp'), Critic(network='mlp'), memory,
+                     OBS_SHAPE, ACTION_SHAPE, batch_size=batch_size, tau=0.01,
+                     target_update_interval=target_update_interval)
+        per_variable_updates = [
+            tf.assign(t, (1. - agent.tau) * t + agent.tau * v)
+            for net, target in ((agent.actor, agent.target_actor), (agent.critic, agent.target_critic))
+            for v, t in zip(net.vars, target.vars)]
+        agent.initialize(sess)
+
+        n = 2000
+        memory.append_batch(np.random.uniform(0, 100, size=(n,) + OBS_SHAPE),
+                            np.random.uniform(-1, 1, size=(n,) + ACTION_SHAPE),
+                            np.random.randn(n), np.random.uniform(0, 100, size=(n,) + OBS_SHAPE), np.zeros(n))
+        agent.train()
+
+        start = time.time()
+        for _ in range(nb_train_steps):
+            agent.train()
+            if per_variable:
+                sess.run(per_variable_updates)
+            else:
+                agent.update_target_net()
+        elapsed = time.time() - start
+        sess.close()
+    return nb_train_steps / elapsed
+
+
+def main():
+    print('{:>28} {:>14}'.format('target update', 'train steps/s'))
+    print('{:>28} {:>14.1f}'.format('per-variable assigns', train_steps_per_second(per_variable=True)))
+    for k in (1, 4, 16):
+        print('{:>28} {:>14.1f}'.format('grouped, every {} steps'.format(k), train_steps_per_second(k)))
+
+
+if __name__ == '__main__':
+    main()
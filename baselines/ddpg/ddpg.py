@@ -3,14 +3,17 @@ import time
 from collections import deque
 import pickle
 
+from baselines.ddpg.async_learner import train_async
 from baselines.ddpg.ddpg_learner import DDPG
 from baselines.ddpg.models import Actor, Critic
-from baselines.ddpg.memory import Memory
+from baselines.ddpg.memory import Memory, PrioritizedMemory
 from baselines.ddpg.noise import AdaptiveParamNoiseSpec, NormalActionNoise, OrnsteinUhlenbeckActionNoise
+from baselines.ddpg.numpy_actor import snapshot_actions
+from baselines.evaluation import BackgroundEvaluator
 from baselines.common import set_global_seeds
 import baselines.common.tf_util as U
 
-from baselines import logger
+from baselines import logger, profiling
 import numpy as np
 
 try:
@@ -42,6 +45,20 @@ def learn(network, env,
           tau=0.01,
           eval_env=None,
           param_noise_adaption_interval=50,
+          prioritized_replay=False,
+          prioritized_replay_alpha=0.6,
+          prioritized_replay_beta=0.4,
+          replay_dir=None,
+          async_workers=0,
+          env_fn=None,
+          publish_interval=50,
+          max_staleness=10,
+          max_train_ratio=None,
+          target_update_interval=1,
+          test_interval=0,
+          test_env_fn=None,
+          nb_test_envs=1,
+          checkpoint_fn=None,
           **network_kwargs):
 
     set_global_seeds(seed)
@@ -60,7 +77,23 @@ def learn(network, env,
     nb_actions = env.action_space.shape[-1]
     assert (np.abs(env.action_space.low) == env.action_space.high).all()  # we assume symmetric actions.
 
-    memory = Memory(limit=int(1e6), action_shape=env.action_space.shape, observation_shape=env.observation_space.shape)
+    # With replay_dir, transitions live in a memory-mapped file per MPI worker and the
+    # ring position is checkpointed every epoch, so a crashed run resumes with its experience.
+    replay_storage_path = replay_checkpoint_path = None
+    if replay_dir is not None:
+        os.makedirs(replay_dir, exist_ok=True)
+        replay_storage_path = os.path.join(replay_dir, 'replay_{}.dat'.format(rank))
+        replay_checkpoint_path = os.path.join(replay_dir, 'replay_{}.npz'.format(rank))
+
+    if prioritized_replay:
+        memory = PrioritizedMemory(limit=int(1e6), action_shape=env.action_space.shape, observation_shape=env.observation_space.shape,
+            alpha=prioritized_replay_alpha, beta=prioritized_replay_beta, storage_path=replay_storage_path)
+    else:
+        memory = Memory(limit=int(1e6), action_shape=env.action_space.shape, observation_shape=env.observation_space.shape,
+            storage_path=replay_storage_path)
+    if replay_checkpoint_path is not None and os.path.exists(replay_checkpoint_path):
+        memory.restore(replay_checkpoint_path)
+        logger.info('restored {} transitions from {}'.format(memory.nb_entries, replay_checkpoint_path))
     critic = Critic(network=network, **network_kwargs)
     actor = Actor(nb_actions, network=network, **network_kwargs)
 
@@ -90,7 +123,7 @@ def learn(network, env,
         gamma=gamma, tau=tau, normalize_returns=normalize_returns, normalize_observations=normalize_observations,
         batch_size=batch_size, action_noise=action_noise, param_noise=param_noise, critic_l2_reg=critic_l2_reg,
         actor_lr=actor_lr, critic_lr=critic_lr, enable_popart=popart, clip_norm=clip_norm,
-        reward_scale=reward_scale)
+        reward_scale=reward_scale, target_update_interval=target_update_interval)
     logger.info('Using agent with the following configuration:')
     logger.info(str(agent.__dict__.items()))
 
@@ -103,6 +136,32 @@ def learn(network, env,
 
     agent.reset()
 
+    # test_interval > 0: every test_interval epoch cycles (nb_train_steps updates each), a copy of
+    # the actor weights is played noise-free on nb_test_envs envs from test_env_fn in a background
+    # process (rank 0 only). The actor is deterministic, so nb_test_envs > 1 only adds information
+    # if test_env_fn builds envs that differ from each other.
+    evaluator = None
+    if test_interval > 0 and rank == 0:
+        assert test_env_fn is not None, 'test_interval requires test_env_fn'
+        evaluator = BackgroundEvaluator(test_env_fn, snapshot_actions, nb_envs=nb_test_envs)
+
+    if async_workers > 0:
+        # Decoupled actor/learner: env_fn builds one env per rollout process, `env` only supplied the spaces.
+        assert env_fn is not None, 'async_workers requires env_fn'
+        assert MPI is None or MPI.COMM_WORLD.Get_size() == 1, 'async_workers runs on a single MPI worker'
+        train_async(agent, memory, env_fn, async_workers, max_action,
+            total_steps=nb_epochs * nb_epoch_cycles * nb_rollout_steps,
+            steps_per_epoch=nb_epoch_cycles * nb_rollout_steps,
+            nb_train_steps=nb_train_steps, nb_rollout_steps=nb_rollout_steps, batch_size=batch_size,
+            param_noise_adaption_interval=param_noise_adaption_interval, publish_interval=publish_interval,
+            max_staleness=max_staleness, max_train_ratio=max_train_ratio, seed=seed,
+            evaluator=evaluator, test_interval=test_interval)
+        if evaluator is not None:
+            evaluator.close()
+        if replay_checkpoint_path is not None:
+            memory.checkpoint(replay_checkpoint_path)
+        return agent
+
     obs = env.reset()
     if eval_env is not None:
         eval_obs = eval_env.reset()
@@ -133,14 +192,16 @@ def learn(network, env,
                 agent.reset()
             for t_rollout in range(nb_rollout_steps):
                 # Predict next action.
-                action, q, _, _ = agent.step(obs, apply_noise=True, compute_Q=True)
+                with profiling.phase('inference'):
+                    action, q, _, _ = agent.step(obs, apply_noise=True, compute_Q=True)
 
                 # Execute next action.
                 if rank == 0 and render:
                     env.render()
 
                 # max_action is of dimension A, whereas action is dimension (nenvs, A) - the multiplication gets broadcasted to the batch
-                new_obs, r, done, info = env.step(max_action * action)  # scale for execution in env (as far as DDPG is concerned, every action is in [-1, 1])
+                with profiling.phase('env_step'):
+                    new_obs, r, done, info = env.step(max_action * action)  # scale for execution in env (as far as DDPG is concerned, every action is in [-1, 1])
                 # note these outputs are batched from vecenv
 
                 t += 1
@@ -152,7 +213,8 @@ def learn(network, env,
                 # Book-keeping.
                 epoch_actions.append(action)
                 epoch_qs.append(q)
-                agent.store_transition(obs, action, r, new_obs, done) #the batched data will be unrolled in memory.py's append.
+                with profiling.phase('replay_store'):
+                    agent.store_transition(obs, action, r, new_obs, done) #the batched data will be unrolled in memory.py's append.
 
                 obs = new_obs
 
@@ -169,7 +231,8 @@ def learn(network, env,
                         if nenvs == 1:
                             agent.reset()
 
-
+            # Normalization stats for the whole rollout chunk are applied in one update.
+            agent.flush_obs_stats()
 
             # Train.
             epoch_actor_losses = []
@@ -178,13 +241,15 @@ def learn(network, env,
             for t_train in range(nb_train_steps):
                 # Adapt param noise, if necessary.
                 if memory.nb_entries >= batch_size and t_train % param_noise_adaption_interval == 0:
-                    distance = agent.adapt_param_noise()
+                    with profiling.phase('param_noise'):
+                        distance = agent.adapt_param_noise()
                     epoch_adaptive_distances.append(distance)
 
                 cl, al = agent.train()
                 epoch_critic_losses.append(cl)
                 epoch_actor_losses.append(al)
-                agent.update_target_net()
+                with profiling.phase('target_update'):
+                    agent.update_target_net()
 
             # Evaluate.
             eval_episode_rewards = []
@@ -206,6 +271,12 @@ def learn(network, env,
                             eval_episode_rewards_history.append(eval_episode_reward[d])
                             eval_episode_reward[d] = 0.0
 
+            if evaluator is not None and (epoch * nb_epoch_cycles + cycle + 1) % test_interval == 0:
+                with profiling.phase('test_snapshot'):
+                    evaluator.submit(t, agent.actor_snapshot(max_action))
+
+            profiling.step()
+
         if MPI is not None:
             mpi_size = MPI.COMM_WORLD.Get_size()
         else:
@@ -256,10 +327,25 @@ def learn(network, env,
 
         for key in sorted(combined_stats.keys()):
             logger.record_tabular(key, combined_stats[key])
+        if evaluator is not None:
+            evaluator.record_tabular()
+        profiling.record_tabular()
 
         if rank == 0:
             logger.dump_tabular()
         logger.info('')
+        if replay_checkpoint_path is not None:
+            memory.checkpoint(replay_checkpoint_path)
+        # checkpoint_fn(agent) may test on the env's other split; returned observations mean
+        # the env was reset, so the rollouts continue from them with new episodes
+        if checkpoint_fn is not None:
+            with profiling.phase('checkpoint'):
+                new_obs = checkpoint_fn(agent)
+            if new_obs is not None:
+                obs = new_obs
+                episode_reward[:] = 0.
+                episode_step[:] = 0
+                agent.reset()
         logdir = logger.get_dir()
         if rank == 0 and logdir:
             if hasattr(env, 'get_state'):
@@ -269,5 +355,6 @@ def learn(network, env,
                 with open(os.path.join(logdir, 'eval_env_state.pkl'), 'wb') as f:
                     pickle.dump(eval_env.get_state(), f)
 
-
+    if evaluator is not None:
+        evaluator.close()
     return agent
@@ -5,10 +5,11 @@ import numpy as np
 import tensorflow as tf
 import tensorflow.contrib as tc
 
-from baselines import logger
+from baselines import logger, profiling
 from baselines.common.mpi_adam import MpiAdam
 import baselines.common.tf_util as U
 from baselines.common.mpi_running_mean_std import RunningMeanStd
+from baselines.ddpg.numpy_actor import build_layers
 try:
     from mpi4py import MPI
 except ImportError:
@@ -34,6 +35,7 @@ def reduce_var(x, axis=None, keepdims=False):
     return tf.reduce_mean(devs_squared, axis=axis, keepdims=keepdims)
 
 def get_target_updates(vars, target_vars, tau):
+    '''tau may be a tensor (e.g. a placeholder), so one soft-update op serves several step sizes.'''
     logger.info('setting up target updates ...')
     soft_updates = []
     init_updates = []
@@ -67,7 +69,7 @@ class DDPG(object):
     def __init__(self, actor, critic, memory, observation_shape, action_shape, param_noise=None, action_noise=None,
         gamma=0.99, tau=0.001, normalize_returns=False, enable_popart=False, normalize_observations=True,
         batch_size=128, observation_range=(-5., 5.), action_range=(-1., 1.), return_range=(-np.inf, np.inf),
-        critic_l2_reg=0., actor_lr=1e-4, critic_lr=1e-3, clip_norm=None, reward_scale=1.):
+        critic_l2_reg=0., actor_lr=1e-4, critic_lr=1e-3, clip_norm=None, reward_scale=1., target_update_interval=1):
         # Inputs.
         self.obs0 = tf.placeholder(tf.float32, shape=(None,) + observation_shape, name='obs0')
         self.obs1 = tf.placeholder(tf.float32, shape=(None,) + observation_shape, name='obs1')
@@ -75,11 +77,18 @@ class DDPG(object):
         self.rewards = tf.placeholder(tf.float32, shape=(None, 1), name='rewards')
         self.actions = tf.placeholder(tf.float32, shape=(None,) + action_shape, name='actions')
         self.critic_target = tf.placeholder(tf.float32, shape=(None, 1), name='critic_target')
+        self.importance_weights = tf.placeholder_with_default(tf.ones_like(self.critic_target), shape=(None, 1), name='importance_weights')
         self.param_noise_stddev = tf.placeholder(tf.float32, shape=(), name='param_noise_stddev')
+        self.target_tau = tf.placeholder_with_default(np.float32(tau), shape=(), name='target_tau')
 
         # Parameters.
         self.gamma = gamma
         self.tau = tau
+        # Polyak-average the target networks every `target_update_interval` train steps, with tau
+        # corrected so the old target weights decay as if updated every step: (1 - tau) ** k.
+        self.target_update_interval = target_update_interval
+        self.target_update_tau = 1. - (1. - tau) ** target_update_interval
+        self.target_update_calls = 0
         self.memory = memory
         self.normalize_observations = normalize_observations
         self.normalize_returns = normalize_returns
@@ -105,6 +114,7 @@ class DDPG(object):
                 self.obs_rms = RunningMeanStd(shape=observation_shape)
         else:
             self.obs_rms = None
+        self.pending_obs_stats = None
         normalized_obs0 = tf.clip_by_value(normalize(self.obs0, self.obs_rms),
             self.observation_range[0], self.observation_range[1])
         normalized_obs1 = tf.clip_by_value(normalize(self.obs1, self.obs_rms),
@@ -147,10 +157,11 @@ class DDPG(object):
         self.initial_state = None # recurrent architectures not supported yet
 
     def setup_target_network_updates(self):
-        actor_init_updates, actor_soft_updates = get_target_updates(self.actor.vars, self.target_actor.vars, self.tau)
-        critic_init_updates, critic_soft_updates = get_target_updates(self.critic.vars, self.target_critic.vars, self.tau)
+        actor_init_updates, actor_soft_updates = get_target_updates(self.actor.vars, self.target_actor.vars, self.target_tau)
+        critic_init_updates, critic_soft_updates = get_target_updates(self.critic.vars, self.target_critic.vars, self.target_tau)
         self.target_init_updates = [actor_init_updates, critic_init_updates]
-        self.target_soft_updates = [actor_soft_updates, critic_soft_updates]
+        # A single grouped op for both networks: one fetch per update instead of a list of per-network groups.
+        self.target_soft_updates = tf.group(actor_soft_updates, critic_soft_updates, name='target_soft_updates')
 
     def setup_param_noise(self, normalized_obs0):
         assert self.param_noise is not None
@@ -183,7 +194,9 @@ class DDPG(object):
     def setup_critic_optimizer(self):
         logger.info('setting up critic optimizer')
         normalized_critic_target_tf = tf.clip_by_value(normalize(self.critic_target, self.ret_rms), self.return_range[0], self.return_range[1])
-        self.critic_loss = tf.reduce_mean(tf.square(self.normalized_critic_tf - normalized_critic_target_tf))
+        self.critic_td_error = self.normalized_critic_tf - normalized_critic_target_tf
+        # importance_weights defaults to ones; prioritized replay feeds its IS weights
+        self.critic_loss = tf.reduce_mean(self.importance_weights * tf.square(self.critic_td_error))
         if self.critic_l2_reg > 0.:
             critic_reg_vars = [var for var in self.critic.trainable_vars if var.name.endswith('/w:0') and 'output' not in var.name]
             for var in critic_reg_vars:
@@ -280,53 +293,91 @@ class DDPG(object):
     def store_transition(self, obs0, action, reward, obs1, terminal1):
         reward *= self.reward_scale
 
-        B = obs0.shape[0]
-        for b in range(B):
-            self.memory.append(obs0[b], action[b], reward[b], obs1[b], terminal1[b])
-            if self.normalize_observations:
-                self.obs_rms.update(np.array([obs0[b]]))
+        self.memory.append_batch(obs0, action, reward, obs1, terminal1)
+        if self.normalize_observations:
+            self.accumulate_obs_stats(obs0)
+
+    def accumulate_obs_stats(self, obs):
+        # Sufficient statistics (sum, sum of squares, count) in the layout RunningMeanStd.update reduces over MPI.
+        obs = np.asarray(obs, dtype='float64').reshape((-1,) + tuple(self.obs_rms.shape))
+        stats = np.concatenate([obs.sum(axis=0).ravel(), np.square(obs).sum(axis=0).ravel(), np.array([len(obs)], dtype='float64')])
+        if self.pending_obs_stats is None:
+            self.pending_obs_stats = stats
+        else:
+            self.pending_obs_stats += stats
+
+    def flush_obs_stats(self):
+        '''
+        Apply the observation statistics accumulated since the last flush to obs_rms with
+        a single (MPI-allreduced) update. Equivalent to calling obs_rms.update on every
+        observation, but costs one allreduce and one session call per rollout chunk.
+        '''
+        if self.pending_obs_stats is None:
+            return
+        n = int(np.prod(self.obs_rms.shape))
+        with profiling.phase('obs_stats'):
+            if MPI is not None:
+                totals = np.zeros_like(self.pending_obs_stats)
+                MPI.COMM_WORLD.Allreduce(self.pending_obs_stats, totals, op=MPI.SUM)
+            else:
+                totals = self.pending_obs_stats
+            self.obs_rms.incfiltparams(totals[0:n].reshape(self.obs_rms.shape), totals[n:2*n].reshape(self.obs_rms.shape), totals[2*n])
+        self.pending_obs_stats = None
 
     def train(self):
-        # Get a batch.
-        batch = self.memory.sample(batch_size=self.batch_size)
-
-        if self.normalize_returns and self.enable_popart:
-            old_mean, old_std, target_Q = self.sess.run([self.ret_rms.mean, self.ret_rms.std, self.target_Q], feed_dict={
-                self.obs1: batch['obs1'],
-                self.rewards: batch['rewards'],
-                self.terminals1: batch['terminals1'].astype('float32'),
-            })
-            self.ret_rms.update(target_Q.flatten())
-            self.sess.run(self.renormalize_Q_outputs_op, feed_dict={
-                self.old_std : np.array([old_std]),
-                self.old_mean : np.array([old_mean]),
-            })
+        self.flush_obs_stats()
 
-            # Run sanity check. Disabled by default since it slows down things considerably.
-            # print('running sanity check')
-            # target_Q_new, new_mean, new_std = self.sess.run([self.target_Q, self.ret_rms.mean, self.ret_rms.std], feed_dict={
-            #     self.obs1: batch['obs1'],
-            #     self.rewards: batch['rewards'],
-            #     self.terminals1: batch['terminals1'].astype('float32'),
-            # })
-            # print(target_Q_new, target_Q, new_mean, new_std)
-            # assert (np.abs(target_Q - target_Q_new) < 1e-3).all()
-        else:
-            target_Q = self.sess.run(self.target_Q, feed_dict={
-                self.obs1: batch['obs1'],
-                self.rewards: batch['rewards'],
-                self.terminals1: batch['terminals1'].astype('float32'),
-            })
-
-        # Get all gradients and perform a synced update.
-        ops = [self.actor_grads, self.actor_loss, self.critic_grads, self.critic_loss]
-        actor_grads, actor_loss, critic_grads, critic_loss = self.sess.run(ops, feed_dict={
-            self.obs0: batch['obs0'],
-            self.actions: batch['actions'],
-            self.critic_target: target_Q,
-        })
-        self.actor_optimizer.update(actor_grads, stepsize=self.actor_lr)
-        self.critic_optimizer.update(critic_grads, stepsize=self.critic_lr)
+        # Get a batch.
+        with profiling.phase('replay_sample'):
+            batch = self.memory.sample(batch_size=self.batch_size)
+
+        with profiling.phase('gradients'):
+            if self.normalize_returns and self.enable_popart:
+                old_mean, old_std, target_Q = self.sess.run([self.ret_rms.mean, self.ret_rms.std, self.target_Q], feed_dict={
+                    self.obs1: batch['obs1'],
+                    self.rewards: batch['rewards'],
+                    self.terminals1: batch['terminals1'].astype('float32'),
+                })
+                self.ret_rms.update(target_Q.flatten())
+                self.sess.run(self.renormalize_Q_outputs_op, feed_dict={
+                    self.old_std : np.array([old_std]),
+                    self.old_mean : np.array([old_mean]),
+                })
+
+                # Run sanity check. Disabled by default since it slows down things considerably.
+                # print('running sanity check')
+                # target_Q_new, new_mean, new_std = self.sess.run([self.target_Q, self.ret_rms.mean, self.ret_rms.std], feed_dict={
+                #     self.obs1: batch['obs1'],
+                #     self.rewards: batch['rewards'],
+                #     self.terminals1: batch['terminals1'].astype('float32'),
+                # })
+                # print(target_Q_new, target_Q, new_mean, new_std)
+                # assert (np.abs(target_Q - target_Q_new) < 1e-3).all()
+            else:
+                target_Q = self.sess.run(self.target_Q, feed_dict={
+                    self.obs1: batch['obs1'],
+                    self.rewards: batch['rewards'],
+                    self.terminals1: batch['terminals1'].astype('float32'),
+                })
+
+            # Get all gradients and perform a synced update.
+            ops = [self.actor_grads, self.actor_loss, self.critic_grads, self.critic_loss]
+            feed_dict = {
+                self.obs0: batch['obs0'],
+                self.actions: batch['actions'],
+                self.critic_target: target_Q,
+            }
+            prioritized = 'weights' in batch
+            if prioritized:
+                feed_dict[self.importance_weights] = batch['weights']
+                ops.append(self.critic_td_error)
+            results = self.sess.run(ops, feed_dict=feed_dict)
+        actor_grads, actor_loss, critic_grads, critic_loss = results[:4]
+        if prioritized:
+            self.memory.update_priorities(batch['idxs'], results[4])
+        with profiling.phase('sync'):
+            self.actor_optimizer.update(actor_grads, stepsize=self.actor_lr)
+            self.critic_optimizer.update(critic_grads, stepsize=self.critic_lr)
 
         return critic_loss, actor_loss
 
@@ -338,7 +389,23 @@ class DDPG(object):
         self.sess.run(self.target_init_updates)
 
     def update_target_net(self):
-        self.sess.run(self.target_soft_updates)
+        self.target_update_calls += 1
+        if self.target_update_calls % self.target_update_interval != 0:
+            return
+        if self.target_update_interval == 1:
+            self.sess.run(self.target_soft_updates)
+        else:
+            self.sess.run(self.target_soft_updates, feed_dict={self.target_tau: self.target_update_tau})
+
+    def actor_snapshot(self, max_action):
+        '''A NumPy copy of the actor and observation stats, for numpy_actor.snapshot_actions.'''
+        actor_vars = self.actor.trainable_vars
+        stats_ops = [self.obs_rms.mean, self.obs_rms.std] if self.normalize_observations else []
+        values = self.sess.run(actor_vars + stats_ops)
+        obs_mean, obs_std = values[len(actor_vars):] or (None, None)
+        return {'layers': build_layers([v.name for v in actor_vars], values[:len(actor_vars)]),
+                'obs_mean': obs_mean, 'obs_std': obs_std,
+                'observation_range': self.observation_range, 'max_action': max_action}
 
     def get_stats(self):
         if self.stats_sample is None:
@@ -1,35 +1,6 @@
-import numpy as np
-
-
-class RingBuffer(object):
-    def __init__(self, maxlen, shape, dtype='float32'):
-        self.maxlen = maxlen
-        self.start = 0
-        self.length = 0
-        self.data = np.zeros((maxlen,) + shape).astype(dtype)
+import os
 
-    def __len__(self):
-        return self.length
-
-    def __getitem__(self, idx):
-        if idx < 0 or idx >= self.length:
-            raise KeyError()
-        return self.data[(self.start + idx) % self.maxlen]
-
-    def get_batch(self, idxs):
-        return self.data[(self.start + idxs) % self.maxlen]
-
-    def append(self, v):
-        if self.length < self.maxlen:
-            # We have space, simply increase the length.
-            self.length += 1
-        elif self.length == self.maxlen:
-            # No space, "remove" the first item.
-            self.start = (self.start + 1) % self.maxlen
-        else:
-            # This should never happen.
-            raise RuntimeError()
-        self.data[(self.start + self.length - 1) % self.maxlen] = v
+import numpy as np
 
 
 def array_min2d(x):
@@ -40,44 +11,208 @@ def array_min2d(x):
 
 
 class Memory(object):
-    def __init__(self, limit, action_shape, observation_shape):
+    """
+    Replay memory backed by a single structured ring array, one record per
+    transition, so a whole VecEnv step is written with one fancy-indexed store.
+
+    With `storage_path` the ring array is an np.memmap file instead of RAM; an
+    existing file is reopened so its transitions survive a crashed run, and
+    checkpoint()/restore() persist the ring position alongside it.
+    """
+    def __init__(self, limit, action_shape, observation_shape, storage_path=None):
         self.limit = limit
+        self.dtype = np.dtype([
+            ('obs0', np.float32, observation_shape),
+            ('actions', np.float32, action_shape),
+            ('rewards', np.float32, (1,)),
+            ('terminals1', np.float32, (1,)),
+            ('obs1', np.float32, observation_shape),
+        ])
+        self.storage_path = storage_path
+        if storage_path is None:
+            self.storage = np.zeros(limit, dtype=self.dtype)
+        else:
+            mode = 'r+' if os.path.exists(storage_path) else 'w+'
+            self.storage = np.memmap(storage_path, dtype=self.dtype, mode=mode, shape=(limit,))
+        self.start = 0
+        self.length = 0
+
+    def _physical(self, idxs):
+        return (self.start + idxs) % self.limit
 
-        self.observations0 = RingBuffer(limit, shape=observation_shape)
-        self.actions = RingBuffer(limit, shape=action_shape)
-        self.rewards = RingBuffer(limit, shape=(1,))
-        self.terminals1 = RingBuffer(limit, shape=(1,))
-        self.observations1 = RingBuffer(limit, shape=observation_shape)
+    def _gather(self, physical_idxs):
+        records = self.storage[physical_idxs]
+        return {name: array_min2d(records[name]) for name in self.dtype.names}
 
     def sample(self, batch_size):
         # Draw such that we always have a proceeding element.
         batch_idxs = np.random.randint(self.nb_entries - 2, size=batch_size)
+        return self._gather(self._physical(batch_idxs))
 
-        obs0_batch = self.observations0.get_batch(batch_idxs)
-        obs1_batch = self.observations1.get_batch(batch_idxs)
-        action_batch = self.actions.get_batch(batch_idxs)
-        reward_batch = self.rewards.get_batch(batch_idxs)
-        terminal1_batch = self.terminals1.get_batch(batch_idxs)
-
-        result = {
-            'obs0': array_min2d(obs0_batch),
-            'obs1': array_min2d(obs1_batch),
-            'rewards': array_min2d(reward_batch),
-            'actions': array_min2d(action_batch),
-            'terminals1': array_min2d(terminal1_batch),
-        }
-        return result
-
-    def append(self, obs0, action, reward, obs1, terminal1, training=True):
+    def append_batch(self, obs0, actions, rewards, obs1, terminals1, training=True):
+        """
+        Store a batch of transitions (e.g. one step of every env in a VecEnv).
+        Returns the physical slots written, oldest transitions are overwritten first.
+        """
         if not training:
-            return
+            return None
+
+        n = len(obs0)
+        if n > self.limit:
+            # Only the newest `limit` transitions would survive anyway.
+            obs0, actions, rewards, obs1, terminals1 = [
+                np.asarray(x)[-self.limit:] for x in (obs0, actions, rewards, obs1, terminals1)]
+            n = self.limit
+        slots = self._physical(self.length + np.arange(n))
+        overflow = max(self.length + n - self.limit, 0)
+        self.length = min(self.length + n, self.limit)
+        self.start = (self.start + overflow) % self.limit
+
+        # Field views of the structured array, so each store writes in place.
+        self.storage['obs0'][slots] = obs0
+        self.storage['actions'][slots] = actions
+        self.storage['rewards'][slots] = np.reshape(rewards, (n, 1))
+        self.storage['terminals1'][slots] = np.reshape(terminals1, (n, 1))
+        self.storage['obs1'][slots] = obs1
+        return slots
 
-        self.observations0.append(obs0)
-        self.actions.append(action)
-        self.rewards.append(reward)
-        self.observations1.append(obs1)
-        self.terminals1.append(terminal1)
+    def append(self, obs0, action, reward, obs1, terminal1, training=True):
+        self.append_batch([obs0], [action], [reward], [obs1], [terminal1], training=training)
 
     @property
     def nb_entries(self):
-        return len(self.observations0)
+        return self.length
+
+    def state_dict(self):
+        return {'start': self.start, 'length': self.length}
+
+    def load_state_dict(self, state):
+        self.start = int(state['start'])
+        self.length = int(state['length'])
+
+    def checkpoint(self, path):
+        """
+        Atomically write the ring position to `path` (an .npz file). In-RAM
+        transitions are written too; memory-mapped ones are flushed in place.
+        """
+        state = self.state_dict()
+        if isinstance(self.storage, np.memmap):
+            self.storage.flush()
+        else:
+            state['storage'] = self.storage
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **state)
+        os.replace(tmp_path, path)
+
+    def restore(self, path):
+        with np.load(path) as state:
+            if 'storage' in state:
+                self.storage[:] = state['storage']
+            self.load_state_dict(state)
+
+
+class SegmentTree(object):
+    """
+    Binary segment tree over `capacity` leaves for an associative ufunc
+    (np.add for sums, np.minimum for minima). Updates are vectorized over a
+    batch of leaves and cost O(batch * log capacity).
+    """
+    def __init__(self, capacity, operation, neutral_element):
+        self.capacity = 1
+        while self.capacity < capacity:
+            self.capacity *= 2
+        self.operation = operation
+        self.tree = np.full(2 * self.capacity, neutral_element, dtype=np.float64)
+
+    def __setitem__(self, idxs, values):
+        idxs = np.asarray(idxs, dtype=np.int64) + self.capacity
+        self.tree[idxs] = values
+        idxs = np.unique(idxs // 2)
+        while idxs[0] >= 1:
+            self.tree[idxs] = self.operation(self.tree[2 * idxs], self.tree[2 * idxs + 1])
+            if idxs[0] == 1:
+                break
+            idxs = np.unique(idxs // 2)
+
+    def __getitem__(self, idxs):
+        return self.tree[np.asarray(idxs) + self.capacity]
+
+    def reduce(self):
+        return self.tree[1]
+
+
+class SumTree(SegmentTree):
+    def __init__(self, capacity):
+        super().__init__(capacity, np.add, 0.)
+
+    def find_prefixsum_idx(self, prefixsums):
+        """Leaf index i for each prefix sum such that sum(leaves[:i]) <= p < sum(leaves[:i+1])."""
+        idxs = np.ones(len(prefixsums), dtype=np.int64)
+        mass = np.array(prefixsums, dtype=np.float64)
+        while idxs[0] < self.capacity:
+            left = 2 * idxs
+            go_right = mass > self.tree[left]
+            mass = np.where(go_right, mass - self.tree[left], mass)
+            idxs = np.where(go_right, left + 1, left)
+        return idxs - self.capacity
+
+
+class PrioritizedMemory(Memory):
+    """
+    Proportional prioritized replay (Schaul et al., 2015) on top of Memory.
+    Sampling and priority updates are O(log n) per transition via sum/min trees.
+    """
+    def __init__(self, limit, action_shape, observation_shape, alpha=0.6, beta=0.4, eps=1e-6, storage_path=None):
+        super().__init__(limit, action_shape, observation_shape, storage_path=storage_path)
+        assert alpha >= 0
+        self.alpha = alpha
+        self.beta = beta
+        self.eps = eps
+        self.sum_tree = SumTree(limit)
+        self.min_tree = SegmentTree(limit, np.minimum, np.inf)
+        self.max_priority = 1.0
+
+    def append_batch(self, obs0, actions, rewards, obs1, terminals1, training=True):
+        slots = super().append_batch(obs0, actions, rewards, obs1, terminals1, training=training)
+        if slots is not None:
+            # New transitions are sampled at least once before their TD error is known.
+            priority = self.max_priority ** self.alpha
+            self.sum_tree[slots] = priority
+            self.min_tree[slots] = priority
+        return slots
+
+    def sample(self, batch_size, beta=None):
+        beta = self.beta if beta is None else beta
+        total = self.sum_tree.reduce()
+        # Stratified: one draw per equal-mass segment.
+        prefixsums = (np.arange(batch_size) + np.random.uniform(size=batch_size)) * (total / batch_size)
+        slots = np.minimum(self.sum_tree.find_prefixsum_idx(prefixsums), self.nb_entries - 1)
+
+        probs = self.sum_tree[slots] / total
+        min_prob = self.min_tree.reduce() / total
+        weights = (probs / min_prob) ** (-beta)
+
+        result = self._gather(slots)
+        result['weights'] = weights.astype(np.float32).reshape(-1, 1)
+        result['idxs'] = slots
+        return result
+
+    def update_priorities(self, idxs, td_errors):
+        priorities = np.abs(np.asarray(td_errors, dtype=np.float64)).flatten() + self.eps
+        self.sum_tree[idxs] = priorities ** self.alpha
+        self.min_tree[idxs] = priorities ** self.alpha
+        self.max_priority = max(self.max_priority, priorities.max())
+
+    def state_dict(self):
+        state = super().state_dict()
+        state['priorities'] = self.sum_tree[np.arange(self.limit)]
+        state['max_priority'] = self.max_priority
+        return state
+
+    def load_state_dict(self, state):
+        super().load_state_dict(state)
+        slots = np.arange(self.limit)
+        self.sum_tree[slots] = state['priorities']
+        self.min_tree[slots] = np.where(slots < self.length, state['priorities'], np.inf)
+        self.max_priority = float(state['max_priority'])
@@ -0,0 +1,89 @@
+'''
+NumPy re-implementation of the DDPG actor forward pass, so rollout worker processes
+can act with published weights without importing TensorFlow.
+
+Supports the 'mlp' network used by Actor: fully connected layers (optionally followed
+by layer normalization) with tanh activations, then a dense output layer with tanh.
+'''
+import numpy as np
+
+LAYER_NORM_EPSILON = 1e-12
+
+
+def flatten_params(arrays):
+    return np.concatenate([np.asarray(a, dtype=np.float32).ravel() for a in arrays])
+
+
+def unflatten_params(flat, shapes):
+    arrays = []
+    offset = 0
+    for shape in shapes:
+        size = int(np.prod(shape))
+        arrays.append(flat[offset:offset + size].reshape(shape))
+        offset += size
+    return arrays
+
+
+def build_layers(names, arrays):
+    '''
+    Group the actor's trainable variables (in creation order) into layers:
+    dicts with the weight matrix 'w', bias 'b' and optional layer norm 'gamma'/'beta'.
+    '''
+    layers = []
+    for name, value in zip(names, arrays):
+        if 'LayerNorm' in name:
+            key = 'gamma' if 'gamma' in name else 'beta'
+            layers[-1][key] = value
+        elif np.ndim(value) == 2:
+            layers.append({'w': value})
+        else:
+            layers[-1]['b'] = value
+    return layers
+
+
+def perturb_layers(layers, stddev, rng):
+    '''
+    Parameter-space noise as in get_perturbed_actor_updates: Gaussian noise on every
+    weight and bias, layer norm parameters are left untouched.
+    '''
+    perturbed = []
+    for layer in layers:
+        noisy = dict(layer)
+        for key in ('w', 'b'):
+            noisy[key] = layer[key] + rng.normal(0., stddev, size=layer[key].shape).astype(layer[key].dtype)
+        perturbed.append(noisy)
+    return perturbed
+
+
+def normalize_obs(obs, obs_mean, obs_std, observation_range=(-5., 5.)):
+    if obs_mean is None:
+        return obs
+    return np.clip((obs - obs_mean) / obs_std, observation_range[0], observation_range[1])
+
+
+def mlp_forward(layers, x, hidden_activation=np.tanh, output_activation=np.tanh):
+    h = np.asarray(x, dtype=np.float32).reshape(len(x), -1)
+    for i, layer in enumerate(layers):
+        h = h @ layer['w'] + layer['b']
+        if 'gamma' in layer:
+            mean = h.mean(axis=-1, keepdims=True)
+            var = h.var(axis=-1, keepdims=True)
+            h = (h - mean) / np.sqrt(var + LAYER_NORM_EPSILON) * layer['gamma'] + layer['beta']
+        activation = output_activation if i == len(layers) - 1 else hidden_activation
+        if activation is not None:
+            h = activation(h)
+    return h
+
+
+def actor_forward(layers, obs, obs_mean=None, obs_std=None, observation_range=(-5., 5.)):
+    '''Deterministic actions in [-1, 1] for a batch of raw observations.'''
+    return mlp_forward(layers, normalize_obs(np.asarray(obs, dtype=np.float32), obs_mean, obs_std, observation_range))
+
+
+def snapshot_actions(snapshot, obs):
+    '''
+    Noise-free actions, scaled to the env's action range, of an actor snapshot: a dict with
+    the 'layers' of build_layers, 'obs_mean', 'obs_std', 'observation_range' and 'max_action'.
+    '''
+    return snapshot['max_action'] * actor_forward(snapshot['layers'], obs, snapshot['obs_mean'],
+                                                  snapshot['obs_std'], snapshot['observation_range'])
@@ -0,0 +1,156 @@
+'''
+Asynchronous rollout workers for DDPG.
+
+Each worker process owns one environment and acts with a NumPy copy of the actor
+(see numpy_actor), so it never imports TensorFlow. The learner publishes actor
+weights and observation normalization stats into a shared-memory buffer with a
+version counter; workers pick up new versions between steps and push transitions,
+tagged with the version that produced them, through a bounded queue.
+'''
+import multiprocessing
+import queue
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from baselines.ddpg.numpy_actor import actor_forward, build_layers, perturb_layers, unflatten_params
+
+RolloutBatch = namedtuple('RolloutBatch', ['obs0', 'actions', 'rewards', 'obs1', 'terminals1',
+                                           'episode_returns', 'episode_steps', 'policy_version'])
+
+
+class SharedActorParams(object):
+    '''Versioned actor weights + observation stats in shared memory, one writer (the learner).'''
+    def __init__(self, ctx, param_shapes, observation_shape):
+        self.param_shapes = param_shapes
+        self.observation_shape = observation_shape
+        self.nb_params = sum(int(np.prod(s)) for s in param_shapes)
+        obs_size = int(np.prod(observation_shape))
+        self.buffer = ctx.RawArray('f', self.nb_params + 2 * obs_size)
+        self.version = ctx.RawValue('i', -1)
+        self.param_noise_stddev = ctx.RawValue('d', 0.)
+        self.lock = ctx.Lock()
+
+    def publish(self, flat_params, obs_mean, obs_std, param_noise_stddev=0.):
+        view = np.frombuffer(self.buffer, dtype=np.float32)
+        with self.lock:
+            view[:self.nb_params] = flat_params
+            view[self.nb_params:] = np.concatenate([np.ravel(obs_mean), np.ravel(obs_std)])
+            self.param_noise_stddev.value = param_noise_stddev
+            self.version.value += 1
+
+    def read(self):
+        with self.lock:
+            flat = np.frombuffer(self.buffer, dtype=np.float32).copy()
+            version = self.version.value
+            stddev = self.param_noise_stddev.value
+        params = unflatten_params(flat[:self.nb_params], self.param_shapes)
+        obs_mean, obs_std = [x.reshape(self.observation_shape) for x in np.split(flat[self.nb_params:], 2)]
+        return params, obs_mean, obs_std, stddev, version
+
+
+def run_rollout_worker(worker_id, env_fn, shared_params, param_names, transitions, stop_event,
+                       max_action, action_noise=None, param_noise=False, normalize_observations=True,
+                       observation_range=(-5., 5.), send_interval=16, seed=None):
+    rng = np.random.RandomState(None if seed is None else seed + worker_id)
+    np.random.seed(None if seed is None else seed + worker_id)  # action noise uses the global RNG
+    env = env_fn()
+    if seed is not None:
+        env.seed(seed + worker_id)
+
+    # Wait for the first published weights.
+    while shared_params.version.value < 0 and not stop_event.is_set():
+        stop_event.wait(0.01)
+
+    version = -1
+    layers = acting_layers = None
+    obs_mean = obs_std = None
+    obs = np.asarray(env.reset(), dtype=np.float32)
+    episode_return, episode_step = 0., 0
+    buf, episode_returns, episode_steps = [], [], []
+
+    while not stop_event.is_set():
+        if shared_params.version.value != version:
+            params, obs_mean, obs_std, stddev, version = shared_params.read()
+            layers = build_layers(param_names, params)
+            acting_layers = perturb_layers(layers, stddev, rng) if param_noise else layers
+            if not normalize_observations:
+                obs_mean = obs_std = None
+
+        action = actor_forward(acting_layers, obs[None], obs_mean, obs_std, observation_range)[0]
+        if action_noise is not None:
+            action = action + action_noise()
+        action = np.clip(action, -1., 1.)
+
+        new_obs, r, done, _ = env.step(max_action * action)
+        new_obs = np.asarray(new_obs, dtype=np.float32)
+        buf.append((obs, action, r, new_obs, float(done)))
+        episode_return += r
+        episode_step += 1
+
+        if done:
+            episode_returns.append(episode_return)
+            episode_steps.append(episode_step)
+            episode_return, episode_step = 0., 0
+            new_obs = np.asarray(env.reset(), dtype=np.float32)
+            if action_noise is not None:
+                action_noise.reset()
+            if param_noise:
+                acting_layers = perturb_layers(layers, shared_params.param_noise_stddev.value, rng)
+        obs = new_obs
+
+        if len(buf) >= send_interval:
+            obs0, actions, rewards, obs1, terminals1 = [np.array(x) for x in zip(*buf)]
+            batch = RolloutBatch(obs0, actions, rewards, obs1, terminals1, episode_returns, episode_steps, version)
+            buf, episode_returns, episode_steps = [], [], []
+            # Bounded queue: block (backpressure) while the learner is behind, but keep checking for stop.
+            while not stop_event.is_set():
+                try:
+                    transitions.put(batch, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+    env.close()
+
+
+class RolloutWorkerPool(object):
+    '''Starts `nb_workers` spawned rollout processes sharing one transition queue.'''
+    def __init__(self, env_fn, nb_workers, param_names, param_shapes, observation_shape, max_action,
+                 action_noise=None, param_noise=False, normalize_observations=True,
+                 observation_range=(-5., 5.), send_interval=16, queue_size=64, seed=None):
+        # spawn, not fork: the parent already holds a TensorFlow session.
+        ctx = multiprocessing.get_context('spawn')
+        self.shared_params = SharedActorParams(ctx, param_shapes, observation_shape)
+        self.transitions = ctx.Queue(maxsize=queue_size)
+        self.stop_event = ctx.Event()
+        self.processes = [
+            ctx.Process(target=run_rollout_worker, daemon=True,
+                        args=(i, env_fn, self.shared_params, param_names, self.transitions, self.stop_event,
+                              max_action, action_noise, param_noise, normalize_observations,
+                              observation_range, send_interval, seed))
+            for i in range(nb_workers)]
+        for p in self.processes:
+            p.start()
+
+    def publish(self, flat_params, obs_mean, obs_std, param_noise_stddev=0.):
+        self.shared_params.publish(flat_params, obs_mean, obs_std, param_noise_stddev)
+        return self.shared_params.version.value
+
+    def get(self, timeout=0.1):
+        try:
+            return self.transitions.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self, timeout=10.):
+        self.stop_event.set()
+        # Drain so workers blocked on a full queue can exit.
+        deadline = time.time() + timeout
+        while any(p.is_alive() for p in self.processes) and time.time() < deadline:
+            self.get(timeout=0.01)
+            for p in self.processes:
+                p.join(timeout=0.01)
+        for p in self.processes:
+            if p.is_alive():
+                p.terminate()
@@ -0,0 +1,76 @@
+import os
+import tempfile
+
+import numpy as np
+
+from baselines.ddpg.memory import Memory, PrioritizedMemory
+
+
+def _transitions(n, obs_dim=3, act_dim=2, offset=0):
+    steps = np.arange(offset, offset + n, dtype=np.float32)
+    obs0 = np.repeat(steps[:, None], obs_dim, axis=1)
+    actions = np.repeat(steps[:, None], act_dim, axis=1)
+    return obs0, actions, steps, obs0 + 1, np.zeros(n)
+
+
+def test_append_batch_matches_append():
+    single = Memory(10, (2,), (3,))
+    batched = Memory(10, (2,), (3,))
+    for offset in (0, 7, 14):
+        batch = _transitions(7, offset=offset)
+        for transition in zip(*batch):
+            single.append(*transition)
+        batched.append_batch(*batch)
+
+    assert single.nb_entries == batched.nb_entries == 10
+    idxs = np.arange(10)
+    for name in ('obs0', 'actions', 'rewards', 'terminals1', 'obs1'):
+        np.testing.assert_array_equal(single._gather(single._physical(idxs))[name],
+                                      batched._gather(batched._physical(idxs))[name])
+    # oldest surviving transition is step 11
+    assert batched._gather(batched._physical(idxs))['rewards'][0, 0] == 11
+
+
+def test_prioritized_sampling_follows_td_error():
+    np.random.seed(0)
+    memory = PrioritizedMemory(100, (2,), (3,), alpha=1.0, beta=1.0)
+    memory.append_batch(*_transitions(100))
+    td_errors = np.full(100, 1e-3)
+    td_errors[42] = 10.
+    memory.update_priorities(np.arange(100), td_errors)
+
+    batch = memory.sample(64)
+    assert np.mean(batch['idxs'] == 42) > 0.9
+    np.testing.assert_array_equal(batch['rewards'][:, 0], batch['idxs'])
+    # importance weights are normalized by the least likely transition
+    priorities = np.abs(td_errors) + memory.eps
+    np.testing.assert_allclose(batch['weights'][:, 0], priorities.min() / priorities[batch['idxs']], rtol=1e-5)
+    assert np.isclose(memory.sum_tree.reduce(), np.sum(np.abs(td_errors) + memory.eps))
+
+
+def test_memmap_checkpoint_resume():
+    with tempfile.TemporaryDirectory() as d:
+        storage_path = os.path.join(d, 'replay.dat')
+        checkpoint_path = os.path.join(d, 'replay.npz')
+        memory = PrioritizedMemory(10, (2,), (3,), storage_path=storage_path)
+        memory.append_batch(*_transitions(7))
+        memory.append_batch(*_transitions(6, offset=7))
+        memory.update_priorities(np.arange(3), [1., 2., 3.])
+        memory.checkpoint(checkpoint_path)
+        expected = memory._gather(memory._physical(np.arange(10)))
+        del memory
+
+        resumed = PrioritizedMemory(10, (2,), (3,), storage_path=storage_path)
+        resumed.restore(checkpoint_path)
+        assert resumed.storage.dtype == resumed.dtype
+        assert (resumed.start, resumed.nb_entries) == (3, 10)
+        actual = resumed._gather(resumed._physical(np.arange(10)))
+        for name in expected:
+            np.testing.assert_array_equal(expected[name], actual[name])
+        assert np.isclose(resumed.sum_tree[np.arange(3)], np.array([1., 2., 3.]) ** resumed.alpha, rtol=1e-5).all()
+
+
+if __name__ == '__main__':
+    test_append_batch_matches_append()
+    test_prioritized_sampling_follows_td_error()
+    test_memmap_checkpoint_resume()
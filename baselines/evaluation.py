@@ -0,0 +1,138 @@
+'''
+Evaluation of a learner's policy on the test split while it trains. A BackgroundEvaluator
+holds a pool of test envs in a spawned process; the learner submits snapshots of its
+weights every so often and keeps training while the process plays one noise-free episode
+per env with a batched act function, then reports the test-period final asset and Sharpe
+ratio. Results are logged with the learner's next logger.dump_tabular().
+'''
+import multiprocessing
+import queue
+
+import gym
+import numpy as np
+
+from baselines import logger
+
+# BaseEnv starts every episode with this much cash and reports asset changes as rewards
+INITIAL_ASSET = 10000
+TRADING_DAYS_PER_YEAR = 252
+
+
+def asset_curve(rewards, initial_asset=INITIAL_ASSET):
+    return initial_asset + np.concatenate([[0.], np.cumsum(rewards)])
+
+
+def max_drawdown(assets):
+    return float((assets / np.maximum.accumulate(assets) - 1.).min())
+
+
+def sharpe_ratio(assets, periods_per_year=TRADING_DAYS_PER_YEAR):
+    '''Annualized Sharpe ratio (zero risk-free rate) of the daily returns of an asset curve.'''
+    returns = np.diff(assets) / assets[:-1]
+    if len(returns) < 2 or returns.std() == 0:
+        return 0.
+    return float(np.sqrt(periods_per_year) * returns.mean() / returns.std())
+
+
+def make_eval_env(env_id):
+    env = gym.make(env_id)
+    # the stock test env otherwise writes its asset curve and a plot at every episode end
+    env.unwrapped.save_on_terminal = False
+    return env
+
+
+def rollout_assets(envs, act):
+    '''
+    Play one episode in each env, stepping all unfinished envs with one act() call on their
+    stacked observations; returns the asset curve of every env. The step that reports the end
+    of an episode repeats the previous reward, so it is left out of the curve.
+    '''
+    obs = [env.reset() for env in envs]
+    rewards = [[] for _ in envs]
+    active = list(range(len(envs)))
+    while active:
+        actions = act(np.stack([np.asarray(obs[i], dtype=np.float32) for i in active]))
+        running = []
+        for i, action in zip(active, actions):
+            obs[i], rew, done, _ = envs[i].step(action)
+            if not done:
+                rewards[i].append(rew)
+                running.append(i)
+        active = running
+    return [asset_curve(r) for r in rewards]
+
+
+def run_evaluator(env_fn, nb_envs, act_fn, snapshots, results):
+    envs = [env_fn() for _ in range(nb_envs)]
+    try:
+        for step, snapshot in iter(snapshots.get, None):
+            curves = rollout_assets(envs, lambda obs: act_fn(snapshot, obs))
+            results.put({
+                'snapshot_step': step,
+                'final_asset': float(np.mean([c[-1] for c in curves])),
+                'sharpe': float(np.mean([sharpe_ratio(c) for c in curves])),
+                'max_drawdown': float(np.mean([max_drawdown(c) for c in curves])),
+            })
+    finally:
+        for env in envs:
+            env.close()
+
+
+class BackgroundEvaluator(object):
+    '''
+    env_fn: builds one test env (picklable, it is called in the evaluator process); TestStock-v0
+    envs are all identical, so with a deterministic act_fn more than one of them (nb_envs > 1)
+    only pays off if env_fn makes them differ
+    act_fn: act_fn(snapshot, obs_batch) -> action batch, module-level so it can be pickled;
+    must not need TensorFlow, the snapshot is a plain copy of the weights
+    '''
+    def __init__(self, env_fn, act_fn, nb_envs=1):
+        # spawn, not fork: the parent already holds a TensorFlow session.
+        ctx = multiprocessing.get_context('spawn')
+        # at most one snapshot waits; submitting while the evaluator is busy drops the new one
+        self.snapshots = ctx.Queue(maxsize=1)
+        self.results = ctx.Queue()
+        self.nb_skipped = 0
+        self.process = ctx.Process(target=run_evaluator, daemon=True,
+                                   args=(env_fn, nb_envs, act_fn, self.snapshots, self.results))
+        self.process.start()
+
+    def submit(self, step, snapshot):
+        '''Queue a snapshot for evaluation without blocking; returns False if it was dropped.'''
+        try:
+            self.snapshots.put_nowait((step, snapshot))
+            return True
+        except queue.Full:
+            self.nb_skipped += 1
+            return False
+
+    def poll(self):
+        '''The results finished since the last call, oldest first.'''
+        finished = []
+        while True:
+            try:
+                finished.append(self.results.get_nowait())
+            except queue.Empty:
+                return finished
+
+    def record_tabular(self):
+        '''Record the latest finished evaluation as test/* columns for the next dump_tabular().'''
+        finished = self.poll()
+        if finished:
+            for key, value in finished[-1].items():
+                logger.record_tabular('test/' + key, value)
+        logger.record_tabular('test/skipped_snapshots', self.nb_skipped)
+
+    def close(self, timeout=10.):
+        # a snapshot still waiting is not worth evaluating any more
+        try:
+            self.snapshots.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            self.snapshots.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self.process.join(timeout=timeout)
+        if self.process.is_alive():
+            self.process.terminate()
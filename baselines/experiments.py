@@ -0,0 +1,141 @@
+'''
+Train and test one configuration over many seeds on a pool of worker processes, collecting
+every run's test-period asset curve and summary statistics into one JSON results file.
+Replaces running `baselines.run ... --play` in a shell loop: the stock CSVs are parsed once
+in this process before the workers fork, and each worker starts Python/TensorFlow once.
+
+    python -m baselines.experiments --seeds=100 --workers=8 --results=results.json \
+        --alg=ddpg --env=Stock-v0 --network=mlp --num_timesteps=1e4
+
+Arguments other than the ones below are passed to baselines.run for every seed, e.g.
+--persistent_envs=True to test each run on the training env workers.
+'''
+import argparse
+import json
+import multiprocessing
+import os
+import os.path as osp
+import queue
+import time
+import traceback
+
+import numpy as np
+
+from baselines.evaluation import INITIAL_ASSET, asset_curve, max_drawdown
+
+
+def run_seed(run_argv, seed, threads, logdir):
+    import tensorflow as tf
+    from baselines import logger, run
+    from baselines.split_vec_env import SplitVecEnv
+
+    args, unknown_args = run.common_arg_parser().parse_known_args(run_argv + ['--seed', str(seed)])
+    extra_args = run.parse_cmdline_kwargs(unknown_args)
+    logger.configure(logdir, ['csv', 'log'])
+
+    # run.build_env/build_testenv pick up this session through get_session()
+    config = tf.ConfigProto(allow_soft_placement=True,
+                            intra_op_parallelism_threads=threads,
+                            inter_op_parallelism_threads=threads)
+    with tf.Graph().as_default(), tf.Session(config=config).as_default():
+        model, env = run.train(args, extra_args)
+        if not isinstance(env, SplitVecEnv):
+            env.close()
+        env, obs = run.build_testenv(args, env)
+        rewards = run.play_test_episode(run.test_policy(args.alg, model, env.action_space), env, obs)
+        env.close()
+    return asset_curve(rewards)
+
+
+def _worker(run_argv, threads, results_dir, tasks, results):
+    for seed in iter(tasks.get, None):
+        tstart = time.time()
+        try:
+            assets = run_seed(run_argv, seed, threads, osp.join(results_dir, 'seed_{}'.format(seed)))
+            results.put((seed, assets, None, time.time() - tstart))
+        except Exception:
+            results.put((seed, None, traceback.format_exc(), time.time() - tstart))
+
+
+def summarize(runs):
+    finals = np.array([run['final_asset'] for run in runs if 'final_asset' in run])
+    if len(finals) == 0:
+        return {'runs': len(runs), 'failed': len(runs)}
+    drawdowns = np.array([run['max_drawdown'] for run in runs if 'max_drawdown' in run])
+    return {
+        'runs': len(runs),
+        'failed': len(runs) - len(finals),
+        'final_asset_mean': float(finals.mean()),
+        'final_asset_std': float(finals.std()),
+        'final_asset_min': float(finals.min()),
+        'final_asset_median': float(np.median(finals)),
+        'final_asset_max': float(finals.max()),
+        'total_return_mean': float(finals.mean() / INITIAL_ASSET - 1.),
+        'win_rate': float((finals > INITIAL_ASSET).mean()),
+        'max_drawdown_mean': float(drawdowns.mean()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seeds', type=int, default=100, help='number of seeds, run as seed_start, seed_start + 1, ...')
+    parser.add_argument('--seed_start', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--threads_per_worker', type=int, default=1, help='TF intra/inter op threads of each run')
+    parser.add_argument('--results', default='results.json')
+    parser.add_argument('--env', default='Stock-v0')
+    args, run_argv = parser.parse_known_args()
+    run_argv = run_argv + ['--env', args.env]
+    results_dir = osp.splitext(osp.abspath(args.results))[0]
+    os.makedirs(results_dir, exist_ok=True)
+
+    if 'Stock' in args.env:
+        # Parse the CSVs once; forked workers (and all their envs) share the parsed days.
+        from gym.envs.stock.stock_data import stock_data
+        stock_data().preload()
+
+    # fork, so the workers inherit the preloaded data; they are plain (non-daemon) processes
+    # because runs with --num_env > 1 start env subprocesses of their own
+    ctx = multiprocessing.get_context('fork')
+    tasks, results = ctx.Queue(), ctx.Queue()
+    seeds = list(range(args.seed_start, args.seed_start + args.seeds))
+    for seed in seeds:
+        tasks.put(seed)
+    nworkers = min(args.workers, len(seeds))
+    for _ in range(nworkers):
+        tasks.put(None)
+    workers = [ctx.Process(target=_worker, args=(run_argv, args.threads_per_worker, results_dir, tasks, results))
+               for _ in range(nworkers)]
+    for worker in workers:
+        worker.start()
+
+    runs = []
+    while len(runs) < len(seeds):
+        try:
+            seed, assets, error, seconds = results.get(timeout=10)
+        except queue.Empty:
+            if any(worker.is_alive() for worker in workers):
+                continue
+            print('all workers exited with {} runs missing'.format(len(seeds) - len(runs)), flush=True)
+            break
+        run = {'seed': seed, 'seconds': seconds}
+        if error is None:
+            run.update(final_asset=float(assets[-1]), max_drawdown=max_drawdown(assets), assets=assets.tolist())
+            print('seed {}: final asset {:.2f} ({:.0f}s)'.format(seed, assets[-1], seconds), flush=True)
+        else:
+            run['error'] = error
+            print('seed {} failed:\n{}'.format(seed, error), flush=True)
+        runs.append(run)
+    for worker in workers:
+        worker.join()
+
+    runs.sort(key=lambda run: run['seed'])
+    summary = summarize(runs)
+    with open(args.results, 'w') as f:
+        json.dump({'argv': run_argv, 'summary': summary, 'runs': runs}, f)
+    for key, value in summary.items():
+        print('{:>20} {}'.format(key, value))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+'''
+Export of a trained DDPG actor or PPO2 'mlp' policy to a compact .npz (layer weights plus
+observation normalization stats), and a NumPy-only NumpyPolicy that loads it and computes
+the deterministic actions for a batch of observations. Scoring an exported policy needs
+neither TensorFlow nor the baselines policy classes:
+
+    python -m baselines.run --alg=ddpg --env=Stock-v0 --export_policy=policy.npz
+    python -m baselines.numpy_policy policy.npz --env TestStock-v0 --nenvs 4
+'''
+import argparse
+
+import numpy as np
+
+from baselines.ddpg.numpy_actor import build_layers, mlp_forward, normalize_obs
+
+ACTIVATIONS = {'tanh': np.tanh, 'linear': None}
+
+
+def save_policy(path, layers, output_activation, obs_mean=None, obs_std=None, observation_range=(-5., 5.),
+                action_scale=1.):
+    '''
+    layers: as returned by build_layers; hidden layers use tanh, the last one output_activation
+    ('tanh' or 'linear'); actions are action_scale * the network output
+    '''
+    assert output_activation in ACTIVATIONS, output_activation
+    arrays = {}
+    for i, layer in enumerate(layers):
+        for key, value in layer.items():
+            arrays['layer{}/{}'.format(i, key)] = np.asarray(value, dtype=np.float32)
+    if obs_mean is not None:
+        arrays['obs_mean'] = np.asarray(obs_mean, dtype=np.float32)
+        arrays['obs_std'] = np.asarray(obs_std, dtype=np.float32)
+    np.savez(path, nb_layers=len(layers), output_activation=output_activation,
+             observation_range=np.asarray(observation_range, dtype=np.float32),
+             action_scale=np.asarray(action_scale, dtype=np.float32), **arrays)
+
+
+def _run_variables(sess, variables, extra=()):
+    values = sess.run(list(variables) + list(extra))
+    return values[:len(variables)], values[len(variables):]
+
+
+def export_ddpg(agent, max_action, path):
+    '''The actor of a ddpg.learn agent; max_action is the env's action_space.high.'''
+    actor_vars = agent.actor.trainable_vars
+    stats_ops = [agent.obs_rms.mean, agent.obs_rms.std] if agent.normalize_observations else []
+    values, stats = _run_variables(agent.sess, actor_vars, stats_ops)
+    obs_mean, obs_std = stats or (None, None)
+    save_policy(path, build_layers([v.name for v in actor_vars], values), 'tanh', obs_mean, obs_std,
+                agent.observation_range, max_action)
+
+
+def export_ppo2(model, path, scope='ppo2_model'):
+    '''
+    The 'mlp' policy of a ppo2.learn model with a continuous action space: the mean of the
+    action distribution, i.e. what model.step returns without sampling.
+    '''
+    pi_vars = [v for v in model.sess.graph.get_collection('trainable_variables', scope + '/pi/')
+               if 'logstd' not in v.name]
+    head = {scope + '/pi/w:0', scope + '/pi/b:0'}
+    if any('mlp_fc' not in v.name and 'LayerNorm' not in v.name and v.name not in head for v in pi_vars):
+        raise ValueError('only mlp policies can be exported, got variables {}'.format([v.name for v in pi_vars]))
+    # observations are normalized in the graph only with build_policy(normalize_observations=True)
+    rms = getattr(model.act_model, 'rms', None)
+    values, stats = _run_variables(model.sess, pi_vars, [rms.mean, rms.std] if rms is not None else [])
+    obs_mean, obs_std = stats or (None, None)
+    save_policy(path, build_layers([v.name for v in pi_vars], values), 'linear', obs_mean, obs_std)
+
+
+class NumpyPolicy(object):
+    '''A policy saved with save_policy; act() maps a batch of raw observations to actions.'''
+    def __init__(self, path):
+        with np.load(path) as data:
+            self.layers = []
+            for i in range(int(data['nb_layers'])):
+                prefix = 'layer{}/'.format(i)
+                self.layers.append({key[len(prefix):]: data[key] for key in data.files if key.startswith(prefix)})
+            self.output_activation = ACTIVATIONS[str(data['output_activation'])]
+            self.observation_range = tuple(data['observation_range'])
+            self.action_scale = data['action_scale']
+            self.obs_mean = data['obs_mean'] if 'obs_mean' in data.files else None
+            self.obs_std = data['obs_std'] if 'obs_std' in data.files else None
+
+    def act(self, obs):
+        obs = normalize_obs(np.asarray(obs, dtype=np.float32), self.obs_mean, self.obs_std, self.observation_range)
+        return self.action_scale * mlp_forward(self.layers, obs, output_activation=self.output_activation)
+
+
+def main():
+    from baselines.evaluation import make_eval_env, max_drawdown, rollout_assets, sharpe_ratio
+
+    parser = argparse.ArgumentParser(description='Score an exported policy on one episode per env.')
+    parser.add_argument('policy')
+    parser.add_argument('--env', default='TestStock-v0')
+    parser.add_argument('--nenvs', type=int, default=1)
+    args = parser.parse_args()
+
+    policy = NumpyPolicy(args.policy)
+    envs = [make_eval_env(args.env) for _ in range(args.nenvs)]
+    for i, assets in enumerate(rollout_assets(envs, policy.act)):
+        print('env {}: final asset {:.2f}, sharpe {:.3f}, max drawdown {:.3f}'.format(
+            i, assets[-1], sharpe_ratio(assets), max_drawdown(assets)))
+
+
+if __name__ == '__main__':
+    main()
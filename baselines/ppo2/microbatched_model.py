@@ -1,5 +1,4 @@
 import tensorflow as tf
-import numpy as np
 from baselines.ppo2.model import Model
 
 class MicrobatchedModel(Model):
@@ -25,9 +24,27 @@ class MicrobatchedModel(Model):
                 vf_coef=vf_coef,
                 max_grad_norm=max_grad_norm)
 
-        self.grads_ph = [tf.placeholder(dtype=g.dtype, shape=g.shape) for g in self.grads]
-        grads_ph_and_vars = list(zip(self.grads_ph, self.var))
-        self._apply_gradients_op = self.trainer.apply_gradients(grads_ph_and_vars)
+        # Gradients and stats are summed into accumulator variables inside the graph, so a
+        # microbatch step fetches nothing and the update never copies gradients to the host.
+        # They are local variables: not saved/loaded with the model.
+        with tf.variable_scope('microbatch_accum'):
+            self.grad_accums = [tf.Variable(tf.zeros(v.shape, dtype=g.dtype), trainable=False,
+                                            collections=[tf.GraphKeys.LOCAL_VARIABLES], name='grad{}'.format(i))
+                                for i, (g, v) in enumerate(zip(self.grads, self.var))]
+            self.stats_accum = tf.Variable(tf.zeros([len(self.stats_list)]), trainable=False,
+                                           collections=[tf.GraphKeys.LOCAL_VARIABLES], name='stats')
+        self._accumulate_op = tf.group(
+            [acc.assign_add(g) for acc, g in zip(self.grad_accums, self.grads)]
+            + [self.stats_accum.assign_add(tf.stack([tf.to_float(s) for s in self.stats_list]))])
+
+        # Update variables using average of the gradients, then zero the accumulators
+        mean_grads_and_vars = [(acc / self.nmicrobatches, v) for acc, v in zip(self.grad_accums, self.var)]
+        apply_op = self.trainer.apply_gradients(mean_grads_and_vars)
+        self._mean_stats = self.stats_accum / self.nmicrobatches
+        with tf.control_dependencies([apply_op, self._mean_stats]):
+            self._apply_accumulated_op = tf.group([acc.assign(tf.zeros_like(acc)) for acc in self.grad_accums]
+                                                  + [self.stats_accum.assign(tf.zeros_like(self.stats_accum))])
+        self.sess.run(tf.variables_initializer(self.grad_accums + [self.stats_accum]))
 
 
     def train(self, lr, cliprange, obs, returns, masks, actions, values, neglogpacs, states=None):
@@ -40,11 +57,8 @@ class MicrobatchedModel(Model):
         # Normalize the advantages
         advs = (advs - advs.mean()) / (advs.std() + 1e-8)
 
-        # Initialize empty list for per-microbatch stats like pg_loss, vf_loss, entropy, approxkl (whatever is in self.stats_list)
-        stats_vs = []
-
         for microbatch_idx in range(self.nmicrobatches):
-            _sli = range(microbatch_idx * self.microbatch_size, (microbatch_idx+1) * self.microbatch_size)
+            _sli = slice(microbatch_idx * self.microbatch_size, (microbatch_idx+1) * self.microbatch_size)
             td_map = {
                 self.train_model.X: obs[_sli],
                 self.A:actions[_sli],
@@ -55,22 +69,9 @@ class MicrobatchedModel(Model):
                 self.OLDVPRED:values[_sli]
             }
 
-            # Compute gradient on a microbatch (note that variables do not change here) ...
-            grad_v, stats_v  = self.sess.run([self.grads, self.stats_list], td_map)
-            if microbatch_idx == 0:
-                sum_grad_v = grad_v
-            else:
-                # .. and add to the total of the gradients
-                for i, g in enumerate(grad_v):
-                    sum_grad_v[i] += g
-            stats_vs.append(stats_v)
-
-        feed_dict = {ph: sum_g / self.nmicrobatches for ph, sum_g in zip(self.grads_ph, sum_grad_v)}
-        feed_dict[self.LR] = lr
-        # Update variables using average of the gradients
-        self.sess.run(self._apply_gradients_op, feed_dict)
-        # Return average of the stats
-        return np.mean(np.array(stats_vs), axis=0).tolist()
-
-
+            # Add the microbatch gradient and stats to the accumulators (variables do not change here)
+            self.sess.run(self._accumulate_op, td_map)
 
+        # Apply the average gradient and return the average of the stats
+        mean_stats, _ = self.sess.run([self._mean_stats, self._apply_accumulated_op], {self.LR: lr})
+        return mean_stats.tolist()
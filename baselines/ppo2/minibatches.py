@@ -0,0 +1,57 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+class MinibatchIterator(object):
+    """
+    Minibatches over a rollout for several optimization epochs.
+
+    Each epoch gathers every rollout array once, in that epoch's order, into a
+    preallocated contiguous buffer (one np.take per array), so minibatches are plain
+    slices (views) instead of a fancy-indexed copy per array per minibatch.
+
+    With prefetch=True a background thread gathers the next epoch into a second set of
+    buffers while the current epoch trains.
+    """
+    def __init__(self, prefetch=False):
+        self.prefetch = prefetch
+        self._buffers = [None, None]
+        self._executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        self._pending = None
+
+    def _gather(self, slot, arrays, perm):
+        buffers = self._buffers[slot]
+        if buffers is None or any(b.shape != a.shape or b.dtype != a.dtype for a, b in zip(arrays, buffers)):
+            buffers = self._buffers[slot] = [np.empty_like(a) for a in arrays]
+        for a, b in zip(arrays, buffers):
+            np.take(a, perm, axis=0, out=b)
+        return buffers
+
+    def epochs(self, arrays, perms, batch_size):
+        """
+        For each permutation in perms yield that epoch's minibatches: a list of
+        (start, slices), where slices[i] is arrays[i][perm[start:start + batch_size]].
+        The slices are only valid until the next epoch is requested.
+        """
+        arrays = [np.asarray(a) for a in arrays]
+        if self._pending is not None:
+            # A previous pass was abandoned with a gather in flight.
+            self._pending.result()
+            self._pending = None
+        for epoch, perm in enumerate(perms):
+            slot = epoch % 2 if self.prefetch else 0
+            if self._pending is not None:
+                buffers = self._pending.result()
+                self._pending = None
+            else:
+                buffers = self._gather(slot, arrays, perm)
+            if self.prefetch and epoch + 1 < len(perms):
+                # The other buffer set belonged to the previous epoch, which has been consumed.
+                self._pending = self._executor.submit(self._gather, 1 - slot, arrays, perms[epoch + 1])
+            yield [(start, tuple(b[start:start + batch_size] for b in buffers))
+                   for start in range(0, len(perm), batch_size)]
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
@@ -2,7 +2,7 @@ import os
 import time
 import numpy as np
 import os.path as osp
-from baselines import logger
+from baselines import logger, profiling
 from collections import deque
 from baselines.common import explained_variance, set_global_seeds
 from baselines.common.policies import build_policy
@@ -10,7 +10,8 @@ try:
     from mpi4py import MPI
 except ImportError:
     MPI = None
-from baselines.ppo2.runner import Runner
+from baselines.ppo2.minibatches import MinibatchIterator
+from baselines.ppo2.runner import Runner, DoubleBufferedRunner
 
 
 def constfn(val):
@@ -21,7 +22,8 @@ def constfn(val):
 def learn(*, network, env, total_timesteps, eval_env = None, seed=None, nsteps=2048, ent_coef=0.0, lr=3e-4,
             vf_coef=0.5,  max_grad_norm=0.5, gamma=0.99, lam=0.95,
             log_interval=10, nminibatches=4, noptepochs=4, cliprange=0.2,
-            save_interval=0, load_path=None, model_fn=None, **network_kwargs):
+            save_interval=0, load_path=None, model_fn=None, double_buffer=False,
+            prefetch_minibatches=False, checkpoint_fn=None, **network_kwargs):
     '''
     Learn policy using PPO algorithm (https://arxiv.org/abs/1707.06347)
 
@@ -70,6 +72,17 @@ def learn(*, network, env, total_timesteps, eval_env = None, seed=None, nsteps=2
 
     load_path: str                    path to load the model from
 
+    double_buffer: bool               step half of the envs while running policy inference for the other half
+                                      (see ppo2/runner.py DoubleBufferedRunner). Needs a SubprocVecEnv with an even
+                                      number of envs and a feed-forward policy.
+
+    prefetch_minibatches: bool        gather the next epoch's shuffled minibatch buffer on a background thread while the
+                                      current epoch trains (see ppo2/minibatches.py)
+
+    checkpoint_fn: function           called as checkpoint_fn(model) at every save_interval checkpoint, e.g. to test on
+                                      the env's test split (run.py test_at_checkpoint). If it returns observations, the
+                                      env was reset and the runner continues from them with new episodes.
+
     **network_kwargs:                 keyword arguments to the policy / network builder. See baselines.common/policies.py/build_policy and arguments to a particular type of network
                                       For instance, 'mlp' network architecture has arguments num_hidden and num_layers.
 
@@ -103,16 +116,23 @@ def learn(*, network, env, total_timesteps, eval_env = None, seed=None, nsteps=2
         from baselines.ppo2.model import Model
         model_fn = Model
 
-    model = model_fn(policy=policy, ob_space=ob_space, ac_space=ac_space, nbatch_act=nenvs, nbatch_train=nbatch_train,
+    # With double buffering the runner feeds the act model one half of the envs at a time, so its
+    # batch size is left open; the returned model still steps all nenvs observations (e.g. --play)
+    nbatch_act = None if double_buffer else nenvs
+    model = model_fn(policy=policy, ob_space=ob_space, ac_space=ac_space, nbatch_act=nbatch_act, nbatch_train=nbatch_train,
                     nsteps=nsteps, ent_coef=ent_coef, vf_coef=vf_coef,
                     max_grad_norm=max_grad_norm)
 
     if load_path is not None:
         model.load(load_path)
     # Instantiate the runner object
-    runner = Runner(env=env, model=model, nsteps=nsteps, gamma=gamma, lam=lam)
+    runner_fn = DoubleBufferedRunner if double_buffer else Runner
+    runner = runner_fn(env=env, model=model, nsteps=nsteps, gamma=gamma, lam=lam)
     if eval_env is not None:
-        eval_runner = Runner(env = eval_env, model = model, nsteps = nsteps, gamma = gamma, lam= lam)
+        eval_runner = runner_fn(env = eval_env, model = model, nsteps = nsteps, gamma = gamma, lam= lam)
+
+    # Shuffles each epoch into a contiguous buffer that minibatches slice
+    minibatches = MinibatchIterator(prefetch=prefetch_minibatches)
 
     epinfobuf = deque(maxlen=100)
     if eval_env is not None:
@@ -142,37 +162,42 @@ def learn(*, network, env, total_timesteps, eval_env = None, seed=None, nsteps=2
 
         # Here what we're going to do is for each minibatch calculate the loss and append it.
         mblossvals = []
+        arrays = (obs, returns, masks, actions, values, neglogpacs)
         if states is None: # nonrecurrent version
             # Index of each element of batch_size
             # Create the indices array
             inds = np.arange(nbatch)
+            perms = []
             for _ in range(noptepochs):
                 # Randomize the indexes
                 np.random.shuffle(inds)
-                # 0 to batch_size with batch_train_size step
-                for start in range(0, nbatch, nbatch_train):
-                    end = start + nbatch_train
-                    mbinds = inds[start:end]
-                    slices = (arr[mbinds] for arr in (obs, returns, masks, actions, values, neglogpacs))
-                    mblossvals.append(model.train(lrnow, cliprangenow, *slices))
+                perms.append(inds.copy())
+            # 0 to batch_size with batch_train_size step
+            for epoch in minibatches.epochs(arrays, perms, nbatch_train):
+                for _, slices in epoch:
+                    with profiling.phase('gradients'):
+                        mblossvals.append(model.train(lrnow, cliprangenow, *slices))
         else: # recurrent version
             assert nenvs % nminibatches == 0
             envsperbatch = nenvs // nminibatches
             envinds = np.arange(nenvs)
             flatinds = np.arange(nenvs * nsteps).reshape(nenvs, nsteps)
             envsperbatch = nbatch_train // nsteps
+            envperms = []
             for _ in range(noptepochs):
                 np.random.shuffle(envinds)
-                for start in range(0, nenvs, envsperbatch):
-                    end = start + envsperbatch
-                    mbenvinds = envinds[start:end]
-                    mbflatinds = flatinds[mbenvinds].ravel()
-                    slices = (arr[mbflatinds] for arr in (obs, returns, masks, actions, values, neglogpacs))
+                envperms.append(envinds.copy())
+            perms = [flatinds[p].ravel() for p in envperms]
+            for envperm, epoch in zip(envperms, minibatches.epochs(arrays, perms, envsperbatch * nsteps)):
+                for start, slices in epoch:
+                    mbenvinds = envperm[start // nsteps:start // nsteps + envsperbatch]
                     mbstates = states[mbenvinds]
-                    mblossvals.append(model.train(lrnow, cliprangenow, *slices, mbstates))
+                    with profiling.phase('gradients'):
+                        mblossvals.append(model.train(lrnow, cliprangenow, *slices, mbstates))
 
         # Feedforward --> get losses --> update
         lossvals = np.mean(mblossvals, axis=0)
+        profiling.step()
         # End timer
         tnow = time.time()
         # Calculate the fps (frame per second)
@@ -194,14 +219,24 @@ def learn(*, network, env, total_timesteps, eval_env = None, seed=None, nsteps=2
             logger.logkv('time_elapsed', tnow - tfirststart)
             for (lossval, lossname) in zip(lossvals, model.loss_names):
                 logger.logkv(lossname, lossval)
+            profiling.record_tabular()
             if MPI is None or MPI.COMM_WORLD.Get_rank() == 0:
-                logger.dumpkvs()
+                with profiling.phase('logging'):
+                    logger.dumpkvs()
         if save_interval and (update % save_interval == 0 or update == 1) and logger.get_dir() and (MPI is None or MPI.COMM_WORLD.Get_rank() == 0):
             checkdir = osp.join(logger.get_dir(), 'checkpoints')
             os.makedirs(checkdir, exist_ok=True)
             savepath = osp.join(checkdir, '%.5i'%update)
             print('Saving to', savepath)
             model.save(savepath)
+        if checkpoint_fn is not None and save_interval and (update % save_interval == 0 or update == 1):
+            with profiling.phase('checkpoint'):
+                obs = checkpoint_fn(model)
+            if obs is not None:
+                runner.obs[:] = obs
+                runner.states = model.initial_state
+                runner.dones = np.ones(runner.nenv, dtype=np.bool)
+    minibatches.close()
     return model
 # Avoid division error when calculate the mean (in our case if epinfo is empty returns np.nan, not return an error)
 def safemean(xs):
@@ -1,4 +1,6 @@
 import numpy as np
+from baselines.a2c.returns import gae_advantages
+from baselines import profiling
 from baselines.common.runners import AbstractEnvRunner
 
 class Runner(AbstractEnvRunner):
@@ -16,55 +18,131 @@ class Runner(AbstractEnvRunner):
         self.lam = lam
         # Discount rate
         self.gamma = gamma
+        # Rollout buffers, allocated once and laid out env-major (nenv, nsteps, ...) so the
+        # flattened batch run() returns is a reshape view of them rather than a copy.
+        # They are overwritten by the next run().
+        action = model.train_model.action
+        self.mb_obs = np.zeros((self.nenv, nsteps) + self.obs.shape[1:], dtype=self.obs.dtype)
+        self.mb_actions = np.zeros((self.nenv, nsteps) + tuple(action.shape.as_list()[1:]), dtype=action.dtype.as_numpy_dtype)
+        self.mb_rewards = np.zeros((self.nenv, nsteps), dtype=np.float32)
+        self.mb_values = np.zeros((self.nenv, nsteps), dtype=np.float32)
+        self.mb_neglogpacs = np.zeros((self.nenv, nsteps), dtype=np.float32)
+        self.mb_dones = np.zeros((self.nenv, nsteps), dtype=np.bool)
+        self.mb_returns = np.zeros((self.nenv, nsteps), dtype=np.float32)
 
     def run(self):
-        # Here, we init the lists that will contain the mb of experiences
-        mb_obs, mb_rewards, mb_actions, mb_values, mb_dones, mb_neglogpacs = [],[],[],[],[],[]
         mb_states = self.states
         epinfos = []
         # For n in range number of steps
-        for _ in range(self.nsteps):
+        for t in range(self.nsteps):
             # Given observations, get action value and neglopacs
             # We already have self.obs because Runner superclass run self.obs[:] = env.reset() on init
-            actions, values, self.states, neglogpacs = self.model.step(self.obs, S=self.states, M=self.dones)
-            mb_obs.append(self.obs.copy())
-            mb_actions.append(actions)
-            mb_values.append(values)
-            mb_neglogpacs.append(neglogpacs)
-            mb_dones.append(self.dones)
+            with profiling.phase('inference'):
+                actions, values, self.states, neglogpacs = self.model.step(self.obs, S=self.states, M=self.dones)
+            self.mb_obs[:, t] = self.obs
+            self.mb_actions[:, t] = actions
+            self.mb_values[:, t] = values
+            self.mb_neglogpacs[:, t] = neglogpacs
+            self.mb_dones[:, t] = self.dones
 
             # Take actions in env and look the results
             # Infos contains a ton of useful informations
-            self.obs[:], rewards, self.dones, infos = self.env.step(actions)
+            with profiling.phase('env_step'):
+                self.obs[:], rewards, self.dones, infos = self.env.step(actions)
             for info in infos:
                 maybeepinfo = info.get('episode')
                 if maybeepinfo: epinfos.append(maybeepinfo)
-            mb_rewards.append(rewards)
-        #batch of steps to batch of rollouts
-        mb_obs = np.asarray(mb_obs, dtype=self.obs.dtype)
-        mb_rewards = np.asarray(mb_rewards, dtype=np.float32)
-        mb_actions = np.asarray(mb_actions)
-        mb_values = np.asarray(mb_values, dtype=np.float32)
-        mb_neglogpacs = np.asarray(mb_neglogpacs, dtype=np.float32)
-        mb_dones = np.asarray(mb_dones, dtype=np.bool)
-        last_values = self.model.value(self.obs, S=self.states, M=self.dones)
-
-        # discount/bootstrap off value fn
-        mb_returns = np.zeros_like(mb_rewards)
-        mb_advs = np.zeros_like(mb_rewards)
-        lastgaelam = 0
-        for t in reversed(range(self.nsteps)):
-            if t == self.nsteps - 1:
-                nextnonterminal = 1.0 - self.dones
-                nextvalues = last_values
-            else:
-                nextnonterminal = 1.0 - mb_dones[t+1]
-                nextvalues = mb_values[t+1]
-            delta = mb_rewards[t] + self.gamma * nextvalues * nextnonterminal - mb_values[t]
-            mb_advs[t] = lastgaelam = delta + self.gamma * self.lam * nextnonterminal * lastgaelam
-        mb_returns = mb_advs + mb_values
-        return (*map(sf01, (mb_obs, mb_returns, mb_dones, mb_actions, mb_values, mb_neglogpacs)),
+            self.mb_rewards[:, t] = rewards
+        with profiling.phase('inference'):
+            last_values = self.model.value(self.obs, S=self.states, M=self.dones)
+        return self.finish_batch(last_values, mb_states, epinfos)
+
+    def finish_batch(self, last_values, mb_states, epinfos):
+        with profiling.phase('advantages'):
+            self.compute_returns(last_values)
+        return (*map(flatten_env_steps, (self.mb_obs, self.mb_returns, self.mb_dones, self.mb_actions, self.mb_values, self.mb_neglogpacs)),
             mb_states, epinfos)
+
+    def compute_returns(self, last_values):
+        # discount/bootstrap off value fn, on time-major (transposed) views of the buffers
+        # nonterminal[t] masks the bootstrap from step t+1: the done flag observed entering it
+        nonterminal = 1.0 - np.concatenate([self.mb_dones.T[1:], [self.dones]])
+        next_values = np.concatenate([self.mb_values.T[1:], [last_values]])
+        mb_advs = gae_advantages(self.mb_rewards.T, self.mb_values.T, next_values, nonterminal, self.gamma, self.lam)
+        np.add(mb_advs.T, self.mb_values, out=self.mb_returns, casting='unsafe')
+
+
+class SubprocEnvGroup(object):
+    """
+    step_async / step_wait on a subset of a SubprocVecEnv's worker processes, so
+    disjoint groups of its envs can be in flight independently
+    """
+    def __init__(self, venv, indices):
+        self.remotes = [venv.remotes[i] for i in indices]
+
+    def step_async(self, actions):
+        for remote, action in zip(self.remotes, actions):
+            remote.send(('step', action))
+
+    def step_wait(self):
+        results = [remote.recv() for remote in self.remotes]
+        obs, rews, dones, infos = zip(*results)
+        return np.stack(obs), np.stack(rews), np.stack(dones), infos
+
+
+class DoubleBufferedRunner(Runner):
+    """
+    Runner that splits the envs of a SubprocVecEnv into two halves and pipelines them:
+    while one half's envs step in their subprocesses, the policy runs inference for the
+    other half, so env latency hides behind inference latency (and vice versa).
+
+    The act model must accept a batch of nenv // 2 observations (ppo2.learn builds it with
+    nbatch_act=None); feed-forward policies only.
+    Produces the same batch layout as Runner.
+    """
+    def __init__(self, *, env, model, nsteps, gamma, lam):
+        super().__init__(env=env, model=model, nsteps=nsteps, gamma=gamma, lam=lam)
+        assert self.nenv % 2 == 0, 'double buffering needs an even number of envs'
+        assert hasattr(env, 'remotes'), 'double buffering needs a SubprocVecEnv'
+        assert self.states is None, 'double buffering does not support recurrent policies'
+        half = self.nenv // 2
+        self.group_slices = [slice(0, half), slice(half, self.nenv)]
+        self.groups = [SubprocEnvGroup(env, range(self.nenv)[sl]) for sl in self.group_slices]
+        self.dones = np.array(self.dones, dtype=np.bool)
+
+    def run(self):
+        epinfos = []
+        pending = None
+        for t in range(self.nsteps):
+            for g, sl in enumerate(self.group_slices):
+                # Inference for this group overlaps the other group's env step.
+                with profiling.phase('inference'):
+                    actions, values, _, neglogpacs = self.model.step(self.obs[sl], M=self.dones[sl])
+                self.mb_obs[sl, t] = self.obs[sl]
+                self.mb_actions[sl, t] = actions
+                self.mb_values[sl, t] = values
+                self.mb_neglogpacs[sl, t] = neglogpacs
+                self.mb_dones[sl, t] = self.dones[sl]
+                self.groups[g].step_async(actions)
+                if pending is not None:
+                    self._step_wait(*pending, epinfos=epinfos)
+                pending = (g, t)
+        self._step_wait(*pending, epinfos=epinfos)
+
+        last_values = np.concatenate([self.model.value(self.obs[sl], M=self.dones[sl]) for sl in self.group_slices])
+        return self.finish_batch(last_values, None, epinfos)
+
+    def _step_wait(self, g, t, epinfos):
+        sl = self.group_slices[g]
+        # only the env time not hidden behind inference
+        with profiling.phase('env_step'):
+            self.obs[sl], rewards, self.dones[sl], infos = self.groups[g].step_wait()
+        for info in infos:
+            maybeepinfo = info.get('episode')
+            if maybeepinfo: epinfos.append(maybeepinfo)
+        self.mb_rewards[sl, t] = rewards
+
+
 # obs, returns, masks, actions, values, neglogpacs, states = runner.run()
 def sf01(arr):
     """
@@ -73,4 +151,11 @@ def sf01(arr):
     s = arr.shape
     return arr.swapaxes(0, 1).reshape(s[0] * s[1], *s[2:])
 
+def flatten_env_steps(arr):
+    """
+    flatten axes 0 and 1 of an env-major (nenv, nsteps, ...) buffer; same order as sf01
+    of the time-major array, but a view instead of a copy
+    """
+    return arr.reshape((arr.shape[0] * arr.shape[1],) + arr.shape[2:])
+
 
@@ -0,0 +1,26 @@
+import numpy as np
+
+from baselines.ppo2.minibatches import MinibatchIterator
+
+
+def test_minibatches_match_fancy_indexing():
+    rng = np.random.RandomState(0)
+    nbatch, nbatch_train = 64, 16
+    arrays = (rng.randn(nbatch, 3, 2).astype(np.float32), rng.randn(nbatch), rng.rand(nbatch) < 0.5,
+              rng.randint(0, 4, size=nbatch))
+    perms = [rng.permutation(nbatch) for _ in range(3)]
+
+    for prefetch in (False, True):
+        minibatches = MinibatchIterator(prefetch=prefetch)
+        for _ in range(2):  # buffers are reused across updates
+            nepochs = 0
+            for perm, epoch in zip(perms, minibatches.epochs(arrays, perms, nbatch_train)):
+                assert len(epoch) == nbatch // nbatch_train
+                for start, slices in epoch:
+                    mbinds = perm[start:start + nbatch_train]
+                    for arr, sl in zip(arrays, slices):
+                        assert sl.flags['C_CONTIGUOUS'] and sl.dtype == arr.dtype
+                        np.testing.assert_array_equal(sl, arr[mbinds])
+                nepochs += 1
+            assert nepochs == len(perms)
+        minibatches.close()
@@ -0,0 +1,143 @@
+'''
+Phase timers for the learn() loops of ddpg, ppo2, a2c, acktr and trpo_mpi.
+
+Each loop wraps its phases (env_step, inference, advantages, gradients, sync, ...)
+in `profiling.phase(name)` and calls `profiling.step()` once per iteration; when it
+logs, `profiling.record_tabular()` adds the mean seconds per iteration spent in every
+phase as `time/<phase>` columns.
+
+Profiling is off by default, and then phase() returns a shared no-op context, so the
+hooks cost one attribute lookup. Enable it with configure() or through the environment:
+
+    BASELINES_PROFILE=<n>            time every n-th iteration (1 = every iteration)
+    BASELINES_PROFILE_TRACE=<path>   also write each timed phase as a Chrome trace event
+                                     (open in chrome://tracing or Perfetto); one file
+                                     per MPI rank when running under MPI
+'''
+import atexit
+import json
+import os
+import time
+
+from baselines import logger
+
+try:
+    from mpi4py import MPI
+except ImportError:
+    MPI = None
+
+
+class _NullPhase(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase(object):
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.profiler.add(self.name, self.start, time.perf_counter())
+        return False
+
+
+class Profiler(object):
+    def __init__(self, sample_every=0, trace_path=None):
+        '''
+        sample_every: time every n-th iteration, 0 disables profiling
+        trace_path: optional Chrome trace (JSON array format) output file
+        '''
+        self.sample_every = sample_every
+        self.sampling = sample_every > 0
+        self.iteration = 0
+        self.sampled_iterations = 0
+        self.totals = {}
+        self.trace = None
+        if trace_path is not None and sample_every > 0:
+            rank = MPI.COMM_WORLD.Get_rank() if MPI is not None else 0
+            if MPI is not None and MPI.COMM_WORLD.Get_size() > 1:
+                trace_path = '{}.{}'.format(trace_path, rank)
+            self.trace = open(trace_path, 'w')
+            # The closing bracket is optional in the trace format, so a crashed run still loads.
+            self.trace.write('[\n')
+            self.pid = rank
+
+    def phase(self, name):
+        if not self.sampling:
+            return _NULL_PHASE
+        return _Phase(self, name)
+
+    def add(self, name, start, end):
+        self.totals[name] = self.totals.get(name, 0.) + (end - start)
+        if self.trace is not None:
+            self.trace.write(json.dumps({'name': name, 'ph': 'X', 'pid': self.pid, 'tid': 0,
+                                         'ts': start * 1e6, 'dur': (end - start) * 1e6}) + ',\n')
+
+    def step(self):
+        '''Mark the end of one learn-loop iteration.'''
+        if self.sample_every <= 0:
+            return
+        if self.sampling:
+            self.sampled_iterations += 1
+        self.iteration += 1
+        self.sampling = self.iteration % self.sample_every == 0
+
+    def record_tabular(self):
+        '''Log mean seconds per sampled iteration for each phase since the last call.'''
+        if self.sampled_iterations == 0:
+            return
+        for name in sorted(self.totals):
+            logger.record_tabular('time/' + name, self.totals[name] / self.sampled_iterations)
+        self.totals = {}
+        self.sampled_iterations = 0
+        if self.trace is not None:
+            self.trace.flush()
+
+    def close(self):
+        if self.trace is not None:
+            self.trace.close()
+            self.trace = None
+
+
+_profiler = None
+
+
+def configure(sample_every=1, trace_path=None):
+    global _profiler
+    if _profiler is not None:
+        _profiler.close()
+    _profiler = Profiler(sample_every, trace_path)
+    return _profiler
+
+
+def get_profiler():
+    return _profiler
+
+
+def phase(name):
+    return _profiler.phase(name)
+
+
+def step():
+    _profiler.step()
+
+
+def record_tabular():
+    _profiler.record_tabular()
+
+
+configure(int(os.environ.get('BASELINES_PROFILE', 0)), os.environ.get('BASELINES_PROFILE_TRACE'))
+atexit.register(lambda: _profiler.close())
@@ -3,13 +3,17 @@ import multiprocessing
 import os.path as osp
 import gym
 from collections import defaultdict
+from functools import partial
 import tensorflow as tf
 import numpy as np
 
 from baselines.common.vec_env.vec_frame_stack import VecFrameStack
-from baselines.common.cmd_util import common_arg_parser, parse_unknown_args, make_vec_env
+from baselines.common.cmd_util import common_arg_parser, parse_unknown_args, make_vec_env, make_env
 from baselines.common.tf_util import get_session
 from baselines import bench, logger
+from baselines.evaluation import make_eval_env
+from baselines.numpy_policy import export_ddpg, export_ppo2
+from baselines.split_vec_env import SplitVecEnv
 from importlib import import_module
 
 from baselines.common.vec_env.vec_normalize import VecNormalize
@@ -58,11 +62,20 @@ def train(args, extra_args):
     total_timesteps = int(args.num_timesteps)
     seed = args.seed
 
+    # persistent_envs=True: the env workers also hold the test env, see build_testenv
+    persistent_envs = extra_args.pop('persistent_envs', False)
     learn = get_learn_function(args.alg)
     alg_kwargs = get_learn_function_defaults(args.alg, env_type)
     alg_kwargs.update(extra_args)
+    if alg_kwargs.get('test_interval') and args.alg != 'ddpg':
+        # checked before any env is built; other learners would only fail deep in the network builder
+        raise ValueError('test_interval (background test-split evaluation) is only supported by ddpg, '
+                         'not {}'.format(args.alg))
 
-    env = build_env(args)
+    env = build_split_env(args) if persistent_envs else build_env(args)
+    if persistent_envs and args.alg in ('ppo2', 'ddpg') and not alg_kwargs.get('async_workers'):
+        # test on the warm workers at every checkpoint (ppo2: save_interval, ddpg: epoch)
+        alg_kwargs['checkpoint_fn'] = partial(test_at_checkpoint, env=env, alg=args.alg)
 
     if args.network:
         alg_kwargs['network'] = args.network
@@ -70,6 +83,15 @@ def train(args, extra_args):
         if alg_kwargs.get('network') is None:
             alg_kwargs['network'] = get_default_network(env_type)
 
+    if alg_kwargs.get('async_workers'):
+        # Asynchronous DDPG rollout workers each build their own env from this.
+        alg_kwargs['env_fn'] = partial(gym.make, env_id)
+
+    if alg_kwargs.get('test_interval'):
+        # The background evaluator builds its pool of test-split envs from this.
+        _, test_env_id = get_env_type('TestStock-v0')
+        alg_kwargs['test_env_fn'] = partial(make_eval_env, test_env_id)
+
     print('Training {} on {}:{} with arguments \n{}'.format(args.alg, env_type, env_id, alg_kwargs))
 
     model = learn(
@@ -83,7 +105,15 @@ def train(args, extra_args):
 
 
 
-def build_testenv(args):
+def build_testenv(args, env=None):
+    '''
+    The TestStock-v0 env to run a trained model on and its reset observations; a SplitVecEnv
+    (the train env built with persistent_envs=True) is switched to its test split in place
+    instead of starting new workers.
+    '''
+    if isinstance(env, SplitVecEnv):
+        return env, env.set_split('test')
+
     ncpu = multiprocessing.cpu_count()
     if sys.platform == 'darwin': ncpu //= 2
     seed = args.seed
@@ -96,9 +126,82 @@ def build_testenv(args):
 
     env = make_vec_env(env_id, env_type, args.num_env or 1, seed, reward_scale=args.reward_scale)
 
+    return env, env.reset()
+
+
+def make_test_env(env_id, seed, subrank):
+    env = gym.make(env_id)
+    env.seed(seed + subrank if seed is not None else None)
     return env
 
 
+def build_split_env(args):
+    '''
+    Train env of persistent worker processes that also hold a TestStock-v0 env each, for
+    switching between the two with SplitVecEnv.set_split instead of respawning.
+    '''
+    env_type, env_id = get_env_type(args.env)
+    _, test_env_id = get_env_type('TestStock-v0')
+    rank = MPI.COMM_WORLD.Get_rank() if MPI else 0
+    nenv = args.num_env or 1
+
+    get_session(tf.ConfigProto(allow_soft_placement=True,
+                               intra_op_parallelism_threads=1,
+                               inter_op_parallelism_threads=1))
+
+    return SplitVecEnv({
+        'train': [partial(make_env, env_id=env_id, env_type=env_type, mpi_rank=rank, subrank=i, seed=args.seed,
+                          reward_scale=args.reward_scale) for i in range(nenv)],
+        'test': [partial(make_test_env, test_env_id, args.seed, i) for i in range(nenv)],
+    })
+
+
+def test_policy(alg, model, action_space):
+    '''
+    The trained model's actions for a batch of observations, as the env should receive them:
+    a ddpg agent acts without exploration noise (leaving the noise state alone) and its
+    [-1, 1] actions are scaled to the action space like ddpg.learn does.
+    '''
+    if alg == 'ddpg':
+        max_action = action_space.high
+        return lambda obs: max_action * model.step(obs, apply_noise=False, compute_Q=False)[0]
+    return lambda obs: model.step(obs)[0]
+
+
+def play_test_episode(act, env, obs):
+    '''
+    Step env with act(obs) (see test_policy) from the reset observations obs until the first
+    env's episode ends; returns that env's rewards.
+    '''
+    rewards = []
+    while True:
+        obs, rew, done, _ = env.step(act(obs))
+        if done[0]:
+            return np.array(rewards)
+        rewards.append(rew[0])
+
+
+def export_policy(alg, model, env, path):
+    '''Save the trained policy's weights to path for NumPy-only inference.'''
+    if alg == 'ddpg':
+        export_ddpg(model, env.action_space.high, path)
+    elif alg == 'ppo2':
+        export_ppo2(model, path)
+    else:
+        raise ValueError('policy export is implemented for ddpg and ppo2, not {}'.format(alg))
+    logger.log('Exported policy to {}'.format(path))
+
+
+def test_at_checkpoint(model, env, alg):
+    '''
+    Play one test episode on the workers of a SplitVecEnv and switch them back to training;
+    returns the reset training observations, which the learner continues from.
+    '''
+    rewards = play_test_episode(test_policy(alg, model, env.action_space), env, env.set_split('test'))
+    logger.log('Checkpoint test episode: {} steps, total reward {}'.format(len(rewards), rewards.sum()))
+    return env.set_split('train')
+
+
 def build_env(args):
     ncpu = multiprocessing.cpu_count()
     if sys.platform == 'darwin': ncpu //= 2
@@ -219,6 +322,8 @@ def main():
     arg_parser = common_arg_parser()
     args, unknown_args = arg_parser.parse_known_args()
     extra_args = parse_cmdline_kwargs(unknown_args)
+    # export_policy=<path>.npz: write the trained policy for baselines.numpy_policy
+    export_path = extra_args.pop('export_policy', None)
 
     if MPI is None or MPI.COMM_WORLD.Get_rank() == 0:
         rank = 0
@@ -228,7 +333,10 @@ def main():
         rank = MPI.COMM_WORLD.Get_rank()
 
     model, env = train(args, extra_args)
-    env.close()
+    if export_path is not None and rank == 0:
+        export_policy(args.alg, model, env, osp.expanduser(export_path))
+    if not isinstance(env, SplitVecEnv):
+        env.close()
 
     # if args.save_path is not None and rank == 0:
     #     save_path = osp.expanduser(args.save_path)
@@ -241,24 +349,11 @@ def main():
         # env.close()
 
         logger.log("Running trained model")
-        env = build_testenv(args)
-        obs = env.reset()
-        # done = False
-
-        # def initialize_placeholders(nlstm=128,**kwargs):
-        #     return np.zeros((args.num_env or 1, 2*nlstm)), np.zeros((1))
-        # state, done = initialize_placeholders(**extra_args)
-        for i in range(795):
-            
-            actions, _, _, _ = model.step(obs)
-            obs, _, done, _ = env.step(actions)
-            # env.render()
-            # done = done.any() if isinstance(done, np.ndarray) else done
-
-            # if done:
-            #     obs = env.reset()
+        env, obs = build_testenv(args, env)
+        rewards = play_test_episode(test_policy(args.alg, model, env.action_space), env, obs)
+        logger.log("Test episode: {} steps, total reward {}".format(len(rewards), rewards.sum()))
 
-        env.close()
+    env.close()
 
 
 
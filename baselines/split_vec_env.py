@@ -0,0 +1,107 @@
+'''
+A SubprocVecEnv-like VecEnv whose long-lived worker processes each hold one env per data
+split (e.g. Stock-v0 for 'train' and TestStock-v0 for 'test'). set_split() switches every
+worker to the other split's env and resets it, so evaluating a model on the test period
+after training or at a checkpoint does not respawn processes or reload the data.
+'''
+from multiprocessing import Pipe, Process
+
+import numpy as np
+
+from baselines.common.vec_env import CloudpickleWrapper, VecEnv
+
+
+def worker(remote, parent_remote, env_fns_wrapper):
+    parent_remote.close()
+    env_fns = env_fns_wrapper.x
+    envs = {}
+    split = 'train'
+    envs[split] = env = env_fns[split]()
+    try:
+        while True:
+            cmd, data = remote.recv()
+            if cmd == 'step':
+                ob, reward, done, info = env.step(data)
+                if done:
+                    ob = env.reset()
+                remote.send((ob, reward, done, info))
+            elif cmd == 'reset':
+                remote.send(env.reset())
+            elif cmd == 'set_split':
+                # the env of a split is built the first time it is used and kept afterwards
+                if data not in envs:
+                    envs[data] = env_fns[data]()
+                env = envs[data]
+                remote.send(env.reset())
+            elif cmd == 'get_spaces':
+                remote.send((env.observation_space, env.action_space))
+            elif cmd == 'close':
+                remote.close()
+                break
+            else:
+                raise NotImplementedError(cmd)
+    except KeyboardInterrupt:
+        print('SplitVecEnv worker: got KeyboardInterrupt')
+    finally:
+        for e in envs.values():
+            e.close()
+
+
+class SplitVecEnv(VecEnv):
+    def __init__(self, env_fns_by_split):
+        '''
+        env_fns_by_split: dict from split name to a list of env constructors, one per worker;
+        must contain 'train', which is the split the workers start on
+        '''
+        self.waiting = False
+        self.closed = False
+        self.split = 'train'
+        nenvs = len(env_fns_by_split['train'])
+        assert all(len(fns) == nenvs for fns in env_fns_by_split.values())
+        self.remotes, self.work_remotes = zip(*[Pipe() for _ in range(nenvs)])
+        self.ps = [Process(target=worker, args=(work_remote, remote, CloudpickleWrapper(
+                       {split: fns[i] for split, fns in env_fns_by_split.items()})))
+                   for i, (work_remote, remote) in enumerate(zip(self.work_remotes, self.remotes))]
+        for p in self.ps:
+            p.daemon = True  # if the main process crashes, we should not cause things to hang
+            p.start()
+        for remote in self.work_remotes:
+            remote.close()
+
+        self.remotes[0].send(('get_spaces', None))
+        observation_space, action_space = self.remotes[0].recv()
+        VecEnv.__init__(self, nenvs, observation_space, action_space)
+
+    def set_split(self, split):
+        '''Switch every worker to split's env; returns the reset observations.'''
+        assert not self.waiting
+        for remote in self.remotes:
+            remote.send(('set_split', split))
+        self.split = split
+        return np.stack([remote.recv() for remote in self.remotes])
+
+    def step_async(self, actions):
+        for remote, action in zip(self.remotes, actions):
+            remote.send(('step', action))
+        self.waiting = True
+
+    def step_wait(self):
+        results = [remote.recv() for remote in self.remotes]
+        self.waiting = False
+        obs, rews, dones, infos = zip(*results)
+        return np.stack(obs), np.stack(rews), np.stack(dones), infos
+
+    def reset(self):
+        for remote in self.remotes:
+            remote.send(('reset', None))
+        return np.stack([remote.recv() for remote in self.remotes])
+
+    def close_extras(self):
+        self.closed = True
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv()
+        for remote in self.remotes:
+            remote.send(('close', None))
+        for p in self.ps:
+            p.join()
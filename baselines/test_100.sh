@@ -1,6 +1,5 @@
 #!/bin/bash
-for (( c=1; c<=100; c++ ))
-do  
-   echo "Run $c times"
-   python -m baselines.run --alg=ddpg --env=Stock-v0 --network=mlp --num_timesteps=1e4 --play
-done
+# 100 seeds of DDPG on Stock-v0, each trained and run over the test period, on a process pool;
+# asset curves and summary statistics go to results.json
+python -m baselines.experiments --seeds=100 --results=results.json \
+    --alg=ddpg --env=Stock-v0 --network=mlp --num_timesteps=1e4 "$@"
@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+from baselines.ddpg.numpy_actor import actor_forward
+from baselines.numpy_policy import NumpyPolicy, export_ddpg, export_ppo2, save_policy
+
+
+def test_saved_policy_matches_actor_forward(tmpdir):
+    rng = np.random.RandomState(0)
+    layers = [{'w': rng.randn(6, 4).astype(np.float32), 'b': rng.randn(4).astype(np.float32),
+               'gamma': rng.rand(4).astype(np.float32), 'beta': rng.randn(4).astype(np.float32)},
+              {'w': rng.randn(4, 3).astype(np.float32), 'b': rng.randn(3).astype(np.float32)}]
+    obs_mean, obs_std = rng.randn(6), rng.rand(6) + .5
+    path = str(tmpdir.join('policy.npz'))
+    save_policy(path, layers, 'tanh', obs_mean, obs_std, (-5., 5.), 5. * np.ones(3))
+
+    obs = rng.randn(1000, 6) * 3
+    expected = 5. * actor_forward(layers, obs, obs_mean.astype(np.float32), obs_std.astype(np.float32))
+    np.testing.assert_allclose(NumpyPolicy(path).act(obs), expected, rtol=1e-5, atol=1e-6)
+
+
+def test_linear_output_without_normalization(tmpdir):
+    rng = np.random.RandomState(1)
+    layers = [{'w': rng.randn(5, 2).astype(np.float32), 'b': rng.randn(2).astype(np.float32)}]
+    path = str(tmpdir.join('policy.npz'))
+    save_policy(path, layers, 'linear')
+
+    obs = rng.randn(10, 5).astype(np.float32)
+    np.testing.assert_allclose(NumpyPolicy(path).act(obs), obs @ layers[0]['w'] + layers[0]['b'], rtol=1e-5)
+
+
+class FakeTensor(object):
+    def __init__(self, name, value):
+        self.name = name
+        self.value = np.asarray(value, dtype=np.float32)
+
+
+class FakeSession(object):
+    def __init__(self, tensors):
+        self.graph = self
+        self.tensors = tensors
+
+    def run(self, fetches):
+        return [t.value for t in fetches]
+
+    def get_collection(self, key, scope):
+        assert key == 'trainable_variables'
+        return [t for t in self.tensors if t.name.startswith(scope)]
+
+
+class Namespace(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def test_export_ddpg_groups_layer_norm_and_stats(tmpdir):
+    rng = np.random.RandomState(2)
+    actor_vars = [FakeTensor('actor/mlp_fc0/w:0', rng.randn(6, 4)), FakeTensor('actor/mlp_fc0/b:0', rng.randn(4)),
+                  FakeTensor('actor/LayerNorm/beta:0', rng.randn(4)), FakeTensor('actor/LayerNorm/gamma:0', rng.rand(4)),
+                  FakeTensor('actor/output/kernel:0', rng.randn(4, 3)), FakeTensor('actor/output/bias:0', rng.randn(3))]
+    obs_rms = Namespace(mean=FakeTensor('obs_rms/mean:0', rng.randn(6)), std=FakeTensor('obs_rms/std:0', rng.rand(6) + .5))
+    agent = Namespace(actor=Namespace(trainable_vars=actor_vars), obs_rms=obs_rms, normalize_observations=True,
+                      sess=FakeSession(actor_vars), observation_range=(-5., 5.))
+    path = str(tmpdir.join('ddpg.npz'))
+    export_ddpg(agent, 5. * np.ones(3), path)
+
+    v = [t.value for t in actor_vars]
+    layers = [{'w': v[0], 'b': v[1], 'beta': v[2], 'gamma': v[3]}, {'w': v[4], 'b': v[5]}]
+    obs = rng.randn(50, 6)
+    expected = 5. * actor_forward(layers, obs, obs_rms.mean.value, obs_rms.std.value)
+    np.testing.assert_allclose(NumpyPolicy(path).act(obs), expected, rtol=1e-5, atol=1e-6)
+
+
+def test_export_ppo2_takes_the_mean_head_and_rms_stats(tmpdir):
+    rng = np.random.RandomState(3)
+    pi_vars = [FakeTensor('ppo2_model/pi/mlp_fc0/w:0', rng.randn(6, 4)), FakeTensor('ppo2_model/pi/mlp_fc0/b:0', rng.randn(4)),
+               FakeTensor('ppo2_model/pi/w:0', rng.randn(4, 3)), FakeTensor('ppo2_model/pi/b:0', rng.randn(3)),
+               FakeTensor('ppo2_model/pi/logstd:0', rng.randn(1, 3))]
+    vf_vars = [FakeTensor('ppo2_model/vf/w:0', rng.randn(4, 1)), FakeTensor('ppo2_model/vf/b:0', rng.randn(1))]
+    rms = Namespace(mean=FakeTensor('ppo2_model/pi/rms/mean:0', rng.randn(6)),
+                    std=FakeTensor('ppo2_model/pi/rms/std:0', rng.rand(6) + .5))
+    model = Namespace(sess=FakeSession(pi_vars + vf_vars), act_model=Namespace(rms=rms))
+    path = str(tmpdir.join('ppo2.npz'))
+    export_ppo2(model, path)
+
+    obs = rng.randn(50, 6)
+    x = np.clip((obs - rms.mean.value) / rms.std.value, -5., 5.)
+    expected = np.tanh(x @ pi_vars[0].value + pi_vars[1].value) @ pi_vars[2].value + pi_vars[3].value
+    np.testing.assert_allclose(NumpyPolicy(path).act(obs), expected, rtol=1e-5, atol=1e-5)
+
+
+def test_export_ppo2_rejects_non_mlp_policies(tmpdir):
+    cnn_vars = [FakeTensor('ppo2_model/pi/c1/w:0', np.zeros((8, 8, 4, 32))), FakeTensor('ppo2_model/pi/c1/b:0', np.zeros(32))]
+    model = Namespace(sess=FakeSession(cnn_vars), act_model=Namespace())
+    with pytest.raises(ValueError):
+        export_ppo2(model, str(tmpdir.join('cnn.npz')))
@@ -10,6 +10,8 @@ STOCK_CNT = 27
 EXTRA_FEATURE_NAMES = ['vol', 'MACD', 'SAR', 'SMA', 'EMA', 'MACD_Hist', 'MACD_Signal', 'OBV','RSI']
 class BaseEnv(gym.Env):
     metadata = {'render.modes': ['human']}
+    # write the episode's results (save_results) when it reaches the terminal day
+    save_on_terminal = True
 
     def __init__(self, day = 0, money = 10 , scope = 1):
         self.day = day
@@ -69,7 +71,8 @@ class BaseEnv(gym.Env):
         self.terminal = self.reached_terminal(self.day)
         if self.reached_terminal(self.day):
             timestamp = datetime.now().strftime('%Y%m%d%H%M')
-            self.save_results(timestamp)
+            if self.save_on_terminal:
+                self.save_results(timestamp)
             print('total asset: {}'.format(self.state[0] + sum(np.array(self.state[1:STOCK_CNT+1]) * np.array(
                 self._get_current_holdings()))))
             return self.state, self.reward, self.terminal, {}
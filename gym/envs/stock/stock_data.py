@@ -5,6 +5,10 @@ from os import environ
 
 stock_home = environ['STOCK_HOME']
 class stock_data():
+    # (csv_home, test_start) -> (training_daily_data, test_daily_data), shared by every env in the
+    # process and, when preload() runs before forking, by forked workers
+    _daily_data_cache = {}
+
     def __init__(self, csv_home=stock_home, test_start=20160101):
         self.training_daily_data = []
         self.test_daily_data = []
@@ -52,9 +56,16 @@ class stock_data():
         return dji
 
 
+    def preload(self):
+        self._conditional_data_init()
+        return self
+
     def _conditional_data_init(self):
         if len(self.training_daily_data) == 0:
-            self.training_daily_data, self.test_daily_data = self.data_init_av()
+            key = (self.stock_home, self.test_start)
+            if key not in stock_data._daily_data_cache:
+                stock_data._daily_data_cache[key] = self.data_init_av()
+            self.training_daily_data, self.test_daily_data = stock_data._daily_data_cache[key]
 
     def data_init(self):
         data_1 = pd.read_csv('{0}/dow_jones_30_daily_price.csv'.format(self.stock_home))
@@ -2,7 +2,6 @@ from gym.envs.stock.base_env import BaseEnv
 from os import environ
 from collections import defaultdict
 import numpy as np
-import matplotlib.pyplot as plt
 
 stock_home = environ['STOCK_HOME']
 _lambda = 1
@@ -34,6 +33,8 @@ class StockEnv(BaseEnv):
         return day >= 1761
 
     def save_results(self, timestamp):
+        # imported here so env workers only load matplotlib when an episode ends
+        import matplotlib.pyplot as plt
         plt.plot(self.asset_memory, 'r')
         plt.savefig('{}/{}.png'.format(stock_home, timestamp))
         plt.close()
@@ -1,4 +1,3 @@
-import matplotlib.pyplot as plt
 from os import environ, mkdir
 from os.path import isdir
 from datetime import datetime
@@ -17,6 +16,8 @@ class StockTestEnv(BaseEnv):
         return day >= 794#685
 
     def save_results(self, timestamp):
+        # imported here so env workers only load matplotlib when an episode ends
+        import matplotlib.pyplot as plt
         plt.plot(self.asset_memory, 'r')
         timestamp = datetime.now().strftime('%Y%m%d%H%M%s')
         if not isdir('{}/results'.format(stock_home)):
@@ -6,33 +6,85 @@ This package provides utilities and implementations for backtesting various inve
 Modules:
 - backtest_utils: Common utilities for data download, performance calculation, and visualization
 - strategies: Standardized strategy implementations (9Sig, Eric's strategy, static leverage, etc.)
+- analytics: Vectorized drawdown, streak, Ulcer, Calmar and Sortino kernels for batches of value series
+- ledger: Cash sleeve, margin borrowing and FX conversion as vectorized daily accrual
+- streaming: Out-of-core streaming backtests over partitioned price files
+
+Names are resolved lazily on first attribute access, so importing the package
+does not load any submodule (or pandas) until something is actually used.
 """
 
-from backtest_utils import (
-    download_price_data,
-    download_dividend_data,
-    reinvest_dividends,
-    calculate_performance_stats,
-    create_comparison_plot,
-    print_performance_summary,
-    get_quarterly_rebalance_dates,
-    get_annual_rebalance_dates,
-    rebalance_portfolio
-)
-
-from strategies import (
-    backtest_9sig_strategy,
-    backtest_static_leverage_strategy,
-    backtest_eric_strategy,
-    backtest_buy_and_hold,
-    ERIC_STRATEGY_BTC,
-    ERIC_STRATEGY_GOLD,
-    TICKERS_9SIG,
-    TICKERS_STATIC_14X,
-    TICKERS_STATIC_1X,
-    TICKERS_ERIC_BTC,
-    TICKERS_ERIC_GOLD
-)
+from importlib import import_module
+
+_LAZY_IMPORTS = {
+    "backtest_utils": [
+        "download_price_data",
+        "download_dividend_data",
+        "reinvest_dividends",
+        "calculate_performance_stats",
+        "create_comparison_plot",
+        "print_performance_summary",
+        "get_quarterly_rebalance_dates",
+        "get_annual_rebalance_dates",
+        "rebalance_portfolio",
+    ],
+    "strategies": [
+        "backtest_9sig_strategy",
+        "backtest_static_leverage_strategy",
+        "backtest_eric_strategy",
+        "backtest_buy_and_hold",
+        "ERIC_STRATEGY_BTC",
+        "ERIC_STRATEGY_GOLD",
+        "TICKERS_9SIG",
+        "TICKERS_STATIC_14X",
+        "TICKERS_STATIC_1X",
+        "TICKERS_ERIC_BTC",
+        "TICKERS_ERIC_GOLD",
+    ],
+    "analytics": [
+        "underwater_curve",
+        "drawdown_stats",
+        "longest_losing_streak",
+        "sortino_ratio",
+        "calmar_ratio",
+    ],
+    "ledger": [
+        "accrual_index",
+        "convert_currency",
+        "convert_dividends",
+        "with_margin",
+        "CashLedger",
+    ],
+    "streaming": [
+        "write_price_partitions",
+        "iter_price_partitions",
+        "StreamingPortfolio",
+        "stream_backtest",
+        "stream_9sig_strategy",
+        "stream_static_leverage_strategy",
+        "stream_eric_strategy",
+        "stream_buy_and_hold",
+        "collect_stream",
+    ],
+}
+
+_NAME_TO_MODULE = {name: module for module, names in _LAZY_IMPORTS.items() for name in names}
+
+__all__ = list(_NAME_TO_MODULE)
+
+
+def __getattr__(name):
+    module = _NAME_TO_MODULE.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
+
 
 __version__ = "1.0.0"
 __author__ = "Quantitative Strategy Team"
@@ -0,0 +1,220 @@
+"""
+Vectorized drawdown and streak analytics for batches of portfolio value series.
+
+All functions accept a single value series of shape (days,) or a batch of
+shape (days, n_series) -- the same layout as a DataFrame with one column per
+strategy -- and run in O(days * n_series). When Numba is installed the
+drawdown statistics use a compiled single-pass kernel, otherwise they fall
+back to NumPy ufunc accumulations with identical results.
+"""
+
+from typing import Dict, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+ArrayLike = Union[np.ndarray, pd.Series, pd.DataFrame]
+
+TRADING_DAYS = 252
+
+
+def _as_batch(values: ArrayLike) -> np.ndarray:
+    """Convert input to a float (days, n_series) array."""
+    arr = np.asarray(values, dtype=float)
+    if arr.ndim == 1:
+        arr = arr[:, None]
+    if arr.ndim != 2:
+        raise ValueError(f"Expected 1-D or 2-D values, got shape {arr.shape}")
+    return arr
+
+
+def _run_lengths(mask: np.ndarray) -> np.ndarray:
+    """Length of the current run of True values at each row, per column."""
+    rows = np.arange(mask.shape[0])[:, None]
+    last_false = np.maximum.accumulate(np.where(mask, -1, rows), axis=0)
+    return rows - last_false
+
+
+def underwater_curve(values: ArrayLike) -> np.ndarray:
+    """
+    Drawdown from the running peak at every day.
+
+    Args:
+        values: Portfolio values, shape (days,) or (days, n_series)
+
+    Returns:
+        Array of drawdowns (<= 0) with shape (days, n_series)
+    """
+    v = _as_batch(values)
+    return v / np.maximum.accumulate(v, axis=0) - 1.0
+
+
+def longest_losing_streak(values: ArrayLike) -> np.ndarray:
+    """
+    Longest run of consecutive down days.
+
+    Args:
+        values: Portfolio values, shape (days,) or (days, n_series)
+
+    Returns:
+        Array of streak lengths in days, one per series
+    """
+    v = _as_batch(values)
+    if len(v) < 2:
+        return np.zeros(v.shape[1], dtype=np.int64)
+    return _run_lengths(np.diff(v, axis=0) < 0).max(axis=0)
+
+
+def _drawdown_stats_numpy(v: np.ndarray):
+    n_days = v.shape[0]
+    dd = v / np.maximum.accumulate(v, axis=0) - 1.0
+    underwater = dd < 0
+
+    trough = dd.argmin(axis=0)
+    rows = np.arange(n_days)[:, None]
+    at_peak = ~underwater
+    # Last new high at or before the trough, first one after it
+    peak = n_days - 1 - np.argmax((at_peak & (rows <= trough))[::-1], axis=0)
+    after = at_peak & (rows > trough)
+    recovery = np.where(after.any(axis=0), np.argmax(after, axis=0), -1)
+
+    return (dd.min(axis=0), _run_lengths(underwater).max(axis=0),
+            peak, trough, recovery, np.sqrt(np.mean(dd**2, axis=0)),
+            underwater.mean(axis=0))
+
+
+def _drawdown_stats_loop(v):
+    n_days, n_series = v.shape
+    mdd = np.zeros(n_series)
+    max_duration = np.zeros(n_series, dtype=np.int64)
+    peak_idx = np.zeros(n_series, dtype=np.int64)
+    trough_idx = np.zeros(n_series, dtype=np.int64)
+    recovery_idx = np.full(n_series, -1, dtype=np.int64)
+    ulcer = np.zeros(n_series)
+    time_underwater = np.zeros(n_series)
+
+    for j in range(n_series):
+        peak = v[0, j]
+        last_high = 0
+        run = 0
+        sq_sum = 0.0
+        under_days = 0
+        for t in range(n_days):
+            x = v[t, j]
+            if x >= peak:
+                peak = x
+                last_high = t
+                run = 0
+                if recovery_idx[j] < 0 and t > trough_idx[j]:
+                    recovery_idx[j] = t
+            else:
+                run += 1
+                under_days += 1
+                if run > max_duration[j]:
+                    max_duration[j] = run
+            dd = x / peak - 1.0
+            sq_sum += dd * dd
+            if dd < mdd[j]:
+                mdd[j] = dd
+                trough_idx[j] = t
+                peak_idx[j] = last_high
+                recovery_idx[j] = -1
+        ulcer[j] = np.sqrt(sq_sum / n_days)
+        time_underwater[j] = under_days / n_days
+
+    return mdd, max_duration, peak_idx, trough_idx, recovery_idx, ulcer, time_underwater
+
+
+if numba is not None:
+    _drawdown_stats_compiled = numba.njit(cache=True)(_drawdown_stats_loop)
+else:
+    _drawdown_stats_compiled = None
+
+
+def drawdown_stats(values: ArrayLike, use_numba: Optional[bool] = None) -> Dict[str, np.ndarray]:
+    """
+    Drawdown depth, duration, recovery and Ulcer index for each series.
+
+    Args:
+        values: Portfolio values, shape (days,) or (days, n_series)
+        use_numba: Force (True) or disable (False) the compiled kernel;
+            default uses it when Numba is installed
+
+    Returns:
+        Dictionary of per-series arrays:
+            mdd: maximum drawdown (<= 0)
+            max_duration: longest time under water, in days
+            peak / trough: row of the peak and trough of the maximum drawdown
+            recovery: row where the maximum drawdown was recovered, -1 if never
+            recovery_days: days from trough to recovery, -1 if never
+            ulcer: Ulcer index (RMS drawdown)
+            time_underwater: fraction of days below the running peak
+    """
+    if use_numba is None:
+        use_numba = _drawdown_stats_compiled is not None
+    if use_numba and _drawdown_stats_compiled is None:
+        raise ImportError("use_numba=True requires numba to be installed")
+
+    v = _as_batch(values)
+    kernel = _drawdown_stats_compiled if use_numba else _drawdown_stats_numpy
+    mdd, max_duration, peak, trough, recovery, ulcer, time_underwater = kernel(np.ascontiguousarray(v))
+    return {
+        "mdd": mdd,
+        "max_duration": max_duration,
+        "peak": peak,
+        "trough": trough,
+        "recovery": recovery,
+        "recovery_days": np.where(recovery >= 0, recovery - trough, -1),
+        "ulcer": ulcer,
+        "time_underwater": time_underwater,
+    }
+
+
+def sortino_ratio(values: ArrayLike, risk_free_rate: Optional[ArrayLike] = None,
+                  periods_per_year: int = TRADING_DAYS) -> np.ndarray:
+    """
+    Annualized Sortino ratio of daily returns.
+
+    Args:
+        values: Portfolio values, shape (days,) or (days, n_series)
+        risk_free_rate: Optional per-day risk-free returns of length days - 1
+            (aligned with the returns), shared by all series
+        periods_per_year: Periods used for annualization
+
+    Returns:
+        Array of Sortino ratios, NaN where there are no down days
+    """
+    v = _as_batch(values)
+    excess = v[1:] / v[:-1] - 1.0
+    if risk_free_rate is not None:
+        excess = excess - np.nan_to_num(np.asarray(risk_free_rate, dtype=float)).reshape(-1, 1)
+    downside = np.sqrt(np.mean(np.minimum(excess, 0.0)**2, axis=0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = excess.mean(axis=0) / downside * np.sqrt(periods_per_year)
+    return np.where(downside > 0, ratio, np.nan)
+
+
+def calmar_ratio(values: ArrayLike, periods_per_year: int = TRADING_DAYS) -> np.ndarray:
+    """
+    CAGR divided by the magnitude of the maximum drawdown.
+
+    Args:
+        values: Portfolio values, shape (days,) or (days, n_series)
+        periods_per_year: Periods per year used to compute CAGR
+
+    Returns:
+        Array of Calmar ratios, NaN where there is no drawdown or only one day
+    """
+    v = _as_batch(values)
+    years = (len(v) - 1) / periods_per_year
+    if years == 0:
+        return np.full(v.shape[1], np.nan)
+    cagr = (v[-1] / v[0])**(1 / years) - 1
+    mdd = underwater_curve(v).min(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(mdd < 0, cagr / -mdd, np.nan)
@@ -2,13 +2,16 @@
 Shared utilities for backtesting strategies in the quant_study module.
 Contains common functions for data download, dividend reinvestment, 
 performance calculations, and visualization.
+
+yfinance and matplotlib are imported inside the functions that need them, so
+headless sweep workers that only simulate and score never pay their import
+or plotting-backend initialization cost.
 """
 
-import yfinance as yf
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 from typing import Dict, List, Tuple, Optional, Union
+from analytics import drawdown_stats, sortino_ratio
 
 
 def download_price_data(tickers: List[str], start: str, end: str) -> pd.DataFrame:
@@ -23,6 +26,8 @@ def download_price_data(tickers: List[str], start: str, end: str) -> pd.DataFram
     Returns:
         DataFrame with close prices for each ticker
     """
+    import yfinance as yf
+
     print(f"Downloading price data for {len(tickers)} tickers...")
     data = yf.download(tickers, start=start, end=end, group_by='ticker')
     if data.empty:
@@ -49,6 +54,8 @@ def download_dividend_data(tickers: List[str]) -> Dict[str, pd.Series]:
     Returns:
         Dictionary mapping ticker to dividend Series
     """
+    import yfinance as yf
+
     print("Downloading dividend data...")
     divs = {}
     for ticker in tickers:
@@ -140,14 +147,15 @@ def calculate_performance_stats(portfolio_values: pd.Series,
     years = (v.index[-1] - v.index[0]).days / 365.25
     cagr = (v.iloc[-1] / v.iloc[0])**(1/years) - 1
     
-    # Calculate maximum drawdown
-    roll_max = v.cummax()
-    drawdown = v / roll_max - 1.0
-    max_drawdown = drawdown.min()
+    # Calculate drawdown depth, duration and Ulcer index
+    dd = drawdown_stats(v.to_numpy())
+    max_drawdown = dd["mdd"][0]
     
     # Calculate volatility and Sharpe ratio
     volatility = excess_returns.std() * np.sqrt(252)
     sharpe = (excess_returns.mean() / excess_returns.std() * np.sqrt(252)) if excess_returns.std() > 0 else np.nan
+    sortino = sortino_ratio(v.to_numpy(), rf.to_numpy() if risk_free_rate is not None else None)[0]
+    calmar = cagr / -max_drawdown if max_drawdown < 0 else np.nan
     
     print(f"\n{name} results:")
     print(f"  Period: {v.index[0].date()} → {v.index[-1].date()}")
@@ -162,7 +170,12 @@ def calculate_performance_stats(portfolio_values: pd.Series,
         "cagr": cagr, 
         "mdd": max_drawdown, 
         "vol": volatility, 
-        "sharpe": sharpe
+        "sharpe": sharpe,
+        "sortino": sortino,
+        "calmar": calmar,
+        "ulcer": dd["ulcer"][0],
+        "max_underwater_days": dd["max_duration"][0],
+        "mdd_recovery": dd["recovery_days"][0]
     }
 
 
@@ -177,6 +190,8 @@ def create_comparison_plot(strategy_results: Dict[str, Tuple[pd.Series, Dict]],
         title: Main plot title
         figsize: Figure size tuple
     """
+    import matplotlib.pyplot as plt
+
     fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=figsize)
     
     colors = ['red', 'blue', 'green', 'orange', 'purple', 'brown']
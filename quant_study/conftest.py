@@ -0,0 +1,5 @@
+# The quant_study modules import each other by flat module name, as the scripts run from here do.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
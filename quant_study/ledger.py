@@ -0,0 +1,179 @@
+"""
+Cash, margin and currency ledger for the quant_study simulators.
+
+Instead of treating BIL as just another ETF, a cash sleeve is modelled as a
+synthetic price series that compounds at its own daily accrual rate, and
+leverage above 1x as a negative position in a margin series compounding at
+the borrow rate. Non-USD assets (and their dividends) are converted to the
+base currency with daily FX rates. Everything is one vectorized pass over the
+calendar, after which the unchanged strategies in strategies.py simulate the
+ledger columns like any other ticker.
+"""
+
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+CASH = "CASH"
+MARGIN = "MARGIN"
+
+
+def accrual_index(annual_rate: pd.Series, index: pd.DatetimeIndex,
+                  day_count: int = 360, base: float = 1.0) -> pd.Series:
+    """
+    Compound an annualized rate into a price-like accrual index.
+
+    The rate in force at each close accrues over the calendar days until the
+    next trading day, so weekends and holidays earn interest too.
+
+    Args:
+        annual_rate: Annualized rate as a decimal (0.05 for 5%), forward filled
+            onto the trading days
+        index: Trading days to accrue over
+        day_count: Day-count basis (360 for T-bills and margin loans)
+        base: Index value on the first day
+
+    Returns:
+        Accrual index Series on index
+    """
+    rate = annual_rate.reindex(index, method="ffill").fillna(0.0).to_numpy(dtype=float)
+    days = np.diff(index.values).astype("timedelta64[D]").astype(float)
+    growth = np.empty(len(index))
+    growth[0] = base
+    growth[1:] = 1.0 + rate[:-1] * days / day_count
+    return pd.Series(np.cumprod(growth), index=index)
+
+
+def convert_currency(prices: pd.DataFrame, fx_rates: pd.DataFrame,
+                     currencies: Dict[str, str], base_currency: str = "USD") -> pd.DataFrame:
+    """
+    Convert local-currency prices to the base currency.
+
+    Args:
+        prices: DataFrame with close prices for each ticker
+        fx_rates: DataFrame with one column per currency, in base currency per
+            unit of that currency
+        currencies: Mapping of ticker to its quote currency; unlisted tickers
+            are already in the base currency
+        base_currency: Currency the portfolio is valued in
+
+    Returns:
+        DataFrame of prices in the base currency
+    """
+    fx = fx_rates.reindex(prices.index, method="ffill")
+    converted = prices.copy()
+    for ticker, currency in currencies.items():
+        if ticker in converted.columns and currency != base_currency:
+            converted[ticker] = converted[ticker] * fx[currency]
+    return converted
+
+
+def convert_dividends(dividends: Dict[str, pd.Series], fx_rates: pd.DataFrame,
+                      currencies: Dict[str, str], base_currency: str = "USD") -> Dict[str, pd.Series]:
+    """
+    Convert local-currency dividend payments to the base currency.
+
+    Args:
+        dividends: Dictionary of dividend series
+        fx_rates: DataFrame with one column per currency (see convert_currency)
+        currencies: Mapping of ticker to its quote currency
+        base_currency: Currency the portfolio is valued in
+
+    Returns:
+        Dictionary of dividend series in the base currency
+    """
+    converted = dict(dividends)
+    for ticker, currency in currencies.items():
+        div = dividends.get(ticker)
+        if div is None or len(div) == 0 or currency == base_currency:
+            continue
+        converted[ticker] = div * fx_rates[currency].reindex(div.index, method="ffill")
+    return converted
+
+
+def with_margin(weights: Dict[str, float]) -> Dict[str, float]:
+    """
+    Fund exposure above 1x with a margin loan.
+
+    Args:
+        weights: Dictionary mapping tickers to target weights, summing above 1
+            for a levered portfolio
+
+    Returns:
+        Weights with a negative MARGIN weight so they sum to 1
+    """
+    gross = sum(weights.values())
+    if gross <= 1.0:
+        return dict(weights)
+    levered = dict(weights)
+    levered[MARGIN] = levered.get(MARGIN, 0.0) - (gross - 1.0)
+    return levered
+
+
+class CashLedger:
+    """
+    Daily accrual for a cash sleeve and a margin account.
+
+    Args:
+        cash_rate: Annualized yield earned on cash (decimal)
+        borrow_rate: Annualized rate paid on margin; defaults to cash_rate
+            plus borrow_spread
+        borrow_spread: Spread over cash_rate when borrow_rate is not given
+        day_count: Day-count basis for both accounts
+    """
+
+    def __init__(self, cash_rate: pd.Series,
+                 borrow_rate: Optional[pd.Series] = None,
+                 borrow_spread: float = 0.0,
+                 day_count: int = 360):
+        self.cash_rate = cash_rate
+        self.borrow_rate = borrow_rate if borrow_rate is not None else cash_rate + borrow_spread
+        self.day_count = day_count
+
+    def prepare(self, prices: pd.DataFrame,
+                dividends: Dict[str, pd.Series],
+                fx_rates: Optional[pd.DataFrame] = None,
+                currencies: Optional[Dict[str, str]] = None,
+                base_currency: str = "USD",
+                cash_column: str = CASH) -> Tuple[pd.DataFrame, Dict[str, pd.Series]]:
+        """
+        Build strategy inputs with base-currency prices and ledger columns.
+
+        Args:
+            prices: DataFrame with close prices for each ticker
+            dividends: Dictionary of dividend series
+            fx_rates: Optional FX rates for converting non-base-currency tickers
+            currencies: Mapping of ticker to quote currency
+            base_currency: Currency the portfolio is valued in
+            cash_column: Column name for the cash sleeve; pass "BIL" to replace
+                the ETF in strategies with a fixed ticker list such as 9Sig
+
+        Returns:
+            Tuple of (prices, dividends) with cash_column and MARGIN added
+        """
+        if currencies:
+            prices = convert_currency(prices, fx_rates, currencies, base_currency)
+            dividends = convert_dividends(dividends, fx_rates, currencies, base_currency)
+        else:
+            prices = prices.copy()
+            dividends = dict(dividends)
+
+        prices[cash_column] = accrual_index(self.cash_rate, prices.index, self.day_count)
+        prices[MARGIN] = accrual_index(self.borrow_rate, prices.index, self.day_count)
+        dividends[cash_column] = pd.Series(dtype=float)
+        dividends[MARGIN] = pd.Series(dtype=float)
+        return prices, dividends
+
+    def risk_free_rate(self, index: pd.DatetimeIndex) -> pd.Series:
+        """
+        Daily cash returns, for use as calculate_performance_stats' risk_free_rate.
+
+        Args:
+            index: Trading days
+
+        Returns:
+            Series of daily returns of the cash sleeve
+        """
+        return accrual_index(self.cash_rate, index, self.day_count).pct_change()
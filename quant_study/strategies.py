@@ -1,24 +1,84 @@
 """
 Common strategy implementations for backtesting.
 Contains standardized implementations of various investment strategies.
+
+Each strategy simulates on NumPy arrays and returns (portfolio_values, details).
+By default details is the widened DataFrame of prices, units and totals; pass
+output="units" or output="none" to skip materializing it in large sweeps.
 """
 
 import pandas as pd
 import numpy as np
 from typing import Dict, Tuple, List, Optional
 from backtest_utils import (
-    reinvest_dividends, 
     get_quarterly_rebalance_dates, 
-    get_annual_rebalance_dates,
-    rebalance_portfolio
+    get_annual_rebalance_dates
 )
 
 
+STRATEGY_OUTPUTS = ("frame", "units", "none")
+
+
+def _check_output(output: str) -> None:
+    if output not in STRATEGY_OUTPUTS:
+        raise ValueError(f"output must be one of {STRATEGY_OUTPUTS}, got {output!r}")
+
+
+def _reinvest_dividends(units: np.ndarray, prices: np.ndarray, index: pd.DatetimeIndex,
+                        div_series: pd.Series) -> None:
+    """
+    NumPy counterpart of reinvest_dividends operating on one units column.
+
+    Args:
+        units: Units held per day for one ticker, modified in-place
+        prices: Prices per day for the same ticker
+        index: Trading days of the backtest
+        div_series: Series of dividend payments
+    """
+    for dt, amt in div_series.items():
+        if dt in index:
+            pos = index.get_loc(dt)
+            units[pos:] += (amt * units[pos]) / prices[pos]
+
+
+def _rebalance_positions(index: pd.DatetimeIndex, rebalance_frequency: str) -> np.ndarray:
+    """Row positions of the quarterly or annual rebalance dates."""
+    dates_frame = pd.DataFrame(index=index)
+    if rebalance_frequency == "quarterly":
+        dates = get_quarterly_rebalance_dates(dates_frame)
+    else:  # annual
+        dates = get_annual_rebalance_dates(dates_frame)
+    return index.get_indexer(dates)
+
+
+def _strategy_result(index: pd.DatetimeIndex, tickers: List[str], prices: np.ndarray,
+                     units: np.ndarray, output: str,
+                     extra_columns: Optional[Dict[str, np.ndarray]] = None) -> Tuple[pd.Series, object]:
+    """
+    Build the (portfolio_values, details) tuple returned by every strategy.
+
+    The widened DataFrame is only materialized for output="frame".
+    """
+    total = pd.Series((prices * units).sum(axis=1), index=index, name="Total").dropna()
+    if output == "none":
+        return total, None
+    if output == "units":
+        return total, units
+
+    columns = {ticker: prices[:, i] for i, ticker in enumerate(tickers)}
+    columns.update({f"{ticker}_units": units[:, i] for i, ticker in enumerate(tickers)})
+    columns.update(extra_columns or {})
+    df = pd.DataFrame(columns, index=index)
+    df["Total"] = total
+    return total, df
+
+
 def backtest_9sig_strategy(prices: pd.DataFrame, 
                           dividends: Dict[str, pd.Series], 
                           start_capital: float = 10000,
                           tqqq_weight: float = 0.60, 
-                          quarterly_growth: float = 1.09) -> Tuple[pd.Series, pd.DataFrame]:
+                          quarterly_growth: float = 1.09,
+                          output: str = "frame") -> Tuple[pd.Series, object]:
     """
     Backtest the 9Sig strategy (TQQQ + BIL with quarterly 9% growth target).
     
@@ -28,42 +88,48 @@ def backtest_9sig_strategy(prices: pd.DataFrame,
         start_capital: Initial capital
         tqqq_weight: Target weight for TQQQ (default 60%)
         quarterly_growth: Quarterly growth target (default 9%)
+        output: "frame" for the full DataFrame, "units" for a (days, tickers)
+            units array, or "none" to skip the details entirely
     
     Returns:
-        Tuple of (portfolio_values, full_dataframe)
+        Tuple of (portfolio_values, details) where details depends on output
     """
-    df = prices[["TQQQ", "BIL"]].copy()
-    df["TQQQ_units"] = start_capital * tqqq_weight / df.iloc[0]["TQQQ"]
-    df["BIL_units"] = start_capital * (1 - tqqq_weight) / df.iloc[0]["BIL"]
-    df["Target"] = np.nan
+    _check_output(output)
+    tickers = ["TQQQ", "BIL"]
+    index = prices.index
+    px = prices[tickers].to_numpy(dtype=float)
+    units = np.empty_like(px)
+    units[:, 0] = start_capital * tqqq_weight / px[0, 0]
+    units[:, 1] = start_capital * (1 - tqqq_weight) / px[0, 1]
 
     # Reinvest dividends
-    reinvest_dividends("TQQQ_units", "TQQQ", dividends["TQQQ"], df)
-    reinvest_dividends("BIL_units", "BIL", dividends["BIL"], df)
-
-    # Initial total
-    df["Total"] = df["TQQQ"] * df["TQQQ_units"] + df["BIL"] * df["BIL_units"]
+    for i, ticker in enumerate(tickers):
+        _reinvest_dividends(units[:, i], px[:, i], index, dividends[ticker])
 
     # Get quarterly rebalance dates
-    q_dates = get_quarterly_rebalance_dates(df)
-    
+    q_pos = _rebalance_positions(index, "quarterly")
+
     # Set quarterly targets
-    for i, d in enumerate(q_dates):
-        df.loc[d, "Target"] = start_capital if i == 0 else df.loc[q_dates[i-1], "Target"] * quarterly_growth
+    targets = np.empty(len(q_pos))
+    for i in range(len(q_pos)):
+        targets[i] = start_capital if i == 0 else targets[i-1] * quarterly_growth
 
     # Quarterly rebalance toward target * tqqq_weight
-    for i in range(1, len(q_dates)):
-        d = q_dates[i]
-        tpx, bpx = df.loc[d, ["TQQQ", "BIL"]]
-        target = df.loc[q_dates[i-1], "Target"] * quarterly_growth
-        desired_tqqq_val = target * tqqq_weight
-        curr_tqqq_val = df.loc[d, "TQQQ_units"] * tpx
+    for i in range(1, len(q_pos)):
+        d = q_pos[i]
+        tpx, bpx = px[d]
+        desired_tqqq_val = targets[i] * tqqq_weight
+        curr_tqqq_val = units[d, 0] * tpx
         delta = desired_tqqq_val - curr_tqqq_val
-        df.loc[d:, "TQQQ_units"] += delta / tpx
-        df.loc[d:, "BIL_units"] -= delta / bpx
+        units[d:, 0] += delta / tpx
+        units[d:, 1] -= delta / bpx
 
-    df["Total"] = df["TQQQ"] * df["TQQQ_units"] + df["BIL"] * df["BIL_units"]
-    return df["Total"].dropna(), df
+    extra_columns = None
+    if output == "frame":
+        target_col = np.full(len(index), np.nan)
+        target_col[q_pos] = targets
+        extra_columns = {"Target": target_col}
+    return _strategy_result(index, tickers, px, units, output, extra_columns)
 
 
 def backtest_static_leverage_strategy(prices: pd.DataFrame, 
@@ -71,7 +137,8 @@ def backtest_static_leverage_strategy(prices: pd.DataFrame,
                                     tickers: List[str],
                                     weights: Tuple[float, ...],
                                     start_capital: float = 10000,
-                                    rebalance_frequency: str = "quarterly") -> Tuple[pd.Series, pd.DataFrame]:
+                                    rebalance_frequency: str = "quarterly",
+                                    output: str = "frame") -> Tuple[pd.Series, object]:
     """
     Backtest a static leverage strategy with periodic rebalancing.
     
@@ -82,43 +149,23 @@ def backtest_static_leverage_strategy(prices: pd.DataFrame,
         weights: Tuple of target weights
         start_capital: Initial capital
         rebalance_frequency: "quarterly" or "annual"
+        output: "frame" for the full DataFrame, "units" for a (days, tickers)
+            units array, or "none" to skip the details entirely
     
     Returns:
-        Tuple of (portfolio_values, full_dataframe)
+        Tuple of (portfolio_values, details) where details depends on output
     """
-    df = prices[tickers].copy()
     weights_array = np.array(weights, dtype=float)
     weights_array = weights_array / weights_array.sum()  # normalize
-
-    # Initialize units by target weights
-    for i, ticker in enumerate(tickers):
-        df[f"{ticker}_units"] = start_capital * weights_array[i] / df.iloc[0][ticker]
-
-    # Reinvest dividends
-    for ticker in tickers:
-        reinvest_dividends(f"{ticker}_units", ticker, dividends[ticker], df)
-
-    df["Total"] = sum(df[ticker] * df[f"{ticker}_units"] for ticker in tickers)
-
-    # Get rebalance dates
-    if rebalance_frequency == "quarterly":
-        rebalance_dates = get_quarterly_rebalance_dates(df)
-    else:  # annual
-        rebalance_dates = get_annual_rebalance_dates(df)
-    
-    # Rebalance to target weights
-    for i in range(1, len(rebalance_dates)):
-        d = rebalance_dates[i]
-        rebalance_portfolio(df, d, tickers, weights_array)
-
-    df["Total"] = sum(df[ticker] * df[f"{ticker}_units"] for ticker in tickers)
-    return df["Total"].dropna(), df
+    return _backtest_target_weights(prices, dividends, tickers, weights_array,
+                                    start_capital, rebalance_frequency, output)
 
 
 def backtest_eric_strategy(prices: pd.DataFrame, 
                           dividends: Dict[str, pd.Series],
                           weights: Dict[str, float],
-                          start_capital: float = 10000) -> Tuple[pd.Series, pd.DataFrame]:
+                          start_capital: float = 10000,
+                          output: str = "frame") -> Tuple[pd.Series, object]:
     """
     Backtest Eric's diversified strategy with annual rebalancing.
     
@@ -127,51 +174,60 @@ def backtest_eric_strategy(prices: pd.DataFrame,
         dividends: Dictionary of dividend series
         weights: Dictionary mapping tickers to target weights
         start_capital: Initial capital
+        output: "frame" for the full DataFrame, "units" for a (days, tickers)
+            units array, or "none" to skip the details entirely
     
     Returns:
-        Tuple of (portfolio_values, full_dataframe)
+        Tuple of (portfolio_values, details) where details depends on output
     """
     tickers = list(weights.keys())
-    df = prices[tickers].copy()
-    
-    # Initialize units based on target weights
-    for ticker in tickers:
-        weight = weights[ticker]
-        df[f"{ticker}_units"] = start_capital * weight / df.iloc[0][ticker]
-    
+    weights_array = np.array([weights[ticker] for ticker in tickers], dtype=float)
+    return _backtest_target_weights(prices, dividends, tickers, weights_array,
+                                    start_capital, "annual", output)
+
+
+def _backtest_target_weights(prices: pd.DataFrame,
+                             dividends: Dict[str, pd.Series],
+                             tickers: List[str],
+                             weights_array: np.ndarray,
+                             start_capital: float,
+                             rebalance_frequency: str,
+                             output: str) -> Tuple[pd.Series, object]:
+    """
+    Shared core of the static leverage and Eric strategies.
+
+    Rebalance targets use the total computed before any rebalancing, as the
+    DataFrame implementation always has.
+    """
+    _check_output(output)
+    index = prices.index
+    px = prices[tickers].to_numpy(dtype=float)
+
+    # Initialize units by target weights
+    units = np.empty_like(px)
+    units[:] = start_capital * weights_array / px[0]
+
     # Reinvest dividends
-    for ticker in tickers:
-        reinvest_dividends(f"{ticker}_units", ticker, dividends[ticker], df)
-    
-    # Calculate total value
-    def calc_total(row):
-        return sum(row[ticker] * row[f"{ticker}_units"] for ticker in tickers)
-    
-    df["Total"] = df.apply(calc_total, axis=1)
-    
-    # Annual rebalancing
-    rebalance_dates = get_annual_rebalance_dates(df)
-    
-    for i in range(1, len(rebalance_dates)):
-        d = rebalance_dates[i]
-        total_val = df.loc[d, "Total"]
-        
-        # Rebalance to target weights
-        for ticker in tickers:
-            target_val = total_val * weights[ticker]
-            current_val = df.loc[d, f"{ticker}_units"] * df.loc[d, ticker]
-            delta = target_val - current_val
-            df.loc[d:, f"{ticker}_units"] += delta / df.loc[d, ticker]
-    
-    # Recalculate total after rebalancing
-    df["Total"] = df.apply(calc_total, axis=1)
-    return df["Total"].dropna(), df
+    for i, ticker in enumerate(tickers):
+        _reinvest_dividends(units[:, i], px[:, i], index, dividends[ticker])
+
+    total = (px * units).sum(axis=1)
+
+    # Rebalance to target weights
+    rebalance_pos = _rebalance_positions(index, rebalance_frequency)
+    for d in rebalance_pos[1:]:
+        target_values = total[d] * weights_array
+        delta = target_values - units[d] * px[d]
+        units[d:] += delta / px[d]
+
+    return _strategy_result(index, tickers, px, units, output)
 
 
 def backtest_buy_and_hold(prices: pd.DataFrame, 
                          dividends: Dict[str, pd.Series],
                          ticker: str = "QQQ",
-                         start_capital: float = 10000) -> Tuple[pd.Series, pd.DataFrame]:
+                         start_capital: float = 10000,
+                         output: str = "frame") -> Tuple[pd.Series, object]:
     """
     Backtest a simple buy and hold strategy with dividend reinvestment.
     
@@ -180,18 +236,21 @@ def backtest_buy_and_hold(prices: pd.DataFrame,
         dividends: Dictionary of dividend series
         ticker: Ticker to buy and hold
         start_capital: Initial capital
+        output: "frame" for the full DataFrame, "units" for a (days, 1)
+            units array, or "none" to skip the details entirely
     
     Returns:
-        Tuple of (portfolio_values, full_dataframe)
+        Tuple of (portfolio_values, details) where details depends on output
     """
-    df = prices[[ticker]].copy()
-    df[f"{ticker}_units"] = start_capital / df.iloc[0][ticker]
+    _check_output(output)
+    index = prices.index
+    px = prices[[ticker]].to_numpy(dtype=float)
+    units = np.full_like(px, start_capital / px[0, 0])
     
     # Reinvest dividends
-    reinvest_dividends(f"{ticker}_units", ticker, dividends[ticker], df)
+    _reinvest_dividends(units[:, 0], px[:, 0], index, dividends[ticker])
     
-    df["Total"] = df[ticker] * df[f"{ticker}_units"]
-    return df["Total"].dropna(), df
+    return _strategy_result(index, [ticker], px, units, output)
 
 
 # Strategy configuration constants
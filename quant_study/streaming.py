@@ -0,0 +1,428 @@
+"""
+Out-of-core streaming backtests over partitioned price files.
+
+The in-memory strategies in strategies.py copy the full price history and
+widen it with per-ticker unit columns. For multi-decade, many-asset universes
+this module instead reads price partitions (e.g. one Parquet or CSV file per
+year) through a generator, carries portfolio state across partitions and
+yields the portfolio value series one partition at a time, so peak memory is
+bounded by the size of a single partition.
+"""
+
+import os
+from glob import glob
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+
+# Rebalance callback: (units, prices, rebalance_index, dividend_units) -> new units.
+# dividend_units are the units held with dividends reinvested but without any
+# rebalancing, whose value is the pre-rebalance "Total" the in-memory
+# strategies rebalance to.
+Rebalancer = Callable[[np.ndarray, np.ndarray, int, np.ndarray], np.ndarray]
+
+PARTITION_EXTENSIONS = (".parquet", ".csv")
+
+
+def write_price_partitions(prices: pd.DataFrame, directory: str,
+                           fmt: str = "parquet") -> List[str]:
+    """
+    Split a price DataFrame into one file per calendar year.
+
+    Args:
+        prices: DataFrame with close prices for each ticker (DatetimeIndex)
+        directory: Output directory, created if missing
+        fmt: "parquet" or "csv"
+
+    Returns:
+        Sorted list of written partition paths
+    """
+    if fmt not in ("parquet", "csv"):
+        raise ValueError(f"Unknown partition format: {fmt}")
+    os.makedirs(directory, exist_ok=True)
+
+    paths = []
+    for year, chunk in prices.groupby(prices.index.year):
+        path = os.path.join(directory, f"{year}.{fmt}")
+        if fmt == "parquet":
+            chunk.to_parquet(path)
+        else:
+            chunk.to_csv(path)
+        paths.append(path)
+    return sorted(paths)
+
+
+def iter_price_partitions(paths: Union[str, Iterable[str]],
+                          tickers: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+    """
+    Read price partitions one at a time.
+
+    Args:
+        paths: Directory of partition files, or an iterable of file paths in
+            chronological order
+        tickers: Optional subset of ticker columns to load
+
+    Yields:
+        DataFrame with close prices for one partition, rows with missing
+        prices dropped
+    """
+    if isinstance(paths, str):
+        paths = sorted(p for p in glob(os.path.join(paths, "*"))
+                       if p.endswith(PARTITION_EXTENSIONS))
+
+    for path in paths:
+        if path.endswith(".parquet"):
+            chunk = pd.read_parquet(path, columns=tickers)
+        else:
+            chunk = pd.read_csv(path, index_col=0, parse_dates=True)
+            if tickers is not None:
+                chunk = chunk[tickers]
+        yield chunk.dropna()
+
+
+def target_weight_rebalancer(weights: np.ndarray) -> Rebalancer:
+    """
+    Rebalance to fixed target weights of the pre-rebalance total, as
+    backtest_static_leverage_strategy and backtest_eric_strategy do.
+
+    Args:
+        weights: Array of target weights, used as given
+
+    Returns:
+        Rebalance callback for StreamingPortfolio
+    """
+    weights = np.asarray(weights, dtype=float)
+
+    def rebalance(units: np.ndarray, prices: np.ndarray, index: int,
+                  dividend_units: np.ndarray) -> np.ndarray:
+        return (dividend_units @ prices) * weights / prices
+
+    return rebalance
+
+
+def nine_sig_rebalancer(start_capital: float = 10000,
+                        tqqq_weight: float = 0.60,
+                        quarterly_growth: float = 1.09) -> Rebalancer:
+    """
+    Move the TQQQ sleeve toward the compounded 9Sig target, funded from BIL.
+
+    Args:
+        start_capital: Initial capital the target compounds from
+        tqqq_weight: Target weight for TQQQ (default 60%)
+        quarterly_growth: Quarterly growth target (default 9%)
+
+    Returns:
+        Rebalance callback for StreamingPortfolio over ["TQQQ", "BIL"]
+    """
+    def rebalance(units: np.ndarray, prices: np.ndarray, index: int,
+                  dividend_units: np.ndarray) -> np.ndarray:
+        target = start_capital * quarterly_growth**index
+        delta = target * tqqq_weight - units[0] * prices[0]
+        new_units = units.copy()
+        new_units[0] += delta / prices[0]
+        new_units[1] -= delta / prices[1]
+        return new_units
+
+    return rebalance
+
+
+class StreamingPortfolio:
+    """
+    Portfolio state (units held, rebalance period, last unsettled day)
+    carried across price partitions.
+
+    Reproduces the in-memory strategies in strategies.py:
+    - Rebalancing happens on the last trading day of each period after the
+      first, including the last day of the data, matching
+      get_quarterly_rebalance_dates/get_annual_rebalance_dates.
+    - Dividends are reinvested against the units the portfolio would hold
+      without rebalancing, and rebalance trades are added on top, as the
+      in-memory strategies reinvest all dividends before rebalancing.
+
+    Whether a day ends its period is only known once the next day is seen,
+    so the last day of each partition is held back and emitted with the
+    next partition (or by flush() at the end of the stream).
+    """
+
+    _PERIOD_MONTHS = {"quarterly": 3, "annual": 12}
+
+    def __init__(self, tickers: List[str],
+                 initial_weights: Union[Tuple[float, ...], np.ndarray],
+                 dividends: Optional[Dict[str, pd.Series]] = None,
+                 start_capital: float = 10000,
+                 rebalance_frequency: Optional[str] = None,
+                 rebalancer: Optional[Rebalancer] = None):
+        """
+        Args:
+            tickers: List of ticker symbols, in column order
+            initial_weights: Initial allocation weights, used as given
+            dividends: Dictionary of dividend series
+            start_capital: Initial capital
+            rebalance_frequency: "quarterly", "annual" or None for no rebalancing
+            rebalancer: Callback computing new units on each rebalance date
+        """
+        if rebalance_frequency is not None and rebalance_frequency not in self._PERIOD_MONTHS:
+            raise ValueError(f"Unknown rebalance frequency: {rebalance_frequency}")
+        self.tickers = list(tickers)
+        self.initial_weights = np.asarray(initial_weights, dtype=float)
+        self.dividends = dividends or {}
+        self.start_capital = start_capital
+        self.rebalance_frequency = rebalance_frequency
+        self.rebalancer = rebalancer
+
+        self.units: Optional[np.ndarray] = None
+        self._dividend_units: Optional[np.ndarray] = None
+        self._periods_ended = 0
+        # Held-back last day: (date, prices, dividends per unit or None, period code)
+        self._pending: Optional[Tuple[pd.Timestamp, np.ndarray, Optional[np.ndarray], int]] = None
+
+    @property
+    def _rebalancing(self) -> bool:
+        return self.rebalance_frequency is not None and self.rebalancer is not None
+
+    def _period_codes(self, index: pd.DatetimeIndex) -> np.ndarray:
+        months = self._PERIOD_MONTHS[self.rebalance_frequency]
+        return np.asarray(index.year * 12 + index.month - 1) // months
+
+    def _dividend_events(self, index: pd.DatetimeIndex) -> Dict[int, np.ndarray]:
+        events: Dict[int, np.ndarray] = {}
+        for j, ticker in enumerate(self.tickers):
+            div = self.dividends.get(ticker)
+            if div is None or len(div) == 0:
+                continue
+            div = div[div.index.isin(index)]
+            for row, amt in zip(index.get_indexer(div.index), div.values):
+                events.setdefault(row, np.zeros(len(self.tickers)))[j] += amt
+        return events
+
+    def _settle(self, index: pd.DatetimeIndex, prices: np.ndarray,
+                dividend_rows: Dict[int, np.ndarray], period_end_rows: List[int]) -> pd.Series:
+        """Value days whose period-end status is known, applying their events in order."""
+        values = np.empty(len(prices))
+        period_ends = set(period_end_rows)
+        start = 0
+        # Units are constant between events, so value each segment as one matmul
+        for row in sorted(period_ends | set(dividend_rows)):
+            values[start:row] = prices[start:row] @ self.units
+            if row in dividend_rows:
+                growth = 1 + dividend_rows[row] / prices[row]
+                self.units = self.units + self._dividend_units * (growth - 1)
+                self._dividend_units = self._dividend_units * growth
+            if row in period_ends:
+                if self._periods_ended > 0:
+                    self.units = self.rebalancer(self.units, prices[row], self._periods_ended,
+                                                 self._dividend_units)
+                self._periods_ended += 1
+            start = row
+        values[start:] = prices[start:] @ self.units
+        return pd.Series(values, index=index, name="Total")
+
+    def update(self, chunk: pd.DataFrame) -> pd.Series:
+        """
+        Advance the portfolio through one price partition.
+
+        Args:
+            chunk: DataFrame with close prices for each ticker, in order after
+                any previously processed partition
+
+        Returns:
+            Portfolio value series for the days settled by this partition: the
+            held-back last day of the previous partition and all of this
+            partition's days but its last (all of them without rebalancing)
+        """
+        chunk = chunk[self.tickers].dropna()
+        if chunk.empty:
+            return pd.Series(dtype=float, name="Total")
+
+        prices = chunk.to_numpy(dtype=float)
+        if self.units is None:
+            self.units = self.start_capital * self.initial_weights / prices[0]
+            self._dividend_units = self.units.copy()
+        dividend_rows = self._dividend_events(chunk.index)
+        if not self._rebalancing:
+            return self._settle(chunk.index, prices, dividend_rows, [])
+
+        codes = self._period_codes(chunk.index)
+        index, period_ends = chunk.index, np.flatnonzero(codes[:-1] != codes[1:])
+        if self._pending is not None:
+            date, last_prices, last_dividends, last_code = self._pending
+            index = pd.DatetimeIndex([date]).append(index)
+            prices = np.vstack([last_prices, prices])
+            dividend_rows = {row + 1: amt for row, amt in dividend_rows.items()}
+            if last_dividends is not None:
+                dividend_rows[0] = last_dividends
+            period_ends = period_ends + 1
+            if last_code != codes[0]:
+                period_ends = np.concatenate([[0], period_ends])
+        last = len(prices) - 1
+        self._pending = (index[last], prices[last], dividend_rows.pop(last, None), codes[-1])
+        return self._settle(index[:last], prices[:last], dividend_rows, period_ends.tolist())
+
+    def flush(self) -> pd.Series:
+        """
+        Settle the held-back last day at the end of the stream; the data ends
+        there, so it also ends a rebalance period.
+
+        Returns:
+            Portfolio value series for that day (empty if nothing is held back)
+        """
+        if self._pending is None:
+            return pd.Series(dtype=float, name="Total")
+        date, prices, dividends, _ = self._pending
+        self._pending = None
+        return self._settle(pd.DatetimeIndex([date]), prices[None],
+                            {} if dividends is None else {0: dividends}, [0])
+
+
+def stream_backtest(partitions: Iterable[pd.DataFrame],
+                    portfolio: StreamingPortfolio) -> Iterator[pd.Series]:
+    """
+    Run a streaming backtest, yielding the value series partition by partition.
+
+    Args:
+        partitions: Iterable of price DataFrames in chronological order
+        portfolio: Portfolio state to advance
+
+    Yields:
+        Portfolio value series for each non-empty partition
+    """
+    for chunk in partitions:
+        values = portfolio.update(chunk)
+        if len(values) > 0:
+            yield values
+    values = portfolio.flush()
+    if len(values) > 0:
+        yield values
+
+
+def stream_9sig_strategy(partitions: Iterable[pd.DataFrame],
+                         dividends: Dict[str, pd.Series],
+                         start_capital: float = 10000,
+                         tqqq_weight: float = 0.60,
+                         quarterly_growth: float = 1.09) -> Iterator[pd.Series]:
+    """
+    Streaming version of backtest_9sig_strategy.
+
+    Args:
+        partitions: Iterable of price DataFrames with TQQQ and BIL prices
+        dividends: Dictionary of dividend series
+        start_capital: Initial capital
+        tqqq_weight: Target weight for TQQQ (default 60%)
+        quarterly_growth: Quarterly growth target (default 9%)
+
+    Yields:
+        Portfolio value series for each partition
+    """
+    portfolio = StreamingPortfolio(
+        ["TQQQ", "BIL"], (tqqq_weight, 1 - tqqq_weight), dividends, start_capital,
+        "quarterly", nine_sig_rebalancer(start_capital, tqqq_weight, quarterly_growth)
+    )
+    return stream_backtest(partitions, portfolio)
+
+
+def stream_static_leverage_strategy(partitions: Iterable[pd.DataFrame],
+                                    dividends: Dict[str, pd.Series],
+                                    tickers: List[str],
+                                    weights: Tuple[float, ...],
+                                    start_capital: float = 10000,
+                                    rebalance_frequency: str = "quarterly") -> Iterator[pd.Series]:
+    """
+    Streaming version of backtest_static_leverage_strategy.
+
+    Args:
+        partitions: Iterable of price DataFrames
+        dividends: Dictionary of dividend series
+        tickers: List of tickers to use
+        weights: Tuple of target weights
+        start_capital: Initial capital
+        rebalance_frequency: "quarterly" or "annual"
+
+    Yields:
+        Portfolio value series for each partition
+    """
+    weights_array = np.array(weights, dtype=float)
+    weights_array = weights_array / weights_array.sum()  # normalize
+    return _stream_target_weights(partitions, dividends, tickers, weights_array,
+                                  start_capital, rebalance_frequency)
+
+
+def stream_eric_strategy(partitions: Iterable[pd.DataFrame],
+                         dividends: Dict[str, pd.Series],
+                         weights: Dict[str, float],
+                         start_capital: float = 10000) -> Iterator[pd.Series]:
+    """
+    Streaming version of backtest_eric_strategy (annual rebalancing).
+
+    Args:
+        partitions: Iterable of price DataFrames
+        dividends: Dictionary of dividend series
+        weights: Dictionary mapping tickers to target weights
+        start_capital: Initial capital
+
+    Yields:
+        Portfolio value series for each partition
+    """
+    tickers = list(weights.keys())
+    weights_array = np.array([weights[ticker] for ticker in tickers], dtype=float)
+    return _stream_target_weights(partitions, dividends, tickers, weights_array,
+                                  start_capital, "annual")
+
+
+def _stream_target_weights(partitions: Iterable[pd.DataFrame],
+                           dividends: Dict[str, pd.Series],
+                           tickers: List[str],
+                           weights_array: np.ndarray,
+                           start_capital: float,
+                           rebalance_frequency: str) -> Iterator[pd.Series]:
+    """
+    Shared core of the streaming static leverage and Eric strategies.
+
+    Like _backtest_target_weights, the weights are used as given (Eric's
+    weights are not normalized).
+    """
+    portfolio = StreamingPortfolio(
+        tickers, weights_array, dividends, start_capital,
+        rebalance_frequency, target_weight_rebalancer(weights_array)
+    )
+    return stream_backtest(partitions, portfolio)
+
+
+def stream_buy_and_hold(partitions: Iterable[pd.DataFrame],
+                        dividends: Dict[str, pd.Series],
+                        ticker: str = "QQQ",
+                        start_capital: float = 10000) -> Iterator[pd.Series]:
+    """
+    Streaming version of backtest_buy_and_hold.
+
+    Args:
+        partitions: Iterable of price DataFrames
+        dividends: Dictionary of dividend series
+        ticker: Ticker to buy and hold
+        start_capital: Initial capital
+
+    Yields:
+        Portfolio value series for each partition
+    """
+    portfolio = StreamingPortfolio([ticker], (1.0,), dividends, start_capital)
+    return stream_backtest(partitions, portfolio)
+
+
+def collect_stream(values: Iterable[pd.Series]) -> pd.Series:
+    """
+    Concatenate a streamed value series into one Series.
+
+    Only use this when the full series fits in memory (e.g. for plotting);
+    incremental consumers should iterate the stream directly.
+
+    Args:
+        values: Iterable of per-partition value series
+
+    Returns:
+        Portfolio value series over all partitions
+    """
+    parts = list(values)
+    if not parts:
+        return pd.Series(dtype=float, name="Total")
+    return pd.concat(parts)
@@ -0,0 +1,71 @@
+'''
+The vectorized drawdown kernel against the reference loop, and the streak,
+Sortino and Calmar edge cases.
+'''
+import numpy as np
+import pytest
+
+from analytics import (_drawdown_stats_loop, _drawdown_stats_numpy, calmar_ratio, drawdown_stats,
+                       longest_losing_streak, sortino_ratio)
+
+STAT_NAMES = ['mdd', 'max_duration', 'peak', 'trough', 'recovery', 'ulcer', 'time_underwater']
+
+
+def _batch(seed=0, days=300, n_series=20):
+    rng = np.random.RandomState(seed)
+    v = 100 * np.cumprod(1 + rng.normal(0.0003, 0.02, size=(days, n_series)), axis=0)
+    # never recovered: the last column ends below its running peak
+    v[:, -1] = np.linspace(100, 50, days)
+    v[days // 3, -1] = 120
+    # monotone up (never under water) and flat series
+    v[:, -2] = np.linspace(100, 200, days)
+    v[:, -3] = 100.0
+    return v
+
+
+def _assert_stats_equal(actual, expected):
+    for name, a, e in zip(STAT_NAMES, actual, expected):
+        np.testing.assert_allclose(a, e, err_msg=name)
+
+
+def test_vectorized_kernel_matches_loop():
+    for seed in range(3):
+        v = _batch(seed)
+        _assert_stats_equal(_drawdown_stats_numpy(v), _drawdown_stats_loop(v))
+
+
+def test_drawdown_stats_edge_cases():
+    stats = drawdown_stats(_batch(), use_numba=False)
+    assert stats['recovery'][-1] == -1 and stats['recovery_days'][-1] == -1
+    assert stats['peak'][-1] == 300 // 3
+    for j in (-2, -3):
+        assert stats['mdd'][j] == 0 and stats['max_duration'][j] == 0 and stats['ulcer'][j] == 0
+
+
+def test_numba_kernel_matches_loop():
+    pytest.importorskip('numba')
+    v = _batch(1)
+    stats = drawdown_stats(v, use_numba=True)
+    _assert_stats_equal([stats[k] for k in STAT_NAMES], _drawdown_stats_loop(v))
+
+
+def test_longest_losing_streak():
+    v = np.array([[1., 5.], [2., 4.], [1.5, 3.], [1.2, 3.5], [1.1, 2.], [3., 1.]])
+    np.testing.assert_array_equal(longest_losing_streak(v), [3, 2])
+    np.testing.assert_array_equal(longest_losing_streak(v[:1]), [0, 0])
+
+
+def test_sortino_ratio():
+    v = np.array([100., 110., 99., 108.9, 98.01])
+    returns = v[1:] / v[:-1] - 1
+    expected = returns.mean() / np.sqrt(np.mean(np.minimum(returns, 0) ** 2)) * np.sqrt(252)
+    np.testing.assert_allclose(sortino_ratio(v), [expected])
+    assert np.isnan(sortino_ratio(np.linspace(1., 2., 10))[0])
+
+
+def test_calmar_ratio():
+    v = np.array([100., 80., 121.])
+    expected = ((121. / 100.) ** (252 / 2.) - 1) / 0.2
+    np.testing.assert_allclose(calmar_ratio(v), [expected])
+    assert np.isnan(calmar_ratio(np.linspace(1., 2., 10))[0])
+    assert np.isnan(calmar_ratio(np.array([[100., 50.]]))).all()
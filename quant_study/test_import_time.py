@@ -0,0 +1,32 @@
+'''
+Import-time budget for headless sweep workers: simulating and scoring
+strategies must not load yfinance or matplotlib.
+'''
+import os
+import subprocess
+import sys
+
+IMPORT_BUDGET_SECONDS = 2.0
+HEAVY_MODULES = ['yfinance', 'matplotlib']
+
+_PROBE = '''
+import sys, time
+t = time.perf_counter()
+import backtest_utils, strategies, analytics, streaming
+print(time.perf_counter() - t)
+print(','.join(m for m in {heavy!r} if m in sys.modules))
+'''
+
+
+def test_import_time_budget():
+    out = subprocess.check_output(
+        [sys.executable, '-c', _PROBE.format(heavy=HEAVY_MODULES)],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        universal_newlines=True)
+    elapsed, loaded = (out.strip().split('\n') + [''])[:2]
+    assert loaded == '', 'heavy modules imported eagerly: {}'.format(loaded)
+    assert float(elapsed) < IMPORT_BUDGET_SECONDS, 'import took {}s'.format(elapsed)
+
+
+if __name__ == '__main__':
+    test_import_time_budget()
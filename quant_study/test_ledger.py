@@ -0,0 +1,82 @@
+'''
+Accrual over non-trading days, FX forward-filling, margin weights and the
+README's levered backtest, checked against hand-computed values.
+'''
+import numpy as np
+import pandas as pd
+import pytest
+
+from ledger import (CASH, MARGIN, CashLedger, accrual_index, convert_currency, convert_dividends,
+                    with_margin)
+from strategies import backtest_static_leverage_strategy
+
+# Fri, Mon, Tue, Wed
+DAYS = pd.DatetimeIndex(["2024-01-05", "2024-01-08", "2024-01-09", "2024-01-10"])
+
+
+def test_accrual_index_accrues_over_the_weekend():
+    rate = pd.Series([0.05, 0.08], index=pd.DatetimeIndex(["2024-01-01", "2024-01-09"]))
+    index = accrual_index(rate, DAYS)
+    monday = 1 + 0.05 * 3 / 360
+    tuesday = monday * (1 + 0.05 / 360)
+    # the rate set on Tuesday accrues from Tuesday's close
+    wednesday = tuesday * (1 + 0.08 / 360)
+    np.testing.assert_allclose(index.values, [1.0, monday, tuesday, wednesday], rtol=1e-12)
+
+
+def test_risk_free_rate_is_the_daily_cash_return():
+    ledger = CashLedger(pd.Series([0.05], index=DAYS[:1]))
+    rf = ledger.risk_free_rate(DAYS)
+    assert np.isnan(rf.iloc[0])
+    np.testing.assert_allclose(rf.values[1:], [0.05 * 3 / 360, 0.05 / 360, 0.05 / 360], rtol=1e-10)
+
+
+def test_fx_conversion_forward_fills_missing_days():
+    prices = pd.DataFrame({"EWJ": [100.0, 101.0, 102.0, 103.0], "QQQ": [400.0, 401.0, 402.0, 403.0]},
+                          index=DAYS)
+    # no quote on Monday or Wednesday
+    fx = pd.DataFrame({"JPY": [0.0070, 0.0072]}, index=DAYS[[0, 2]])
+    converted = convert_currency(prices, fx, {"EWJ": "JPY", "QQQ": "USD"})
+    np.testing.assert_allclose(converted["EWJ"].values,
+                               [100.0 * 0.0070, 101.0 * 0.0070, 102.0 * 0.0072, 103.0 * 0.0072])
+    pd.testing.assert_series_equal(converted["QQQ"], prices["QQQ"])
+
+    dividends = {"EWJ": pd.Series([50.0, 60.0], index=DAYS[[1, 3]]), "QQQ": pd.Series([1.0], index=DAYS[:1])}
+    converted_divs = convert_dividends(dividends, fx, {"EWJ": "JPY"})
+    np.testing.assert_allclose(converted_divs["EWJ"].values, [50.0 * 0.0070, 60.0 * 0.0072])
+    assert converted_divs["QQQ"] is dividends["QQQ"]
+
+
+def test_with_margin():
+    unlevered = {"QQQ": 0.6, "BIL": 0.4}
+    assert with_margin(unlevered) == unlevered
+    assert with_margin({"QQQ": 0.5}) == {"QQQ": 0.5}
+
+    levered = with_margin({"QQQ": 1.0, "QLD": 0.4})
+    assert levered[MARGIN] == pytest.approx(-0.4)
+    assert sum(levered.values()) == pytest.approx(1.0)
+    # an existing margin weight is extended, not replaced
+    assert with_margin({"QQQ": 1.5, MARGIN: -0.2})[MARGIN] == pytest.approx(-0.5)
+
+
+def test_levered_backtest_matches_hand_computed_return():
+    # one quarter, so the strategy holds its initial units throughout
+    index = pd.bdate_range("2024-01-02", "2024-03-28")
+    qqq = pd.Series(np.linspace(400.0, 440.0, len(index)), index=index)
+    prices = pd.DataFrame({"QQQ": qqq})
+    dividends = {"QQQ": pd.Series(dtype=float)}
+    cash_rate = pd.Series([0.05], index=index[:1])
+
+    ledger = CashLedger(cash_rate, borrow_spread=0.015)
+    px, divs = ledger.prepare(prices, dividends)
+    assert set(px.columns) == {"QQQ", CASH, MARGIN}
+    weights = with_margin({"QQQ": 1.4})
+    val, _ = backtest_static_leverage_strategy(px, divs, list(weights), tuple(weights.values()),
+                                               output="none")
+
+    # daily accrual over every calendar-day gap between trading days
+    gaps = np.diff(index.values).astype("timedelta64[D]").astype(float)
+    borrow_growth = np.prod(1 + 0.065 * gaps / 360)
+    expected = 10000 * (1.4 * 440.0 / 400.0 - 0.4 * borrow_growth)
+    assert val.iloc[-1] == pytest.approx(expected, rel=1e-12)
+    assert val.iloc[0] == pytest.approx(10000.0)
@@ -0,0 +1,82 @@
+'''
+Each streaming backtest must reproduce its in-memory counterpart in
+strategies.py, whatever the partitioning of the price history.
+'''
+import numpy as np
+import pandas as pd
+import pytest
+
+from strategies import (ERIC_STRATEGY_GOLD, backtest_9sig_strategy, backtest_buy_and_hold,
+                        backtest_eric_strategy, backtest_static_leverage_strategy)
+from streaming import (collect_stream, iter_price_partitions, stream_9sig_strategy, stream_buy_and_hold,
+                       stream_eric_strategy, stream_static_leverage_strategy, write_price_partitions)
+
+TICKERS = ["TQQQ", "BIL", "QQQ", "QLD", "SCHD", "GLD"]
+
+
+@pytest.fixture(scope="module")
+def market():
+    rng = np.random.RandomState(0)
+    index = pd.bdate_range("2015-01-02", "2018-06-29")
+    prices = pd.DataFrame(50 * np.cumprod(1 + rng.normal(0.0004, 0.015, size=(len(index), len(TICKERS))), axis=0),
+                          index=index, columns=TICKERS)
+    quarter_ends = prices.resample("QE").apply(lambda df: df.index[-1]).iloc[:, 0]
+    dividends = {}
+    for j, ticker in enumerate(TICKERS):
+        # monthly-ish payments, some of them on rebalance days
+        dates = index[5 + j::21].union(pd.DatetimeIndex(quarter_ends.values[j % 3::3]))
+        dividends[ticker] = pd.Series(0.002 * prices.loc[dates, ticker].values, index=dates)
+    return prices, dividends
+
+
+def _partitionings(prices):
+    by_year = [chunk for _, chunk in prices.groupby(prices.index.year)]
+    by_rows = [prices.iloc[i:i + 97] for i in range(0, len(prices), 97)]
+    single_days = [prices.iloc[i:i + 1] for i in range(300)] + [prices.iloc[300:]]
+    return [by_year, by_rows, single_days, [prices]]
+
+
+def _assert_stream_matches(stream_fn, expected, prices):
+    for partitions in _partitionings(prices):
+        values = collect_stream(stream_fn(partitions))
+        pd.testing.assert_index_equal(values.index, expected.index)
+        np.testing.assert_allclose(values.values, expected.values, rtol=1e-10)
+
+
+def test_9sig_matches_backtest(market):
+    prices, dividends = market
+    expected, _ = backtest_9sig_strategy(prices, dividends, output="none")
+    _assert_stream_matches(lambda parts: stream_9sig_strategy(parts, dividends), expected, prices)
+
+
+@pytest.mark.parametrize("frequency", ["quarterly", "annual"])
+def test_static_leverage_matches_backtest(market, frequency):
+    prices, dividends = market
+    tickers, weights = ["QQQ", "QLD", "BIL"], (4.0, 9.67, 3.0)
+    expected, _ = backtest_static_leverage_strategy(prices, dividends, tickers, weights,
+                                                    rebalance_frequency=frequency, output="none")
+    _assert_stream_matches(
+        lambda parts: stream_static_leverage_strategy(parts, dividends, tickers, weights,
+                                                      rebalance_frequency=frequency),
+        expected, prices)
+
+
+def test_eric_matches_backtest(market):
+    prices, dividends = market
+    expected, _ = backtest_eric_strategy(prices, dividends, ERIC_STRATEGY_GOLD, output="none")
+    _assert_stream_matches(lambda parts: stream_eric_strategy(parts, dividends, ERIC_STRATEGY_GOLD),
+                           expected, prices)
+
+
+def test_buy_and_hold_matches_backtest(market):
+    prices, dividends = market
+    expected, _ = backtest_buy_and_hold(prices, dividends, output="none")
+    _assert_stream_matches(lambda parts: stream_buy_and_hold(parts, dividends), expected, prices)
+
+
+def test_csv_partitions_round_trip(market, tmpdir):
+    prices, dividends = market
+    write_price_partitions(prices, str(tmpdir), fmt="csv")
+    expected, _ = backtest_9sig_strategy(prices, dividends, output="none")
+    values = collect_stream(stream_9sig_strategy(iter_price_partitions(str(tmpdir), TICKERS), dividends))
+    np.testing.assert_allclose(values.values, expected.values, rtol=1e-10)
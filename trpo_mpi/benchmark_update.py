@@ -0,0 +1,64 @@
+'''
+Seconds per TRPO policy update (policy gradient + conjugate gradient + line search) on a
+stock env for the settings of learn(): cold-started CG for a fixed cg_iters, CG
+warm-started from the previous step direction, either one with the residual-based early
+stop, and the line search evaluating several step sizes per session call. Phase times
+and the CG iterations used are read back from progress.csv.
+
+    python -m baselines.trpo_mpi.benchmark_update --env Stock-v0 --iters 30
+'''
+import argparse
+import csv
+import os
+import tempfile
+
+import gym
+import numpy as np
+import tensorflow as tf
+
+from baselines import logger, profiling
+from baselines.trpo_mpi.trpo_mpi import learn
+
+UPDATE_PHASES = ('time/computegrad', 'time/cg', 'time/linesearch')
+
+SETTINGS = [
+    ('cold, fixed iters', dict()),
+    ('warm, fixed iters', dict(cg_warm_start=True)),
+    ('cold, rel_tol', dict(cg_rel_tol=0.1)),
+    ('warm, rel_tol', dict(cg_warm_start=True, cg_rel_tol=0.1)),
+    ('line search x5', dict(line_search_candidates=5)),
+    ('line search x10', dict(line_search_candidates=10)),
+]
+
+
+def run(env_id, iters, seed, logdir, **kwargs):
+    logger.configure(logdir, ['csv'])
+    profiling.configure(1)
+    env = gym.make(env_id)
+    with tf.Graph().as_default():
+        learn(network='mlp', env=env, total_timesteps=0, max_iters=iters, seed=seed, **kwargs)
+    env.close()
+    profiling.configure(0)
+    with open(os.path.join(logdir, 'progress.csv')) as f:
+        return list(csv.DictReader(f))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--env', default='Stock-v0')
+    parser.add_argument('--iters', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print('{:>20} {:>12} {:>10} {:>14} {:>12}'.format('setting', 'update s', 'cg s', 'linesearch s', 'cg iters'))
+    for name, kwargs in SETTINGS:
+        rows = run(args.env, args.iters, args.seed, tempfile.mkdtemp(), **kwargs)[1:]  # skip warm-up
+        update = np.mean([sum(float(row.get(k) or 0) for k in UPDATE_PHASES) for row in rows])
+        cg_time = np.mean([float(row.get('time/cg') or 0) for row in rows])
+        linesearch_time = np.mean([float(row.get('time/linesearch') or 0) for row in rows])
+        cg_iters = np.mean([float(row['cg_iters']) for row in rows])
+        print('{:>20} {:>12.4f} {:>10.4f} {:>14.4f} {:>12.1f}'.format(name, update, cg_time, linesearch_time, cg_iters))
+
+
+if __name__ == '__main__':
+    main()
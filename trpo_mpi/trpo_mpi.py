@@ -1,5 +1,5 @@
 from baselines.common import explained_variance, zipsame, dataset
-from baselines import logger
+from baselines import logger, profiling
 import baselines.common.tf_util as U
 import tensorflow as tf, numpy as np
 import time
@@ -7,8 +7,7 @@ from baselines.common import colorize
 from collections import deque
 from baselines.common import set_global_seeds
 from baselines.common.mpi_adam import MpiAdam
-from baselines.common.cg import cg
-from baselines.common.input import observation_placeholder
+from baselines.a2c.returns import gae_advantages
 from baselines.common.policies import build_policy
 from contextlib import contextmanager
 
@@ -40,7 +39,8 @@ def traj_segment_generator(pi, env, horizon, stochastic):
 
     while True:
         prevac = ac
-        ac, vpred, _, _ = pi.step(ob, stochastic=stochastic)
+        with profiling.phase('inference'):
+            ac, vpred, _, _ = pi.step(ob, stochastic=stochastic)
         # Slight weirdness here because we need value function at time T
         # before returning segment [0, T-1] so we get the correct
         # terminal value
@@ -60,7 +60,8 @@ def traj_segment_generator(pi, env, horizon, stochastic):
         acs[i] = ac
         prevacs[i] = prevac
 
-        ob, rew, new, _ = env.step(ac)
+        with profiling.phase('env_step'):
+            ob, rew, new, _ = env.step(ac)
         rews[i] = rew
 
         cur_ep_ret += rew
@@ -73,19 +74,156 @@ def traj_segment_generator(pi, env, horizon, stochastic):
             ob = env.reset()
         t += 1
 
+def traj_segment_generator_vec(pi, env, horizon, stochastic):
+    '''
+    traj_segment_generator for a VecEnv: one batched pi.step per timestep drives all
+    nenvs envs. A segment holds `horizon` steps in total, horizon // nenvs per env, as
+    time-major (nsteps, nenvs, ...) arrays with a per-env "nextvpred"; flatten_segment
+    merges the two axes once advantages are computed. Episode returns and lengths are
+    tracked per env (the VecEnv resets finished envs itself).
+    '''
+    nenvs = env.num_envs
+    assert horizon % nenvs == 0, 'timesteps_per_batch must be a multiple of the number of envs'
+    nsteps = horizon // nenvs
+
+    # Initialize state variables
+    t = 0
+    ac = np.array([env.action_space.sample() for _ in range(nenvs)])
+    new = np.ones(nenvs, 'int32')
+    ob = env.reset()
+
+    cur_ep_ret = np.zeros(nenvs, 'float64')
+    cur_ep_len = np.zeros(nenvs, 'int32')
+    ep_rets = []
+    ep_lens = []
+
+    # Initialize history arrays
+    obs = np.zeros((nsteps,) + ob.shape, ob.dtype)
+    rews = np.zeros((nsteps, nenvs), 'float32')
+    vpreds = np.zeros((nsteps, nenvs), 'float32')
+    news = np.zeros((nsteps, nenvs), 'int32')
+    acs = np.zeros((nsteps,) + ac.shape, ac.dtype)
+    prevacs = acs.copy()
+
+    while True:
+        prevac = ac
+        with profiling.phase('inference'):
+            ac, vpred, _, _ = pi.step(ob, stochastic=stochastic)
+        if t > 0 and t % nsteps == 0:
+            yield {"ob" : obs, "rew" : rews, "vpred" : vpreds, "new" : news,
+                    "ac" : acs, "prevac" : prevacs, "nextvpred": vpred * (1 - new),
+                    "ep_rets" : ep_rets, "ep_lens" : ep_lens}
+            _, vpred, _, _ = pi.step(ob, stochastic=stochastic)
+            # The arrays are reused by the next segment, see traj_segment_generator
+            ep_rets = []
+            ep_lens = []
+        i = t % nsteps
+        obs[i] = ob
+        vpreds[i] = vpred
+        news[i] = new
+        acs[i] = ac
+        prevacs[i] = prevac
+
+        with profiling.phase('env_step'):
+            ob, rew, done, _ = env.step(ac)
+        rews[i] = rew
+        new = np.asarray(done, 'int32')
+
+        cur_ep_ret += rew
+        cur_ep_len += 1
+        for k in np.nonzero(done)[0]:
+            ep_rets.append(float(cur_ep_ret[k]))
+            ep_lens.append(int(cur_ep_len[k]))
+            cur_ep_ret[k] = 0
+            cur_ep_len[k] = 0
+        t += 1
+
+def flatten_segment(seg):
+    '''Merge the time and env axes of a traj_segment_generator_vec segment, in place.'''
+    for key in ("ob", "rew", "vpred", "new", "ac", "prevac", "adv", "tdlamret"):
+        seg[key] = seg[key].reshape((-1,) + seg[key].shape[2:])
+
 def add_vtarg_and_adv(seg, gamma, lam):
-    new = np.append(seg["new"], 0) # last element is only used for last vtarg, but we already zeroed it if last new = 1
-    vpred = np.append(seg["vpred"], seg["nextvpred"])
-    T = len(seg["rew"])
-    seg["adv"] = gaelam = np.empty(T, 'float32')
-    rew = seg["rew"]
-    lastgaelam = 0
-    for t in reversed(range(T)):
-        nonterminal = 1-new[t+1]
-        delta = rew[t] + gamma * vpred[t+1] * nonterminal - vpred[t]
-        gaelam[t] = lastgaelam = delta + gamma * lam * nonterminal * lastgaelam
+    # Works on single-env (T,) and vectorized (nsteps, nenvs) segments, "nextvpred" is per env
+    new = np.concatenate([seg["new"], np.zeros_like(seg["new"][:1])]) # last element is only used for last vtarg, but we already zeroed it if last new = 1
+    vpred = np.concatenate([seg["vpred"], np.reshape(seg["nextvpred"], (1,) + seg["vpred"].shape[1:])])
+    seg["adv"] = gae_advantages(seg["rew"], vpred[:-1], vpred[1:], 1 - new[1:], gamma, lam).astype('float32')
     seg["tdlamret"] = seg["adv"] + seg["vpred"]
 
+class FeedInput(object):
+    '''Feeds a tensor that is not a bare placeholder (e.g. tf.placeholder_with_default) through U.function.'''
+    def __init__(self, tensor):
+        self.tensor = tensor
+
+    def make_feed_dict(self, data):
+        return {self.tensor: data}
+
+def cg(f_Ax, b, x0=None, cg_iters=10, residual_tol=1e-10, rel_tol=0., verbose=False):
+    '''
+    Conjugate gradient solve of f_Ax(x) = b, as baselines.common.cg.cg but starting from x0
+    (zeros if None) and stopping once |r| <= rel_tol * |b|. Returns (x, iterations run).
+    '''
+    if x0 is None:
+        x = np.zeros_like(b)
+        r = b.copy()
+    else:
+        x = x0.copy()
+        r = b - f_Ax(x)
+    p = r.copy()
+    rdotr = r.dot(r)
+    tol = max(residual_tol, rel_tol ** 2 * b.dot(b))
+
+    fmtstr = "%10i %10.3g %10.3g"
+    titlestr = "%10s %10s %10s"
+    if verbose: print(titlestr % ("iter", "residual norm", "soln norm"))
+
+    for i in range(cg_iters):
+        if verbose: print(fmtstr % (i, rdotr, np.linalg.norm(x)))
+        z = f_Ax(p)
+        v = rdotr / p.dot(z)
+        x += v*p
+        r -= v*z
+        newrdotr = r.dot(r)
+        mu = newrdotr/rdotr
+        p = r + mu*p
+        rdotr = newrdotr
+        if rdotr < tol:
+            break
+
+    if verbose: print(fmtstr % (i+1, rdotr, np.linalg.norm(x)))
+    return x, i+1
+
+def line_search_candidate_losses(policy, var_list, ob, ac, atarg, oldpi, ent_coef, ncandidates):
+    '''
+    Builds ncandidates copies of the "pi" policy whose parameters are offset by stepsizes[k] * fullstep,
+    sharing ob/ac/atarg and oldpi with the main graph. Returns the fullstep and stepsizes placeholders
+    and the losses of every candidate, shape [ncandidates, 5] in the order of learn's loss_names.
+    '''
+    fullstep = tf.placeholder(dtype=tf.float32, shape=[None], name="fullstep")
+    stepsizes = tf.placeholder(dtype=tf.float32, shape=[ncandidates], name="stepsizes")
+    candidate_losses = []
+    for k in range(ncandidates):
+        offsets = {}
+        start = 0
+        for var in var_list:
+            shape = var.get_shape().as_list()
+            sz = U.intprod(shape)
+            offsets[var.name] = tf.reshape(fullstep[start:start+sz] * stepsizes[k], shape)
+            start += sz
+
+        def offset_getter(getter, name, *args, offsets=offsets, **kwargs):
+            var = getter(name, *args, **kwargs)
+            return var + offsets[var.name] if var.name in offsets else var
+
+        with tf.variable_scope("pi", reuse=True, custom_getter=offset_getter):
+            pi = policy(observ_placeholder=ob)
+        meankl = tf.reduce_mean(oldpi.pd.kl(pi.pd))
+        meanent = tf.reduce_mean(pi.pd.entropy())
+        entbonus = ent_coef * meanent
+        surrgain = tf.reduce_mean(tf.exp(pi.pd.logp(ac) - oldpi.pd.logp(ac)) * atarg)
+        candidate_losses.append(tf.stack([surrgain + entbonus, meankl, entbonus, surrgain, meanent]))
+    return fullstep, stepsizes, tf.stack(candidate_losses)
+
 def learn(*,
         network,
         env,
@@ -98,6 +236,9 @@ def learn(*,
         seed=None,
         ent_coef=0.0,
         cg_damping=1e-2,
+        cg_warm_start=False,
+        cg_rel_tol=0.,
+        line_search_candidates=0,
         vf_stepsize=3e-4,
         vf_iters =3,
         max_episodes=0, max_iters=0,  # time constraint
@@ -115,7 +256,8 @@ def learn(*,
                             or function that takes input placeholder and returns tuple (output, None) for feedforward nets
                             or (output, (state_placeholder, state_output, mask_placeholder)) for recurrent nets
 
-    env                     environment (one of the gym environments or wrapped via baselines.common.vec_env.VecEnv-type class
+    env                     environment (one of the gym environments or wrapped via baselines.common.vec_env.VecEnv-type class;
+                            a VecEnv's envs are stepped together, timesteps_per_batch must be a multiple of env.num_envs)
 
     timesteps_per_batch     timesteps per gradient estimation batch
 
@@ -127,6 +269,14 @@ def learn(*,
 
     cg_damping              conjugate gradient damping
 
+    cg_warm_start           start conjugate gradient from the previous update's step direction instead of zero
+
+    cg_rel_tol              stop conjugate gradient early (before cg_iters) once the residual norm is below
+                            cg_rel_tol times the gradient norm; 0 always runs cg_iters iterations
+
+    line_search_candidates  evaluate this many line search step sizes together in one session call and take the
+                            largest acceptable one; 0 tries them one at a time
+
     vf_stepsize             learning rate for adam optimizer used to optimie value function loss
 
     vf_iters                number of iterations of value function optimization iterations per each policy optimization step
@@ -174,7 +324,12 @@ def learn(*,
     ob_space = env.observation_space
     ac_space = env.action_space
 
-    ob = observation_placeholder(ob_space)
+    # The Fisher-vector-product subsample is kept in a variable for the whole update; `ob`
+    # falls back to it when not fed, so the CG iterations only feed the tangent.
+    fvp_ob = tf.Variable(np.zeros((1,) + ob_space.shape, dtype=ob_space.dtype), name="fvp_ob",
+                         trainable=False, validate_shape=False)
+    ob = tf.placeholder_with_default(fvp_ob, shape=(None,) + ob_space.shape, name="ob")
+    ob_input = FeedInput(ob)
     with tf.variable_scope("pi"):
         pi = policy(observ_placeholder=ob)
     with tf.variable_scope("oldpi"):
@@ -227,26 +382,48 @@ def learn(*,
     assign_old_eq_new = U.function([],[], updates=[tf.assign(oldv, newv)
         for (oldv, newv) in zipsame(get_variables("oldpi"), get_variables("pi"))])
 
-    compute_losses = U.function([ob, ac, atarg], losses)
-    compute_lossandgrad = U.function([ob, ac, atarg], losses + [U.flatgrad(optimgain, var_list)])
-    compute_fvp = U.function([flat_tangent, ob, ac, atarg], fvp)
-    compute_vflossandgrad = U.function([ob, ret], U.flatgrad(vferr, vf_var_list))
+    compute_losses = U.function([ob_input, ac, atarg], losses)
+    compute_lossandgrad = U.function([ob_input, ac, atarg], losses + [U.flatgrad(optimgain, var_list)])
+    load_fvp_inputs = U.function([ob_input], [], updates=[tf.assign(fvp_ob, ob, validate_shape=False)])
+    compute_fvp = U.function([flat_tangent], fvp)
+    compute_vflossandgrad = U.function([ob_input, ret], U.flatgrad(vferr, vf_var_list))
+    if line_search_candidates > 0:
+        fullstep_ph, stepsizes_ph, candidate_losses = line_search_candidate_losses(
+            policy, var_list, ob, ac, atarg, oldpi, ent_coef, line_search_candidates)
+        compute_candidate_losses = U.function([ob_input, ac, atarg, fullstep_ph, stepsizes_ph], candidate_losses)
 
     @contextmanager
     def timed(msg):
-        if rank == 0:
-            print(colorize(msg, color='magenta'))
-            tstart = time.time()
-            yield
-            print(colorize("done in %.3f seconds"%(time.time() - tstart), color='magenta'))
+        with profiling.phase(msg):
+            if rank == 0:
+                print(colorize(msg, color='magenta'))
+                tstart = time.time()
+                yield
+                print(colorize("done in %.3f seconds"%(time.time() - tstart), color='magenta'))
+            else:
+                yield
+
+    def step_ok(meanlosses, surrbefore, expectedimprove):
+        surr, kl, *_ = meanlosses
+        improve = surr - surrbefore
+        logger.log("Expected: %.3f Actual: %.3f"%(expectedimprove, improve))
+        if not np.isfinite(meanlosses).all():
+            logger.log("Got non-finite value of losses -- bad!")
+        elif kl > max_kl * 1.5:
+            logger.log("violated KL constraint. shrinking step.")
+        elif improve < 0:
+            logger.log("surrogate didn't improve. shrinking step.")
         else:
-            yield
+            logger.log("Stepsize OK!")
+            return True
+        return False
 
     def allmean(x):
         assert isinstance(x, np.ndarray)
         if MPI is not None:
             out = np.empty_like(x)
-            MPI.COMM_WORLD.Allreduce(x, out, op=MPI.SUM)
+            with profiling.phase('sync'):
+                MPI.COMM_WORLD.Allreduce(x, out, op=MPI.SUM)
             out /= nworkers
         else:
             out = np.copy(x)
@@ -267,12 +444,18 @@ def learn(*,
 
     # Prepare for rollouts
     # ----------------------------------------
-    seg_gen = traj_segment_generator(pi, env, timesteps_per_batch, stochastic=True)
+    # A VecEnv (e.g. several stock envs from run.py --num_env) is stepped with batched inference
+    vectorized = hasattr(env, 'num_envs')
+    if vectorized:
+        seg_gen = traj_segment_generator_vec(pi, env, timesteps_per_batch, stochastic=True)
+    else:
+        seg_gen = traj_segment_generator(pi, env, timesteps_per_batch, stochastic=True)
 
     episodes_so_far = 0
     timesteps_so_far = 0
     iters_so_far = 0
     tstart = time.time()
+    stepdir = None
     lenbuffer = deque(maxlen=40) # rolling buffer for episode lengths
     rewbuffer = deque(maxlen=40) # rolling buffer for episode rewards
 
@@ -295,7 +478,10 @@ def learn(*,
 
         with timed("sampling"):
             seg = seg_gen.__next__()
-        add_vtarg_and_adv(seg, gamma, lam)
+        with profiling.phase('advantages'):
+            add_vtarg_and_adv(seg, gamma, lam)
+        if vectorized:
+            flatten_segment(seg)
 
         # ob, ac, atarg, ret, td1ret = map(np.concatenate, (obs, acs, atargs, rets, td1rets))
         ob, ac, atarg, tdlamret = seg["ob"], seg["ac"], seg["adv"], seg["tdlamret"]
@@ -306,20 +492,23 @@ def learn(*,
         if hasattr(pi, "ob_rms"): pi.ob_rms.update(ob) # update running mean/std for policy
 
         args = seg["ob"], seg["ac"], atarg
-        fvpargs = [arr[::5] for arr in args]
+        load_fvp_inputs(seg["ob"][::5])
         def fisher_vector_product(p):
-            return allmean(compute_fvp(p, *fvpargs)) + cg_damping * p
+            return allmean(compute_fvp(p)) + cg_damping * p
 
         assign_old_eq_new() # set old parameter values to new parameter values
         with timed("computegrad"):
             *lossbefore, g = compute_lossandgrad(*args)
         lossbefore = allmean(np.array(lossbefore))
         g = allmean(g)
+        cg_steps = 0
         if np.allclose(g, 0):
             logger.log("Got zero gradient. not updating")
         else:
             with timed("cg"):
-                stepdir = cg(fisher_vector_product, g, cg_iters=cg_iters, verbose=rank==0)
+                x0 = stepdir if cg_warm_start else None
+                stepdir, cg_steps = cg(fisher_vector_product, g, x0=x0, cg_iters=cg_iters,
+                                       rel_tol=cg_rel_tol, verbose=rank==0)
             assert np.isfinite(stepdir).all()
             shs = .5*stepdir.dot(fisher_vector_product(stepdir))
             lm = np.sqrt(shs / max_kl)
@@ -329,31 +518,43 @@ def learn(*,
             surrbefore = lossbefore[0]
             stepsize = 1.0
             thbefore = get_flat()
-            for _ in range(10):
-                thnew = thbefore + fullstep * stepsize
-                set_from_flat(thnew)
-                meanlosses = surr, kl, *_ = allmean(np.array(compute_losses(*args)))
-                improve = surr - surrbefore
-                logger.log("Expected: %.3f Actual: %.3f"%(expectedimprove, improve))
-                if not np.isfinite(meanlosses).all():
-                    logger.log("Got non-finite value of losses -- bad!")
-                elif kl > max_kl * 1.5:
-                    logger.log("violated KL constraint. shrinking step.")
-                elif improve < 0:
-                    logger.log("surrogate didn't improve. shrinking step.")
+            with profiling.phase('linesearch'):
+                if line_search_candidates > 0:
+                    # The same halving schedule, line_search_candidates step sizes per session call
+                    thnew = thbefore
+                    for first in range(0, 10, line_search_candidates):
+                        stepsizes = stepsize * .5 ** np.arange(first, first + line_search_candidates)
+                        allcandlosses = allmean(np.array(compute_candidate_losses(*args, fullstep, stepsizes)))
+                        accepted = None
+                        for i in range(min(line_search_candidates, 10 - first)):
+                            meanlosses = allcandlosses[i]
+                            if step_ok(meanlosses, surrbefore, expectedimprove):
+                                accepted = i
+                                break
+                        if accepted is not None:
+                            thnew = thbefore + fullstep * stepsizes[accepted]
+                            break
+                    else:
+                        logger.log("couldn't compute a good step")
+                    set_from_flat(thnew)
                 else:
-                    logger.log("Stepsize OK!")
-                    break
-                stepsize *= .5
-            else:
-                logger.log("couldn't compute a good step")
-                set_from_flat(thbefore)
+                    for _ in range(10):
+                        thnew = thbefore + fullstep * stepsize
+                        set_from_flat(thnew)
+                        meanlosses = allmean(np.array(compute_losses(*args)))
+                        if step_ok(meanlosses, surrbefore, expectedimprove):
+                            break
+                        stepsize *= .5
+                    else:
+                        logger.log("couldn't compute a good step")
+                        set_from_flat(thbefore)
             if nworkers > 1 and iters_so_far % 20 == 0:
                 paramsums = MPI.COMM_WORLD.allgather((thnew.sum(), vfadam.getflat().sum())) # list of tuples
                 assert all(np.allclose(ps, paramsums[0]) for ps in paramsums[1:])
 
         for (lossname, lossval) in zip(loss_names, meanlosses):
             logger.record_tabular(lossname, lossval)
+        logger.record_tabular("cg_iters", cg_steps)
 
         with timed("vf"):
 
@@ -385,9 +586,12 @@ def learn(*,
         logger.record_tabular("EpisodesSoFar", episodes_so_far)
         logger.record_tabular("TimestepsSoFar", timesteps_so_far)
         logger.record_tabular("TimeElapsed", time.time() - tstart)
+        profiling.step()
+        profiling.record_tabular()
 
         if rank==0:
-            logger.dump_tabular()
+            with profiling.phase('logging'):
+                logger.dump_tabular()
 
     return pi
 